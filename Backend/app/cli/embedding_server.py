@@ -0,0 +1,34 @@
+# app/cli/embedding_server.py
+"""
+Run the shared embedding sidecar that workers use with EMBEDDING_BACKEND=sidecar.
+
+    python -m app.cli.embedding_server [--socket PATH] [--backend torch|onnx]
+"""
+import argparse
+import asyncio
+import os
+
+from ..config import settings
+from ..core.logging_config import configure_logging
+from ..services.document_store import SentenceTransformerEmbeddings
+from ..services.embedding_sidecar import EmbeddingServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve embeddings over a Unix domain socket.")
+    parser.add_argument("--socket", default=settings.EMBEDDING_SIDECAR_SOCKET)
+    parser.add_argument("--backend", default=settings.EMBEDDING_SIDECAR_BACKEND, choices=["torch", "onnx"])
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1,
+                        help="Inference threads; the sidecar is the only encoder, so all cores by default")
+    parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_SIDECAR_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_SIDECAR_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    configure_logging()
+    encoder = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME, backend=args.backend, threads=args.threads)
+    server = EmbeddingServer(encoder, args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
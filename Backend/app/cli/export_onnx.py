@@ -0,0 +1,26 @@
+# app/cli/export_onnx.py
+"""
+Export the embedding model to ONNX ahead of time (e.g. in the Docker build),
+so API workers running with EMBEDDING_BACKEND=onnx never need to import torch.
+
+    python -m app.cli.export_onnx [--quantize] [--model NAME]
+"""
+import argparse
+
+from ..config import settings
+from ..services.onnx_encoder import export_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX.")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--quantize", action="store_true", default=settings.EMBEDDING_ONNX_QUANTIZE,
+                        help="Also write a dynamic int8-quantized model")
+    args = parser.parse_args()
+
+    target = export_model(args.model, quantize=args.quantize)
+    print(f"Exported {args.model} to {target}")
+
+
+if __name__ == "__main__":
+    main()
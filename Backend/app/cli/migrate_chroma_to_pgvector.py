@@ -0,0 +1,160 @@
+# app/cli/migrate_chroma_to_pgvector.py
+"""
+Copy users' Chroma indexes into the pgvector ``document_chunks`` table.
+
+Run from the Backend directory, with DATABASE_URL pointing at a Postgres that
+has the vector extension available:
+
+    python -m app.cli.migrate_chroma_to_pgvector --dry-run     # count what would be copied
+    python -m app.cli.migrate_chroma_to_pgvector               # every user under CHROMA_PERSIST_DIRECTORY
+    python -m app.cli.migrate_chroma_to_pgvector --user user_123 --overwrite
+
+Stored vectors are copied as they are; nothing is re-embedded. Each user is
+written into a build and swapped in (see ``pgvector_store.swap_build``), so a
+failed or interrupted user can simply be migrated again. Users that already
+have chunks in Postgres are skipped unless --overwrite is given. Chunks
+written before they carried a report id get one by matching their ``s3_uri``
+to ``Reports.file_path``.
+
+Then set VECTOR_BACKEND=pgvector. Chunks from an older model or chunker keep
+their index version, so ``python -m app.cli.reindex --check`` still reports
+them as stale.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+from sqlalchemy import text
+
+from ..config import settings
+from ..databse import SessionLocal, get_engine
+from ..models.users import User
+from ..models.reports import Reports
+from ..services.pgvector_store import LIVE_BUILD, TABLE, PgVectorCollection, ensure_schema, swap_build
+
+
+def _chroma_users(only: List[str]) -> List[str]:
+    """Clerk ids with a live Chroma index (skipping builds and swap leftovers)."""
+    root = settings.CHROMA_PERSIST_DIRECTORY
+    if not os.path.isdir(root):
+        return []
+    users = []
+    for name in sorted(os.listdir(root)):
+        if name.startswith(".") or ".legacy-" in name or ".swap-" in name:
+            continue
+        if only and name not in only:
+            continue
+        if os.path.isdir(os.path.join(root, name)):
+            users.append(name)
+    return users
+
+
+def _report_ids_by_uri(db, clerk_id: str) -> Dict[str, int]:
+    rows = (
+        db.query(Reports.file_path, Reports.id)
+        .join(User, User.id == Reports.user_id)
+        .filter(User.clerk_id == clerk_id)
+        .all()
+    )
+    return {file_path: report_id for file_path, report_id in rows if file_path}
+
+
+def _has_live_chunks(engine, clerk_id: str) -> bool:
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:table)"), {"table": TABLE}).scalar() is None:
+            return False
+        return bool(conn.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {TABLE} WHERE clerk_id = :clerk_id AND build = :build)"
+        ), {"clerk_id": clerk_id, "build": LIVE_BUILD}).scalar())
+
+
+def migrate_user(client, engine, db, clerk_id: str, build: str, page_size: int, dry_run: bool) -> int:
+    """Copy one user's collection. Returns the number of chunks."""
+    collection = client.get_collection(f"user_{clerk_id}")
+    total = collection.count()
+    if dry_run or not total:
+        return total
+
+    # The table's dimension must match the stored vectors
+    first = collection.get(limit=1, include=["embeddings"])
+    ensure_schema(engine, len(first["embeddings"][0]))
+
+    report_ids = _report_ids_by_uri(db, clerk_id)
+    target = PgVectorCollection(engine, clerk_id, build)
+    target.delete()  # leftovers of an interrupted attempt
+
+    copied = 0
+    for offset in range(0, total, page_size):
+        page = collection.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not len(page["ids"]):
+            break
+        documents, embeddings = [], []
+        for content, metadata, embedding in zip(page["documents"], page["metadatas"], page["embeddings"]):
+            if not content:
+                continue
+            metadata = dict(metadata or {})
+            if metadata.get("report_id") is None and metadata.get("s3_uri") in report_ids:
+                metadata["report_id"] = report_ids[metadata["s3_uri"]]
+            documents.append(Document(page_content=content, metadata=metadata))
+            embeddings.append(embedding)
+        copied += target.add_embedded(documents, embeddings)
+
+    swap_build(engine, clerk_id, build)
+    return copied
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Copy Chroma indexes into the pgvector table.")
+    parser.add_argument("--user", action="append", default=[], dest="users",
+                        help="Limit to this clerk id (repeatable)")
+    parser.add_argument("--page-size", type=int, default=settings.PGVECTOR_COPY_BATCH,
+                        help="Chunks read from Chroma (and copied) at a time")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Replace users that already have chunks in Postgres")
+    parser.add_argument("--dry-run", action="store_true", help="Only count chunks per user")
+    args = parser.parse_args(argv)
+
+    import chromadb
+
+    users = _chroma_users(args.users)
+    build = f"migrate-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    print(f"Migrating {len(users)} users from {settings.CHROMA_PERSIST_DIRECTORY}"
+          f"{' (dry run)' if args.dry_run else ''}")
+
+    engine = get_engine()
+    db = SessionLocal()
+    started = time.perf_counter()
+    total = failed = skipped = 0
+    try:
+        for clerk_id in users:
+            if not args.dry_run and not args.overwrite and _has_live_chunks(engine, clerk_id):
+                skipped += 1
+                continue
+            path = os.path.realpath(os.path.join(settings.CHROMA_PERSIST_DIRECTORY, clerk_id))
+            try:
+                client = chromadb.PersistentClient(path=path)
+                chunks = migrate_user(client, engine, db, clerk_id, build, max(1, args.page_size), args.dry_run)
+            except RuntimeError:
+                raise  # dimension mismatch: nothing else will fit either
+            except Exception as e:
+                failed += 1
+                print(f"✗ {clerk_id}: {e}")
+                continue
+            total += chunks
+            print(f"✓ {clerk_id}: {chunks} chunks")
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s: {total} chunks, "
+          f"{skipped} users skipped (already migrated), {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# app/cli/rebalance.py
+"""
+Move node-local vector indexes after CLUSTER_NODES changes.
+
+Run on every node that holds indexes, from the Backend directory:
+
+    python -m app.cli.rebalance --nodes "a=http://h1:8000,b=http://h2:8000,c=http://h3:8000" --dry-run
+    python -m app.cli.rebalance --nodes "a=http://h1:8000,b=http://h2:8000,c=http://h3:8000"
+    python -m app.cli.rebalance --prune          # after every node runs the new CLUSTER_NODES
+
+Each local index whose owner under the new ring (--nodes, default
+CLUSTER_NODES) is another node is streamed to that node. No chunk is
+re-embedded. The receiving node builds it side by side and swaps it in.
+Local copies are kept, so nodes still on the old membership keep serving
+them. ``--prune`` deletes them, but only for users whose new owner reports at
+least as many chunks.
+
+New nodes must be running before the copy. A report uploaded or deleted on
+the old owner between the copy and the rollout is not carried over; repair
+those users with ``python -m app.cli.reindex --user <clerk_id>`` on the new
+owner.
+"""
+import argparse
+import time
+from typing import List, Optional
+
+from ..config import settings
+from ..core.cluster import HashRing, parse_nodes
+from ..services.document_store import build_document_store
+from ..services.vector_routing import node_request, push_user_index
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Stream vector indexes to the nodes that own them.")
+    parser.add_argument("--nodes", default=None, help="Membership to rebalance to (default: CLUSTER_NODES)")
+    parser.add_argument("--user", action="append", default=[], dest="users",
+                        help="Limit to this clerk id (repeatable)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete local indexes already held by their owner instead of copying")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the users that would move")
+    args = parser.parse_args(argv)
+
+    if args.nodes is not None:
+        settings.CLUSTER_NODES = args.nodes
+    nodes = parse_nodes(settings.CLUSTER_NODES)
+    if settings.CLUSTER_NODE_ID not in nodes:
+        raise SystemExit(f"CLUSTER_NODE_ID {settings.CLUSTER_NODE_ID!r} is not in {sorted(nodes)}")
+    ring = HashRing(nodes, settings.CLUSTER_VNODES)
+
+    store = build_document_store()
+    local = [user for user in store.local_users() if not args.users or user in args.users]
+    moving = [(user, ring.owner(user)) for user in local if ring.owner(user) != settings.CLUSTER_NODE_ID]
+    print(f"Node {settings.CLUSTER_NODE_ID}: {len(moving)} of {len(local)} local users belong to other nodes")
+
+    started = time.perf_counter()
+    failed = 0
+    for clerk_id, node in moving:
+        if args.dry_run:
+            print(f"  {clerk_id} -> {node}")
+            continue
+        try:
+            if args.prune:
+                local_count = sum(store.get_index_versions(clerk_id).values())
+                remote = node_request(node, "GET", f"/internal/vectors/{clerk_id}/versions", "versions").json()
+                if sum(remote.values()) < local_count:
+                    raise RuntimeError(f"{node} holds {sum(remote.values())} of {local_count} chunks; copy first")
+                store.delete_user_collection(clerk_id)
+                print(f"✓ {clerk_id}: pruned ({node} holds it)")
+            else:
+                chunks = push_user_index(store, node, clerk_id, settings.CLUSTER_TRANSFER_PAGE_SIZE)
+                print(f"✓ {clerk_id} -> {node}: {chunks} chunks")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {clerk_id} -> {node}: {getattr(e, 'detail', None) or e}")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# app/cli/reindex.py
+"""
+Rebuild users' vector stores from ``Reports.extracted_text``.
+
+Run from the Backend directory:
+
+    python -m app.cli.reindex                     # new run, all users
+    python -m app.cli.reindex --run-id 20250101   # resume an interrupted run
+    python -m app.cli.reindex --stale-only        # only users on another index version
+    python -m app.cli.reindex --check             # report index versions, change nothing
+
+With CLUSTER_NODES set, run it on every node; each rebuilds the users it owns.
+
+Each user is rebuilt in a worker process into a side-by-side directory and then
+swapped in atomically (see ``DocumentStore.swap_user_index``), so the API keeps
+serving the old index until the new one is complete. Report summary vectors
+(``Reports.text_vector``) are re-embedded with the same model. Progress is
+recorded per user in ``reindex_checkpoints``; users already marked ``done``
+for a run id are skipped when the same run id is given again.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from ..config import settings
+from ..core.cluster import owner_of
+from ..databse import SessionLocal, get_engine
+from ..models.users import User
+from ..models.reports import Reports
+from ..models.reindex import ReindexCheckpoint
+from ..services.document_store import DocumentStore, build_dir, build_document_store
+
+# Per-process state, set up once by _init_worker
+_store: Optional[DocumentStore] = None
+_batch_size: int = settings.REINDEX_BATCH_SIZE
+
+
+def _init_worker(batch_size: int, threads: int):
+    """Load the embedding model once per worker and pin its thread count."""
+    global _store, _batch_size
+    settings.EMBEDDING_THREADS = threads
+    _batch_size = batch_size
+    _store = build_document_store()
+
+
+def _report_metadata(report: Reports) -> Dict[str, Any]:
+    """Same metadata shape as written by the upload endpoint."""
+    return {
+        "filename": report.original_filename,
+        "description": report.description or "",
+        "upload_date": report.uploaded_at.isoformat() if report.uploaded_at else "",
+        "report_type": "pdf",
+        "s3_uri": report.file_path,
+        "report_id": report.id,
+    }
+
+
+def _reindex_user(task: Tuple[int, str, str]) -> Dict[str, Any]:
+    """Rebuild one user's index side by side and swap it in. Runs in a worker."""
+    user_pk, clerk_id, run_id = task
+    started = time.perf_counter()
+    new_dir = build_dir(clerk_id, run_id)
+    result = {"clerk_id": clerk_id, "status": "done", "reports": 0, "chunks": 0, "error": None}
+
+    db = SessionLocal()
+    try:
+        # A half-written build from a crashed attempt is discarded, not reused
+        _store.discard_build(clerk_id, new_dir)
+        vector_store = _store.open_vectorstore(clerk_id, new_dir)
+
+        last_id = 0
+        pending = []
+        summarized = []
+        while True:
+            # Re-query after each pass so reports uploaded during the build are
+            # picked up before the swap
+            reports = (
+                db.query(Reports)
+                .filter(Reports.user_id == user_pk, Reports.id > last_id)
+                .order_by(Reports.id)
+                .all()
+            )
+            if not reports:
+                break
+
+            for report in reports:
+                last_id = report.id
+                result["reports"] += 1
+                if report.summary:
+                    summarized.append((report.id, report.summary))
+                if not report.extracted_text:
+                    continue
+                # Chunks from consecutive reports share embedding batches
+                pending.extend(_store.build_documents(report.extracted_text, _report_metadata(report)))
+                while len(pending) >= _batch_size:
+                    vector_store.add_documents(pending[:_batch_size])
+                    result["chunks"] += _batch_size
+                    pending = pending[_batch_size:]
+
+            if pending:
+                vector_store.add_documents(pending)
+                result["chunks"] += len(pending)
+                pending = []
+
+        # Summary vectors must come from the same model as the chunks
+        for start in range(0, len(summarized), _batch_size):
+            batch = summarized[start:start + _batch_size]
+            vectors = _store.embedding_model.embed_documents([summary for _, summary in batch])
+            for (report_id, _), vector in zip(batch, vectors):
+                db.query(Reports).filter(Reports.id == report_id).update(
+                    {Reports.text_vector: vector, Reports.summarized_at: func.now()}, synchronize_session=False
+                )
+        db.commit()
+
+        _store.swap_user_index(clerk_id, new_dir)
+    except Exception as e:
+        _store.discard_build(clerk_id, new_dir)
+        result["status"] = "failed"
+        result["error"] = str(e)
+    finally:
+        db.close()
+
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def _save_checkpoint(db, run_id: str, index_version: str, result: Dict[str, Any]):
+    checkpoint = db.query(ReindexCheckpoint).filter(
+        ReindexCheckpoint.run_id == run_id,
+        ReindexCheckpoint.clerk_id == result["clerk_id"]
+    ).first()
+    if not checkpoint:
+        checkpoint = ReindexCheckpoint(run_id=run_id, clerk_id=result["clerk_id"])
+        db.add(checkpoint)
+    checkpoint.index_version = index_version
+    checkpoint.status = result["status"]
+    checkpoint.reports = result["reports"]
+    checkpoint.chunks = result["chunks"]
+    checkpoint.seconds = result["seconds"]
+    checkpoint.error = result["error"]
+    db.commit()
+
+
+def _users_to_process(db, run_id: str, only: List[str], stale_only: bool, store: DocumentStore):
+    query = db.query(User.id, User.clerk_id).join(Reports, Reports.user_id == User.id).distinct()
+    if only:
+        query = query.filter(User.clerk_id.in_(only))
+
+    done = {
+        row.clerk_id for row in db.query(ReindexCheckpoint.clerk_id).filter(
+            ReindexCheckpoint.run_id == run_id,
+            ReindexCheckpoint.status == "done"
+        )
+    }
+
+    users = []
+    for user_pk, clerk_id in query.all():
+        # With CLUSTER_NODES set, each node rebuilds only the users it owns
+        if clerk_id in done or owner_of(clerk_id) is not None:
+            continue
+        if stale_only and set(store.get_index_versions(clerk_id)) == {store.index_version}:
+            continue
+        users.append((user_pk, clerk_id))
+    return users
+
+
+def check(db, store: DocumentStore) -> int:
+    """Print users whose index is missing, stale or mixed. Returns their count."""
+    mismatched = 0
+    users = db.query(User.clerk_id).join(Reports, Reports.user_id == User.id).distinct().all()
+    users = [(clerk_id,) for (clerk_id,) in users if owner_of(clerk_id) is None]
+    for (clerk_id,) in users:
+        versions = store.get_index_versions(clerk_id)
+        if set(versions) != {store.index_version}:
+            mismatched += 1
+            print(f"{clerk_id}: {versions or 'no index'}")
+    print(f"{mismatched}/{len(users)} users not on {store.index_version}")
+    return mismatched
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rebuild per-user vector stores from stored report text.")
+    parser.add_argument("--run-id", default=None, help="Run identifier; pass a previous one to resume it")
+    parser.add_argument("--workers", type=int, default=settings.REINDEX_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=settings.REINDEX_BATCH_SIZE,
+                        help="Chunks per embedding batch (shared across a user's reports)")
+    parser.add_argument("--user", action="append", default=[], dest="users",
+                        help="Limit to this clerk id (repeatable)")
+    parser.add_argument("--stale-only", action="store_true",
+                        help="Skip users whose index is already on the current version")
+    parser.add_argument("--check", action="store_true", help="Only report index versions")
+    args = parser.parse_args(argv)
+
+    ReindexCheckpoint.__table__.create(bind=get_engine(), checkfirst=True)
+    run_id = args.run_id or datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    workers = max(1, args.workers)
+
+    db = SessionLocal()
+    try:
+        store = build_document_store()
+        if args.check:
+            raise SystemExit(1 if check(db, store) else 0)
+
+        users = _users_to_process(db, run_id, args.users, args.stale_only, store)
+        index_version = store.index_version
+        del store  # workers load their own model
+        print(f"Reindex run {run_id}: {len(users)} users, {workers} workers, batch size {args.batch_size}")
+        if not users:
+            return
+
+        tasks = [(user_pk, clerk_id, run_id) for user_pk, clerk_id in users]
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+        started = time.perf_counter()
+        total_chunks = failed = 0
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(args.batch_size, threads)) as pool:
+            for result in pool.imap_unordered(_reindex_user, tasks):
+                _save_checkpoint(db, run_id, index_version, result)
+                total_chunks += result["chunks"]
+                if result["status"] == "failed":
+                    failed += 1
+                    print(f"✗ {result['clerk_id']}: {result['error']}")
+                else:
+                    rate = result["chunks"] / result["seconds"] if result["seconds"] else 0.0
+                    print(f"✓ {result['clerk_id']}: {result['reports']} reports, "
+                          f"{result['chunks']} chunks, {rate:.1f} chunks/s")
+
+        elapsed = time.perf_counter() - started
+        per_core = total_chunks / elapsed / workers if elapsed else 0.0
+        print(f"Done in {elapsed:.1f}s: {total_chunks} chunks, {failed} failed users, "
+              f"{per_core:.1f} chunks/sec/core")
+        if failed:
+            print(f"Re-run with --run-id {run_id} to retry failed users")
+            raise SystemExit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
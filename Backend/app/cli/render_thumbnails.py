@@ -0,0 +1,112 @@
+# app/cli/render_thumbnails.py
+"""
+Render thumbnails (and page previews) for reports that have none: uploaded
+before thumbnails existed, or whose renderer wasn't installed at the time.
+
+Run from the Backend directory:
+
+    python -m app.cli.render_thumbnails                  # every report without a thumbnail
+    python -m app.cli.render_thumbnails --user user_123  # one user (repeatable)
+    python -m app.cli.render_thumbnails --concurrency 8 --limit 500
+
+Each original is downloaded from S3 to TEMP_DIRECTORY, rendered, and removed.
+Needs PyMuPDF (PDFs) and Pillow.
+"""
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import boto3
+from botocore.client import Config as BotoConfig
+
+from ..config import settings
+from ..databse import SessionLocal
+from ..models.users import User
+from ..models.reports import Reports
+from ..services.thumbnails import render_previews, store_previews
+
+
+def _s3_client():
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+        config=BotoConfig(signature_version="s3v4"),
+    )
+
+
+def _pending_reports(users: List[str], limit: Optional[int]) -> List[int]:
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(Reports.id)
+            .filter(Reports.file_path.like("s3://%"), ~Reports.previews.any())
+        )
+        if users:
+            query = query.join(User, User.id == Reports.user_id).filter(User.clerk_id.in_(users))
+        query = query.order_by(Reports.id)
+        if limit:
+            query = query.limit(limit)
+        return [report_id for (report_id,) in query.all()]
+    finally:
+        db.close()
+
+
+def _render_one(s3_client, report_id: int) -> bool:
+    db = SessionLocal()
+    temp_file_path = None
+    try:
+        report = db.get(Reports, report_id)
+        if report is None or report.previews:
+            return True
+        bucket, key = report.file_path[len("s3://"):].split("/", 1)
+        os.makedirs(settings.TEMP_DIRECTORY, exist_ok=True)
+        temp_file_path = os.path.join(settings.TEMP_DIRECTORY, f"{uuid.uuid4()}{os.path.splitext(key)[1]}")
+        s3_client.download_file(bucket, key, temp_file_path)
+
+        previews = render_previews(temp_file_path, report.original_filename)
+        rows = store_previews(s3_client, settings.AWS_S3_BUCKET, report.user.clerk_id, previews)
+        if not rows:
+            return False
+        report.previews = rows
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"report {report_id}: {e}")
+        return False
+    finally:
+        db.close()
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Render thumbnails for reports that have none.")
+    parser.add_argument("--user", action="append", default=[], dest="users",
+                        help="Limit to this clerk id (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Reports rendered at a time")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    report_ids = _pending_reports(args.users, args.limit)
+    print(f"Rendering thumbnails for {len(report_ids)} reports, concurrency {args.concurrency}")
+    if not report_ids:
+        return
+
+    started = time.perf_counter()
+    s3_client = _s3_client()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        done = list(pool.map(lambda report_id: _render_one(s3_client, report_id), report_ids))
+    failed = done.count(False)
+    print(f"Done in {time.perf_counter() - started:.1f}s; {failed} of them still without a thumbnail")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
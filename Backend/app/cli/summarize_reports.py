@@ -0,0 +1,73 @@
+# app/cli/summarize_reports.py
+"""
+Fill in ``Reports.summary`` and ``Reports.text_vector`` for reports that have
+none (uploaded before summaries existed, or whose background summary failed).
+
+Run from the Backend directory:
+
+    python -m app.cli.summarize_reports                  # every report without a summary
+    python -m app.cli.summarize_reports --user user_123  # one user (repeatable)
+    python -m app.cli.summarize_reports --concurrency 8 --limit 500
+
+Set REPORT_SUMMARY_LLM=fake to run without an LLM provider.
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+from ..config import settings
+from ..databse import SessionLocal
+from ..models.users import User
+from ..models.reports import Reports
+from ..services.report_summaries import summarize_report
+
+
+def _pending_reports(users: List[str], limit: Optional[int]) -> List[int]:
+    db = SessionLocal()
+    try:
+        query = db.query(Reports.id).filter(Reports.summary.is_(None), Reports.extracted_text.isnot(None))
+        if users:
+            query = query.join(User, User.id == Reports.user_id).filter(User.clerk_id.in_(users))
+        query = query.order_by(Reports.id)
+        if limit:
+            query = query.limit(limit)
+        return [report_id for (report_id,) in query.all()]
+    finally:
+        db.close()
+
+
+async def _run(report_ids: List[int], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(report_id: int):
+        async with semaphore:
+            await summarize_report(report_id)
+
+    await asyncio.gather(*(one(report_id) for report_id in report_ids))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Summarize and embed reports that have no summary yet.")
+    parser.add_argument("--user", action="append", default=[], dest="users",
+                        help="Limit to this clerk id (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Reports summarized at a time")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    report_ids = _pending_reports(args.users, args.limit)
+    print(f"Summarizing {len(report_ids)} reports with {settings.REPORT_SUMMARY_LLM}, "
+          f"concurrency {args.concurrency}")
+    if not report_ids:
+        return
+
+    started = time.perf_counter()
+    asyncio.run(_run(report_ids, max(1, args.concurrency)))
+    remaining = len(set(report_ids) & set(_pending_reports(args.users, None)))
+    print(f"Done in {time.perf_counter() - started:.1f}s; {remaining} of them still without a summary")
+    if remaining:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
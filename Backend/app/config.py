@@ -1,5 +1,6 @@
 # fastapi_project/app/config.py
 from pydantic_settings import BaseSettings
+import logging
 import os
 from dotenv import load_dotenv
 from pydantic import field_validator
@@ -8,6 +9,8 @@ from typing import Optional
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class Settings(BaseSettings):
     """Application configuration settings."""
     PROJECT_NAME: str = "SparkStorm FastAPI"
@@ -26,6 +29,18 @@ class Settings(BaseSettings):
     UPLOAD_DIRECTORY: str = os.getenv("UPLOAD_DIRECTORY", "uploads")
     TEMP_DIRECTORY: str = os.getenv("TEMP_DIRECTORY", "temp")
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10 MB
+    # Multi-file uploads (/api/reports/upload/batch): files per request, and
+    # files extracted (OCR + S3) at a time within one request
+    UPLOAD_BATCH_MAX_FILES: int = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "20"))
+    UPLOAD_BATCH_CONCURRENCY: int = int(os.getenv("UPLOAD_BATCH_CONCURRENCY", "4"))
+
+    # Response compression (app/core/compression.py): bodies of at least
+    # COMPRESSION_MIN_BYTES; brotli when installed and accepted, else gzip
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    COMPRESSION_THREAD_MIN_BYTES: int = int(os.getenv("COMPRESSION_THREAD_MIN_BYTES", str(256 * 1024)))
 
     # Azure OCR settings
     AZURE_VISION_ENDPOINT: Optional[str] = os.getenv("AzureOcrEndpoint")
@@ -34,6 +49,84 @@ class Settings(BaseSettings):
     # Vector store settings
     CHROMA_PERSIST_DIRECTORY: str = os.getenv("CHROMA_PERSIST_DIRECTORY", "chroma_db")
     EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+    # "chroma" (per-replica directory) or "pgvector" (shared document_chunks
+    # table in DATABASE_URL, see app/services/pgvector_store.py)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")
+    PGVECTOR_HNSW_M: int = int(os.getenv("PGVECTOR_HNSW_M", "16"))
+    PGVECTOR_HNSW_EF_CONSTRUCTION: int = int(os.getenv("PGVECTOR_HNSW_EF_CONSTRUCTION", "64"))
+    PGVECTOR_EF_SEARCH: int = int(os.getenv("PGVECTOR_EF_SEARCH", "40"))
+    # Keep scanning the HNSW graph until enough rows pass the per-user filter
+    # (pgvector >= 0.8): "relaxed_order", "strict_order" or "off"
+    PGVECTOR_ITERATIVE_SCAN: str = os.getenv("PGVECTOR_ITERATIVE_SCAN", "relaxed_order")
+    PGVECTOR_COPY_BATCH: int = int(os.getenv("PGVECTOR_COPY_BATCH", "500"))
+
+    # Node-local (chroma) indexes across several nodes (app/core/cluster.py):
+    # "name=url,..." for every node, empty = single node. Vector operations for
+    # users owned by another node are forwarded to it with CLUSTER_SECRET
+    CLUSTER_NODES: str = os.getenv("CLUSTER_NODES", "")
+    CLUSTER_NODE_ID: str = os.getenv("CLUSTER_NODE_ID", "")
+    CLUSTER_VNODES: int = int(os.getenv("CLUSTER_VNODES", "512"))
+    CLUSTER_SECRET: str = os.getenv("CLUSTER_SECRET", "")
+    CLUSTER_FORWARD_TIMEOUT_SECONDS: float = float(os.getenv("CLUSTER_FORWARD_TIMEOUT_SECONDS", "10"))
+    CLUSTER_TRANSFER_PAGE_SIZE: int = int(os.getenv("CLUSTER_TRANSFER_PAGE_SIZE", "500"))
+
+    # Chunking: "token" sizes chunks to the embedding model's sequence limit
+    # (see app/services/chunking.py), "character" uses CHUNK_SIZE/CHUNK_OVERLAP
+    CHUNKER: str = os.getenv("CHUNKER", "token")
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "0"))  # 0 = per-model profile
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "-1"))  # -1 = per-model profile
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+    # Embedding backend: "torch" (SentenceTransformer), "onnx" (ONNX Runtime) or
+    # "sidecar" (shared process, see app/services/embedding_sidecar.py)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_QUANTIZE: bool = os.getenv("EMBEDDING_ONNX_QUANTIZE", "false").lower() == "true"
+    ONNX_CACHE_DIRECTORY: str = os.getenv("ONNX_CACHE_DIRECTORY", "onnx_models")
+    # Inference threads per process; 0 = CPU count divided by WEB_CONCURRENCY (uvicorn workers)
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+    # Embedding sidecar: EMBEDDING_SIDECAR_BACKEND is what the sidecar runs and
+    # what workers fall back to in-process when it is down
+    EMBEDDING_SIDECAR_SOCKET: str = os.getenv("EMBEDDING_SIDECAR_SOCKET", "/tmp/sparkstorm-embeddings.sock")
+    EMBEDDING_SIDECAR_BACKEND: str = os.getenv("EMBEDDING_SIDECAR_BACKEND", "torch")
+    EMBEDDING_SIDECAR_TIMEOUT: float = float(os.getenv("EMBEDDING_SIDECAR_TIMEOUT", "30"))
+    EMBEDDING_SIDECAR_MAX_BATCH: int = int(os.getenv("EMBEDDING_SIDECAR_MAX_BATCH", "64"))
+    EMBEDDING_SIDECAR_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_SIDECAR_MAX_WAIT_MS", "5"))
+
+    # Reindex settings (see app/cli/reindex.py)
+    REINDEX_WORKERS: int = int(os.getenv("REINDEX_WORKERS", str(os.cpu_count() or 1)))
+    REINDEX_BATCH_SIZE: int = int(os.getenv("REINDEX_BATCH_SIZE", "256"))
+
+    # Startup: "background" warms dependencies up after the app starts serving,
+    # "blocking" finishes warm-up before serving, "off" leaves everything lazy
+    STARTUP_WARMUP: str = os.getenv("STARTUP_WARMUP", "background")
+    # Budget for importing main.py and running app startup (benchmarks/startup.py)
+    STARTUP_BUDGET_SECONDS: float = float(os.getenv("STARTUP_BUDGET_SECONDS", "3.0"))
+
+    # Readiness probes (/health/ready)
+    HEALTH_PROBE_INTERVAL_SECONDS: float = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "10"))
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "5"))
+    # Clerk id whose index is searched by the optional vector-search probe
+    HEALTH_PROBE_VECTOR_USER: Optional[str] = os.getenv("HEALTH_PROBE_VECTOR_USER")
+
+    # Tracing (app/core/tracing.py): exporter "none", "file" or "memory"
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "none")
+    TRACING_FILE: str = os.getenv("TRACING_FILE", "traces.jsonl")
+    TRACING_SAMPLE_RATE: float = float(os.getenv("TRACING_SAMPLE_RATE", "0.01"))
+    # Traces slower than this are always exported, sampled or not
+    TRACING_SLOW_THRESHOLD_MS: float = float(os.getenv("TRACING_SLOW_THRESHOLD_MS", "2000"))
+    # Traces waiting for the file exporter's writer thread; beyond this they are dropped
+    TRACING_QUEUE_SIZE: int = int(os.getenv("TRACING_QUEUE_SIZE", "1000"))
+
+    # Logging (app/core/logging_config.py)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Per-module overrides, e.g. "app.routers.chatbot=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_MAX_MESSAGE_CHARS: int = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+    LOG_REDACT: bool = os.getenv("LOG_REDACT", "true").lower() == "true"
 
     # LLM settings
     OPENAI_API_KEY: Optional[str] = None
@@ -41,6 +134,91 @@ class Settings(BaseSettings):
 
     # Gemini settings
     GEMINI_API_KEY: Optional[str] = None
+    GEMINI_MODEL_NAME: str = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+
+    # Chat context assembly (app/services/context_builder.py): retrieve
+    # CONTEXT_FETCH_K chunks, merge overlaps, drop near-duplicates, pack into a budget
+    CONTEXT_FETCH_K: int = int(os.getenv("CONTEXT_FETCH_K", "5"))
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    CONTEXT_MMR_LAMBDA: float = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+    CONTEXT_DUPLICATE_THRESHOLD: float = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+    # Report summaries and two-stage retrieval (app/services/report_summaries.py)
+    REPORT_SUMMARIES_ENABLED: bool = os.getenv("REPORT_SUMMARIES_ENABLED", "true").lower() == "true"
+    REPORT_SUMMARY_LLM: str = os.getenv("REPORT_SUMMARY_LLM", "router")  # router | fake
+    REPORT_SUMMARY_MAX_WORDS: int = int(os.getenv("REPORT_SUMMARY_MAX_WORDS", "120"))
+    REPORT_SUMMARY_INPUT_TOKENS: int = int(os.getenv("REPORT_SUMMARY_INPUT_TOKENS", "3000"))
+    RETRIEVAL_TWO_STAGE_MIN_REPORTS: int = int(os.getenv("RETRIEVAL_TWO_STAGE_MIN_REPORTS", "20"))
+    RETRIEVAL_TOP_REPORTS: int = int(os.getenv("RETRIEVAL_TOP_REPORTS", "8"))
+    # Users whose summary vectors are kept in memory per worker (LRU)
+    RETRIEVAL_INDEX_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "1000"))
+
+    # Report thumbnails (app/services/thumbnails.py): first page at THUMBNAIL_WIDTH,
+    # optionally THUMBNAIL_PREVIEW_PAGES more pages at THUMBNAIL_PREVIEW_WIDTH
+    THUMBNAILS_ENABLED: bool = os.getenv("THUMBNAILS_ENABLED", "true").lower() == "true"
+    THUMBNAIL_WIDTH: int = int(os.getenv("THUMBNAIL_WIDTH", "240"))
+    THUMBNAIL_PREVIEW_PAGES: int = int(os.getenv("THUMBNAIL_PREVIEW_PAGES", "0"))
+    THUMBNAIL_PREVIEW_WIDTH: int = int(os.getenv("THUMBNAIL_PREVIEW_WIDTH", "800"))
+    THUMBNAIL_JPEG_QUALITY: int = int(os.getenv("THUMBNAIL_JPEG_QUALITY", "75"))
+    THUMBNAIL_MAX_AGE_SECONDS: int = int(os.getenv("THUMBNAIL_MAX_AGE_SECONDS", "31536000"))
+    THUMBNAIL_CACHE_BYTES: int = int(os.getenv("THUMBNAIL_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+    # Profile images (app/services/profile_images.py): square variants at each
+    # width, stored under static/uploads/avatars ("local") or in AWS_S3_BUCKET ("s3")
+    PROFILE_IMAGE_SIZES: str = os.getenv("PROFILE_IMAGE_SIZES", "64,128,256,512")
+    PROFILE_IMAGE_STORAGE: str = os.getenv("PROFILE_IMAGE_STORAGE", "local")  # local | s3
+    PROFILE_IMAGE_MAX_BYTES: int = int(os.getenv("PROFILE_IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+    PROFILE_IMAGE_MAX_PIXELS: int = int(os.getenv("PROFILE_IMAGE_MAX_PIXELS", "50000000"))
+    PROFILE_IMAGE_QUALITY: int = int(os.getenv("PROFILE_IMAGE_QUALITY", "80"))
+    PROFILE_IMAGE_MAX_AGE_SECONDS: int = int(os.getenv("PROFILE_IMAGE_MAX_AGE_SECONDS", "31536000"))
+    PROFILE_IMAGE_CACHE_BYTES: int = int(os.getenv("PROFILE_IMAGE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+    # Admin user search (app/services/user_directory.py): "contains" matches
+    # anywhere (pg_trgm GIN indexes), "prefix" only value starts (b-tree)
+    USER_SEARCH_MODE: str = os.getenv("USER_SEARCH_MODE", "contains")
+
+    # Chat sessions (app/services/chat_sessions.py): idle expiry, turns sent
+    # verbatim (older ones are summarized), per-process hot cache
+    CHAT_SESSION_TTL_SECONDS: int = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "86400"))
+    CHAT_HISTORY_TURNS: int = int(os.getenv("CHAT_HISTORY_TURNS", "3"))
+    CHAT_TURN_MAX_TOKENS: int = int(os.getenv("CHAT_TURN_MAX_TOKENS", "150"))
+    CHAT_SUMMARY_MAX_WORDS: int = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "120"))
+    CHAT_SESSION_CACHE_SIZE: int = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "5000"))
+    CHAT_REWRITE_FOLLOW_UPS: str = os.getenv("CHAT_REWRITE_FOLLOW_UPS", "auto")  # auto | always | never
+
+    # LLM routing (app/services/llm_router.py). Providers without an API key are skipped
+    LLM_PROVIDERS: str = os.getenv("LLM_PROVIDERS", "openai,gemini")
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "5"))
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    # Hedge after the primary's recent p95 latency, clamped to [min, max];
+    # the default applies until enough latencies have been observed
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+    LLM_HEDGE_MAX_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MAX_DELAY_SECONDS", "20"))
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "8"))
+    LLM_EWMA_ALPHA: float = float(os.getenv("LLM_EWMA_ALPHA", "0.2"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+    # Per-user rate limits (app/core/admission.py): sustained rate and burst per endpoint class
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    RATE_LIMIT_CHAT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_CHAT_PER_MINUTE", "20"))
+    RATE_LIMIT_CHAT_BURST: int = int(os.getenv("RATE_LIMIT_CHAT_BURST", "5"))
+    RATE_LIMIT_UPLOAD_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_UPLOAD_PER_MINUTE", "10"))
+    RATE_LIMIT_UPLOAD_BURST: int = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "3"))
+    RATE_LIMIT_DOWNLOAD_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_DOWNLOAD_PER_MINUTE", "60"))
+    RATE_LIMIT_DOWNLOAD_BURST: int = int(os.getenv("RATE_LIMIT_DOWNLOAD_BURST", "20"))
+
+    # Bounded work queues for expensive stages, per process: running + waiting
+    OCR_MAX_CONCURRENCY: int = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+    OCR_MAX_QUEUE: int = int(os.getenv("OCR_MAX_QUEUE", "16"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "2"))
+    EMBEDDING_MAX_QUEUE: int = int(os.getenv("EMBEDDING_MAX_QUEUE", "16"))
+    WORK_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("WORK_QUEUE_TIMEOUT_SECONDS", "30"))
 
     # AWS settings
     AWS_REGION: str = os.getenv("AWS_REGION", "us-east-1")
@@ -51,7 +229,14 @@ class Settings(BaseSettings):
     AWS_S3_KMS_KEY_ID: Optional[str] = os.getenv("AWS_S3_KMS_KEY_ID", None)  # Optional KMS key
 
     # Clerk settings (if needed)
-    CLERK_WEBHOOK_SECRET: Optional[str] = os.getenv("CLERK_WEBHOOK_SECRET")
+    CLERK_WEBHOOK_SECRET: Optional[str] = os.getenv("CLERK_WEBHOOK_SECRET")  # whsec_... signing secret
+    # Webhook inbox (app/services/clerk_webhooks.py): events applied per batch,
+    # idle poll for events queued by other workers, accepted signature age,
+    # and how long processed svix ids are kept for dedupe
+    CLERK_WEBHOOK_BATCH_SIZE: int = int(os.getenv("CLERK_WEBHOOK_BATCH_SIZE", "500"))
+    CLERK_WEBHOOK_POLL_SECONDS: float = float(os.getenv("CLERK_WEBHOOK_POLL_SECONDS", "5"))
+    CLERK_WEBHOOK_TOLERANCE_SECONDS: int = int(os.getenv("CLERK_WEBHOOK_TOLERANCE_SECONDS", "300"))
+    CLERK_WEBHOOK_RETENTION_DAYS: int = int(os.getenv("CLERK_WEBHOOK_RETENTION_DAYS", "7"))
     CLERK_API_KEY: Optional[str] = os.getenv("CLERK_API_KEY")
     CLERK_SECRET_KEY: Optional[str] = os.getenv("CLERK_SECRET_KEY")
 
@@ -65,28 +250,28 @@ class Settings(BaseSettings):
     @classmethod
     def validate_aws_settings(cls, v: str) -> str:
         if not v:
-            print("WARNING: AWS settings not properly configured. S3 functionality will be disabled.")
+            logger.warning("AWS settings not properly configured. S3 functionality will be disabled.")
         return v
 
     @field_validator("AZURE_VISION_ENDPOINT", "AZURE_VISION_KEY")
     @classmethod
     def validate_azure_settings(cls, v: Optional[str]) -> Optional[str]:
         if not v:
-            print("WARNING: Azure Vision settings not properly configured. OCR functionality will be disabled.")
+            logger.warning("Azure Vision settings not properly configured. OCR functionality will be disabled.")
         return v
         
     @field_validator("OPENAI_API_KEY")
     @classmethod
     def validate_openai_settings(cls, v: Optional[str]) -> Optional[str]:
         if not v:
-            print("WARNING: OpenAI API key not set. OpenAI functionality will be disabled.")
+            logger.warning("OpenAI API key not set. OpenAI functionality will be disabled.")
         return v
     
     @field_validator("GEMINI_API_KEY")
     @classmethod
     def validate_gemini_settings(cls, v: Optional[str]) -> Optional[str]:
         if not v:
-            print("WARNING: Gemini API key not set. Gemini functionality will be disabled.")
+            logger.warning("Gemini API key not set. Gemini functionality will be disabled.")
         return v
     
     # Add a method to check if OCR is configured
@@ -97,6 +282,12 @@ class Settings(BaseSettings):
     def is_llm_configured(self) -> bool:
         return bool(self.OPENAI_API_KEY)
     
+    def embedding_threads(self) -> int:
+        if self.EMBEDDING_THREADS > 0:
+            return self.EMBEDDING_THREADS
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+        return max(1, (os.cpu_count() or 1) // workers)
+
     # Add a method to check if AWS S3 is configured
     def is_s3_configured(self) -> bool:
         return bool(self.AWS_S3_BUCKET and self.AWS_ACCESS_KEY_ID and self.AWS_SECRET_ACCESS_KEY)
@@ -0,0 +1,261 @@
+# app/core/admission.py
+"""
+Admission control and backpressure.
+
+Per-user rate limits: a token bucket per (endpoint class, Clerk user). Each
+class (chat, upload, download) has a sustained rate and a burst size from
+Settings. A request with no token left gets 429 with Retry-After set to when
+the next token is due. Routes opt in with
+``dependencies=[Depends(rate_limit("upload"))]``. The dependency runs on the
+already-verified Clerk id, before any DB or expensive work.
+
+Buckets live in memory per process (RATE_LIMIT_BACKEND=memory). Behind
+several workers or nodes, use ``redis`` (RATE_LIMIT_REDIS_URL) so limits are
+shared. Any object with ``take(key, rate, burst) -> (allowed, retry_after)``
+can be plugged in with ``set_rate_limit_backend``.
+
+Stage queues: expensive stages (OCR, embedding) run at most N at a time per
+process, with at most M requests waiting. When the queue is full, or a slot
+doesn't free up within WORK_QUEUE_TIMEOUT_SECONDS, the request gets 503 with
+Retry-After estimated from recent stage durations instead of queueing without
+bound.
+
+    async with stage_queue("ocr").slot():
+        text = await run_in_threadpool(ocr_helper.extract_text_from_pdf, path)
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from ..config import settings
+from .auth import verify_clerk_token
+from .metrics import ADMISSION_REJECTIONS, STAGE_QUEUE_WAITING
+
+
+# ---------------------------
+# Rate-limit backends
+# ---------------------------
+# ``take`` charges ``cost`` tokens. A request costing more than the burst is
+# admitted once the bucket is full and leaves it in debt, so a batch is still
+# paid for per item without being rejected outright.
+class MemoryRateLimitBackend:
+    """Token buckets in a dict, for a single process."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, rate, burst); each bucket refills at its own class's rate
+        self._buckets: Dict[str, Tuple[float, float, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, cost: int = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        need = min(cost, burst)
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (float(burst), now))[:2]
+            tokens = min(float(burst), tokens + (now - updated_at) * rate)
+            if tokens >= need:
+                self._buckets[key] = (tokens - cost, now, rate, burst)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now, rate, burst)
+                allowed, retry_after = False, (need - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._evict(now)
+        return allowed, retry_after
+
+    def _evict(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key, (tokens, updated_at, rate, burst) in list(self._buckets.items()):
+            if tokens + (now - updated_at) * rate >= burst:
+                del self._buckets[key]
+
+
+class RedisRateLimitBackend:
+    """Token buckets in Redis, shared by every worker and node."""
+
+    # Refill and take atomically; returns {allowed, milliseconds until next token}
+    _SCRIPT = """
+    local burst = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local need = math.min(cost, burst)
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) / 1000 * rate)
+    local allowed = 0
+    local wait_ms = 0
+    if tokens >= need then
+        tokens = tokens - cost
+        allowed = 1
+    else
+        wait_ms = math.ceil((need - tokens) / rate * 1000)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+    return {allowed, wait_ms}
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis  # optional dependency, only needed for the shared backend
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int, cost: int = 1) -> Tuple[bool, float]:
+        allowed, wait_ms = self._script(keys=[self.prefix + key],
+                                        args=[burst, rate, int(time.time() * 1000), cost])
+        return bool(allowed), wait_ms / 1000
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _build_backend():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(settings.RATE_LIMIT_REDIS_URL)
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimitBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+
+
+def get_rate_limit_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+    return _backend
+
+
+def set_rate_limit_backend(backend):
+    """Plug in another shared backend (anything with ``take(key, rate, burst, cost)``)."""
+    global _backend
+    _backend = backend
+
+
+# ---------------------------
+# Per-user rate limits
+# ---------------------------
+def rate_limit_for(endpoint_class: str) -> Tuple[float, int]:
+    """(tokens per second, burst) for an endpoint class."""
+    per_minute, burst = {
+        "chat": (settings.RATE_LIMIT_CHAT_PER_MINUTE, settings.RATE_LIMIT_CHAT_BURST),
+        "upload": (settings.RATE_LIMIT_UPLOAD_PER_MINUTE, settings.RATE_LIMIT_UPLOAD_BURST),
+        "download": (settings.RATE_LIMIT_DOWNLOAD_PER_MINUTE, settings.RATE_LIMIT_DOWNLOAD_BURST),
+    }[endpoint_class]
+    return per_minute / 60, burst
+
+
+async def charge_rate_limit(endpoint_class: str, clerk_user_id: str, cost: int = 1):
+    """Take ``cost`` tokens from the user's ``endpoint_class`` bucket, or raise 429."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    rate, burst = rate_limit_for(endpoint_class)
+    backend = get_rate_limit_backend()
+    key = f"{endpoint_class}:{clerk_user_id}"
+    if isinstance(backend, MemoryRateLimitBackend):
+        allowed, retry_after = backend.take(key, rate, burst, cost)
+    else:
+        from fastapi.concurrency import run_in_threadpool
+        allowed, retry_after = await run_in_threadpool(backend.take, key, rate, burst, cost)
+    if not allowed:
+        ADMISSION_REJECTIONS.labels("rate_limit", endpoint_class).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many {endpoint_class} requests. Please slow down.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def rate_limit(endpoint_class: str) -> Callable:
+    """Route dependency taking one token from the per-user bucket of ``endpoint_class``."""
+    rate_limit_for(endpoint_class)  # unknown classes fail at import, not per request
+
+    async def dependency(clerk_user_id: str = Depends(verify_clerk_token)):
+        await charge_rate_limit(endpoint_class, clerk_user_id)
+
+    return dependency
+
+
+# ---------------------------
+# Bounded stage queues
+# ---------------------------
+class StageQueue:
+    """At most ``concurrency`` holders and ``max_waiting`` waiters; beyond that, 503."""
+
+    def __init__(self, name: str, concurrency: int, max_waiting: int, wait_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.waiting = 0
+        # EWMA of how long a slot is held, for Retry-After estimates
+        self.hold_seconds = 1.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._waiting_gauge = STAGE_QUEUE_WAITING.labels(name)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.hold_seconds * (self.waiting + 1) / self.concurrency))
+
+    def _reject(self):
+        ADMISSION_REJECTIONS.labels("queue_full", self.name).inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"The server is busy ({self.name}). Please try again shortly.",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_waiting:
+            self._reject()
+
+        self.waiting += 1
+        self._waiting_gauge.inc()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.waiting -= 1
+            self._waiting_gauge.dec()
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            semaphore.release()
+            self.hold_seconds = 0.8 * self.hold_seconds + 0.2 * (time.monotonic() - started)
+
+
+_stage_queues: Dict[str, StageQueue] = {}
+
+
+def stage_queue(name: str) -> StageQueue:
+    """The process-wide queue for an expensive stage ("ocr" or "embedding")."""
+    queue = _stage_queues.get(name)
+    if queue is None:
+        concurrency, max_waiting = {
+            "ocr": (settings.OCR_MAX_CONCURRENCY, settings.OCR_MAX_QUEUE),
+            "embedding": (settings.EMBEDDING_MAX_CONCURRENCY, settings.EMBEDDING_MAX_QUEUE),
+        }[name]
+        queue = _stage_queues[name] = StageQueue(name, concurrency, max_waiting, settings.WORK_QUEUE_TIMEOUT_SECONDS)
+    return queue
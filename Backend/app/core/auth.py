@@ -3,29 +3,84 @@ from jose import jwt
 from fastapi import Header, HTTPException
 # app/core/auth.py
 from datetime import datetime, timedelta
+import logging
 import os
+import threading
+import time
 from typing import Optional, Union, Any
 from jose import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
 
 from ..config import settings
 from ..models.users import User
 from ..databse import get_db
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
 
 JWKS_URL =  os.getenv("JWKS_URL")
 CLERK_ISSUER = os.getenv("CLERK_ISSUER")
 CLERK_AUDIENCE = os.getenv("CLERK_API_KEY")
 
-jwks = requests.get(JWKS_URL).json()
+# JWKS is fetched lazily (or during app warm-up) and cached. An unknown kid
+# triggers a refetch, at most once per JWKS_MIN_REFRESH_SECONDS, so key
+# rotation is picked up without refetching on every bad token.
+JWKS_MIN_REFRESH_SECONDS = 60
+_jwks: Optional[dict] = None
+_jwks_fetched_at = 0.0
+_jwks_lock = threading.Lock()
 
-def get_signing_key(kid):
-    for key in jwks["keys"]:
+def download_jwks() -> dict:
+    """Fetch the JWKS (blocking), without touching the cache. Raises if it isn't a usable key set."""
+    response = requests.get(JWKS_URL, timeout=10)
+    response.raise_for_status()
+    jwks = response.json()
+    if not isinstance(jwks, dict) or not isinstance(jwks.get("keys"), list):
+        raise ValueError("JWKS response has no 'keys' list")
+    return jwks
+
+def fetch_jwks(force: bool = False) -> dict:
+    """
+    Return the cached JWKS, fetching it (blocking) if missing or forced. A
+    failed refresh keeps the last good keys; with none cached it raises.
+    """
+    global _jwks, _jwks_fetched_at
+    with _jwks_lock:
+        if _jwks is None or force:
+            try:
+                jwks = download_jwks()
+            except Exception as e:
+                if _jwks is None:
+                    raise
+                logger.warning("JWKS refresh failed, keeping the cached keys: %s", e)
+            else:
+                _jwks = jwks
+            # Also after a failure, so a bad kid can't hammer Clerk
+            _jwks_fetched_at = time.monotonic()
+        return _jwks
+
+def _cached_signing_key(kid):
+    if _jwks is None:
+        return None
+    for key in _jwks["keys"]:
         if key["kid"] == kid:
             return key
+    return None
+
+def get_signing_key(kid):
+    key = _cached_signing_key(kid)
+    if key:
+        return key
+    stale = time.monotonic() - _jwks_fetched_at > JWKS_MIN_REFRESH_SECONDS
+    fetch_jwks(force=_jwks is not None and stale)
+    key = _cached_signing_key(kid)
+    if key:
+        return key
     raise HTTPException(401, "Signing key not found")
 
 async def verify_clerk_token(authorization: str = Header(...)):
@@ -36,7 +91,12 @@ async def verify_clerk_token(authorization: str = Header(...)):
 
     try:
         unverified_header = jwt.get_unverified_header(token)
-        signing_key = get_signing_key(unverified_header["kid"])
+        kid = unverified_header["kid"]
+        # Only hop to a thread when the JWKS actually has to be fetched
+        signing_key = _cached_signing_key(kid)
+        record_cache("jwks", signing_key is not None)
+        if signing_key is None:
+            signing_key = await run_in_threadpool(get_signing_key, kid)
 
         payload = jwt.decode(
             token,
@@ -64,7 +124,7 @@ def get_current_user(
 ):
     user = db.query(User).filter(User.clerk_id == clerk_user_id).first()
     if not user:
-        print(f"User with Clerk ID {clerk_user_id} not found in database.")
+        logger.warning("User with Clerk ID %s not found in database", clerk_user_id)
         raise HTTPException(404, "User not found")
-    print(f"Current user: {user.email} (ID: {user.clerk_id})")  # Debug log
+    logger.debug("Current user %s", user.clerk_id)
     return user
@@ -0,0 +1,101 @@
+# app/core/cluster.py
+"""
+Which node owns a user's node-local vector index.
+
+CLUSTER_NODES lists the nodes as ``name=base_url`` pairs, e.g.
+``a=http://10.0.0.1:8000,b=http://10.0.0.2:8000``. CLUSTER_NODE_ID names the
+node this process runs on. When CLUSTER_NODES is empty, or with
+VECTOR_BACKEND=pgvector, clustering is off and every user is local.
+
+Users are placed on a consistent-hash ring keyed by clerk id, with
+CLUSTER_VNODES points per node. Adding or removing a node only moves the
+users on the arcs it gains or loses (about 1/N of them); see
+app.cli.rebalance.
+"""
+import bisect
+import hashlib
+import hmac
+import threading
+from typing import Dict, List, Optional
+
+from fastapi import Header, HTTPException, status
+
+from ..config import settings
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def parse_nodes(spec: str) -> Dict[str, str]:
+    """``"a=http://h1:8000,b=http://h2:8000"`` -> ``{"a": "http://h1:8000", ...}``."""
+    nodes = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"Invalid CLUSTER_NODES entry: {item!r} (expected name=url)")
+        nodes[name.strip()] = url.strip().rstrip("/")
+    return nodes
+
+
+class HashRing:
+    """Consistent-hash ring of named nodes with virtual nodes."""
+
+    def __init__(self, nodes: Dict[str, str], vnodes: int = 128):
+        self.nodes = dict(nodes)
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for point, name in sorted(
+            (_hash(f"{name}#{replica}"), name) for name in self.nodes for replica in range(vnodes)
+        ):
+            self._points.append(point)
+            self._owners.append(name)
+
+    def owner(self, key: str) -> Optional[str]:
+        """Name of the node owning ``key``, or None if the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[index]
+
+    def url(self, name: str) -> str:
+        return self.nodes[name]
+
+
+_ring: Optional[HashRing] = None
+_ring_lock = threading.Lock()
+
+
+def clustering_enabled() -> bool:
+    """Node-local indexes spread over CLUSTER_NODES (pgvector is shared, so never routed)."""
+    return settings.VECTOR_BACKEND == "chroma" and bool(settings.CLUSTER_NODES.strip())
+
+
+def get_ring() -> HashRing:
+    """Ring built from CLUSTER_NODES, once per process."""
+    global _ring
+    if _ring is None:
+        with _ring_lock:
+            if _ring is None:
+                nodes = parse_nodes(settings.CLUSTER_NODES)
+                if nodes and settings.CLUSTER_NODE_ID not in nodes:
+                    raise ValueError(f"CLUSTER_NODE_ID {settings.CLUSTER_NODE_ID!r} is not in CLUSTER_NODES")
+                _ring = HashRing(nodes, settings.CLUSTER_VNODES)
+    return _ring
+
+
+def owner_of(clerk_id: str) -> Optional[str]:
+    """Node owning a user's index, or None if it is this node (or clustering is off)."""
+    if not clustering_enabled():
+        return None
+    owner = get_ring().owner(clerk_id)
+    return None if owner == settings.CLUSTER_NODE_ID else owner
+
+
+async def verify_cluster_secret(x_cluster_secret: str = Header("")):
+    """Dependency for node-to-node endpoints: the caller must present CLUSTER_SECRET."""
+    if not settings.CLUSTER_SECRET or not hmac.compare_digest(x_cluster_secret, settings.CLUSTER_SECRET):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
@@ -0,0 +1,118 @@
+# app/core/compression.py
+"""
+Response compression.
+
+``CompressionMiddleware`` compresses response bodies of at least
+COMPRESSION_MIN_BYTES. It uses brotli when the client accepts ``br`` and the
+``brotli`` package is installed, and gzip otherwise.
+
+- Only compressible types are touched: JSON, NDJSON and text. Images (already
+  compressed) and SSE streams (which must flush per event) pass through.
+- Only single-message bodies are compressed. Streaming responses go out
+  unchanged.
+- Bodies over COMPRESSION_THREAD_MIN_BYTES are compressed in a worker thread,
+  so one large response doesn't stall the event loop.
+
+A compressed body is a different representation. Strong ETags are therefore
+sent as weak ones (``W/"..."``), as nginx does. If-None-Match matching in
+app/core/http_cache.py ignores the ``W/`` prefix.
+"""
+import gzip
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+_COMPRESSIBLE = ("application/json", "application/x-ndjson", "application/problem+json", "text/plain",
+                 "text/html", "text/csv")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """``br`` or ``gzip`` from an Accept-Encoding header, or None."""
+    offered = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not (media_type in _COMPRESSIBLE or media_type.endswith("+json"))
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message  # held until we know the body
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if start is not None:
+                body = message.get("body", b"")
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not message.get("more_body", False) and len(body) >= self.minimum_size:
+                    if len(body) >= settings.COMPRESSION_THREAD_MIN_BYTES:
+                        body = await anyio.to_thread.run_sync(compress, body, encoding)
+                    else:
+                        body = compress(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = "W/" + etag
+                    message = {**message, "body": body}
+                await send(start)
+                start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,119 @@
+# app/core/health.py
+"""
+Dependency probes behind the readiness endpoint.
+
+Each probe exercises one dependency the request path needs (embedding model,
+database, Clerk JWKS and, optionally, a vector search) and records its latency.
+Results are cached for HEALTH_PROBE_INTERVAL_SECONDS so frequent load-balancer
+checks don't turn into load, and a probe that is still running from a previous
+check is reported as timed out instead of being started again.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from ..config import settings
+
+
+def _probe_database():
+    from sqlalchemy import text
+    from ..databse import get_engine
+
+    with get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _probe_embedding_model():
+    from ..services.document_store import get_document_store
+
+    get_document_store().embedding_model.embed_query("readiness probe")
+
+
+def _probe_jwks():
+    # A fresh download, never the live cache: a failing Clerk mustn't evict good keys
+    from .auth import download_jwks
+
+    download_jwks()
+
+
+def _probe_vector_search():
+    # This node's own index, even if another node owns the probe user
+    from ..services.document_store import get_local_document_store
+
+    get_local_document_store().get_relevant_documents(settings.HEALTH_PROBE_VECTOR_USER, "readiness probe", top_k=1)
+
+
+def default_probes() -> Dict[str, Callable[[], None]]:
+    probes = {
+        "embedding_model": _probe_embedding_model,
+        "database": _probe_database,
+        "jwks": _probe_jwks,
+    }
+    if settings.HEALTH_PROBE_VECTOR_USER:
+        probes["vector_search"] = _probe_vector_search
+    return probes
+
+
+class HealthChecker:
+    def __init__(self, probes: Optional[Dict[str, Callable[[], None]]] = None,
+                 interval: float = 10.0, timeout: float = 5.0):
+        self._probes = probes
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, Dict] = {}
+        self._checked_at = 0.0
+        self._running: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="probe")
+
+    @property
+    def probes(self) -> Dict[str, Callable[[], None]]:
+        if self._probes is None:
+            self._probes = default_probes()
+        return self._probes
+
+    @staticmethod
+    def _timed(probe: Callable[[], None]) -> Dict:
+        start = time.perf_counter()
+        error = None
+        try:
+            probe()
+        except Exception as e:
+            error = str(e)
+        return {"ok": error is None, "latency_ms": round((time.perf_counter() - start) * 1000, 2), "error": error}
+
+    def refresh(self, force: bool = False) -> Dict[str, Dict]:
+        """Run all probes in parallel unless the cached results are fresh enough."""
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.interval:
+                return self.results
+
+            for name, probe in self.probes.items():
+                running = self._running.get(name)
+                if running is None or running.done():
+                    self._running[name] = self._executor.submit(self._timed, probe)
+
+            deadline = time.monotonic() + self.timeout
+            checked_at = datetime.now(timezone.utc).isoformat()
+            results = {}
+            for name, future in self._running.items():
+                try:
+                    result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeout:
+                    result = {"ok": False, "latency_ms": None, "error": f"timed out after {self.timeout}s"}
+                results[name] = {**result, "checked_at": checked_at}
+
+            self.results = results
+            self._checked_at = time.monotonic()
+            return results
+
+    def healthy(self) -> bool:
+        return bool(self.results) and all(result["ok"] for result in self.results.values())
+
+
+health_checker = HealthChecker(
+    interval=settings.HEALTH_PROBE_INTERVAL_SECONDS,
+    timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+)
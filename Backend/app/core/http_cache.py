@@ -0,0 +1,56 @@
+# app/core/http_cache.py
+"""
+Conditional GETs for per-user read endpoints.
+
+An endpoint derives a strong ETag from a cheap fingerprint of the data behind
+the response, usually a single aggregate query such as count and max(id),
+before loading any rows. If the request's If-None-Match matches, it answers
+304 without loading or serializing anything:
+
+    etag = make_etag("reports", count, last_id)
+    if not_modified(request, etag):
+        return not_modified_response(etag, REVALIDATE)
+    set_cache_headers(response, etag, REVALIDATE)
+
+Bodies are per user, so the policies are ``private``. ``REVALIDATE`` lets a
+client keep a copy but makes it check back every time, which is cheap once it
+sends the ETag.
+"""
+import hashlib
+
+from fastapi import Request, Response, status
+
+from .metrics import record_cache
+
+REVALIDATE = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over ``parts`` (anything with a stable repr)."""
+    return '"' + hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if If-None-Match names ``etag`` (weak comparison, as RFC 9110 asks for GET)."""
+    header = request.headers.get("if-none-match")
+    hit = False
+    if header:
+        if header.strip() == "*":
+            hit = True
+        else:
+            tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+            hit = etag in tags
+    record_cache("etag", hit)
+    return hit
+
+
+def _headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+
+
+def not_modified_response(etag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_headers(etag, cache_control))
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str = REVALIDATE):
+    response.headers.update(_headers(etag, cache_control))
@@ -0,0 +1,171 @@
+# app/core/logging_config.py
+"""
+Structured, non-blocking logging.
+
+``configure_logging`` routes every logger (uvicorn's included) through a
+bounded in-process queue. Callers only merge the message arguments and
+enqueue the record; a background thread formats, redacts and writes it to
+stdout, so a slow stdout pipe never blocks the event loop. When the queue is
+full, records are dropped and counted (``log_records_dropped_total``) rather
+than blocking the caller.
+
+Records are rendered as JSON lines (LOG_FORMAT=json) or plain text and carry
+the current trace id. With LOG_REDACT on, email addresses and bearer tokens
+are masked in messages, and PII fields passed via ``extra`` (query, answer,
+text, email, ...) are replaced by their length:
+
+    logger.info("Chat answered", extra={"query": query, "citations": 2})
+
+Levels: LOG_LEVEL for the root logger, LOG_LEVELS for per-module overrides,
+e.g. ``LOG_LEVELS=app.routers.chatbot=DEBUG,sqlalchemy.engine=WARNING``.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from .metrics import LOG_RECORDS_DROPPED
+from .tracing import current_trace_id
+
+# ``extra`` keys whose values are user content and never logged verbatim
+PII_FIELDS = frozenset({"query", "question", "answer", "text", "content", "email", "password"})
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_TOKEN = re.compile(r"(?i)bearer\s+[\w.~+/-]+=*|eyJ[\w-]+\.[\w-]+\.[\w-]+")
+
+# Attributes every LogRecord has; anything else came in via ``extra``
+_RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id", "taskName"}
+
+
+def redact(message: str) -> str:
+    """Mask email addresses and bearer tokens/JWTs."""
+    return _TOKEN.sub("<token>", _EMAIL.sub("<email>", message))
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """``"a.b=DEBUG,c=WARNING"`` -> ``{"a.b": "DEBUG", "c": "WARNING"}``"""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.strip().partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _message(record: logging.LogRecord) -> str:
+    message = record.getMessage()
+    if settings.LOG_REDACT:
+        message = redact(message)
+    if len(message) > settings.LOG_MAX_MESSAGE_CHARS:
+        message = message[:settings.LOG_MAX_MESSAGE_CHARS] + "...[truncated]"
+    return message
+
+
+def _extras(record: logging.LogRecord) -> Dict[str, Any]:
+    extras = {}
+    for key, value in record.__dict__.items():
+        if key in _RESERVED:
+            continue
+        if settings.LOG_REDACT:
+            if key in PII_FIELDS:
+                value = f"<redacted {len(str(value))} chars>"
+            elif isinstance(value, str):
+                value = redact(value)
+        extras[key] = value
+    return extras
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _message(record),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        entry.update(_extras(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {_message(record)}"
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{key}={value}" for key, value in extras.items())
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            line += f" trace_id={trace_id}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops instead of blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated later) and capture the trace id,
+        # which lives in a contextvar; formatting and I/O happen on the listener
+        record.msg = record.getMessage()
+        record.args = None
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(stream=None):
+    """Install the queue handler on the root logger and start the writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue))
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    # uvicorn installs its own synchronous stdout handlers; send its records
+    # through the queue as well
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    for name, level in parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,162 @@
+# app/core/metrics.py
+"""
+Prometheus metrics.
+
+- Per-route request latency histograms and in-flight gauges, recorded by
+  ``InstrumentedRoute`` (set as ``route_class`` on every router), labelled
+  with the route template rather than the raw path.
+- Pipeline stage histograms (``stage("ocr")`` etc.) for the upload and chat
+  paths.
+- Cache hit/miss counters.
+- LLM provider call outcomes and hedging results.
+- Log records dropped by the non-blocking log handler.
+- Admission control: rejections and stage queue depth.
+- Clerk webhook events by outcome.
+
+Label children are created up front and bound methods are captured, so an
+observation on the hot path is a perf_counter pair plus one ``observe`` call.
+Set PROMETHEUS_MULTIPROC_DIR to aggregate across uvicorn workers.
+"""
+import os
+import time
+from typing import Callable, Dict, Tuple
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+_perf_counter = time.perf_counter
+
+# Request latencies span ~1 ms (cached reads) to minutes (OCR of large PDFs)
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled, by route",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds", "Latency of upload/chat pipeline stages",
+    ["stage"], buckets=_LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result", ["cache", "result"],
+)
+LLM_CALLS = Counter(
+    "llm_calls_total", "LLM provider calls by outcome (ok, error, cancelled)", ["provider", "outcome"],
+)
+LLM_HEDGES = Counter(
+    "llm_hedges_total", "Hedged LLM requests by result (won, lost, skipped)", ["result"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Log records dropped because the logging queue was full",
+)
+TRACES_DROPPED = Counter(
+    "traces_dropped_total", "Traces dropped because the file exporter's queue was full",
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total", "Requests rejected by rate limits or full stage queues",
+    ["kind", "name"],
+)
+VECTOR_FORWARDS = Counter(
+    "vector_forwards_total", "Vector operations forwarded to the owning node, by outcome (ok, error)",
+    ["op", "outcome"],
+)
+CLERK_WEBHOOK_EVENTS = Counter(
+    "clerk_webhook_events_total", "Clerk webhook events by outcome (queued, duplicate, applied, failed)",
+    ["outcome"],
+)
+STAGE_QUEUE_WAITING = Gauge(
+    "stage_queue_waiting", "Requests waiting for a slot in a bounded stage queue",
+    ["stage"], multiprocess_mode="livesum",
+)
+
+STAGES = (
+    "ocr", "thumbnail", "profile_image", "s3_put", "chunking", "embedding", "vector_add", "vector_search",
+    "query_rewrite", "context_build", "llm_call", "citation_scoring", "clerk_webhook_batch",
+)
+CACHES = ("jwks", "vector_store_handle", "thumbnail", "etag", "profile_image")
+
+_stage_observers: Dict[str, Callable[[float], None]] = {
+    name: STAGE_LATENCY.labels(name).observe for name in STAGES
+}
+_cache_counters: Dict[Tuple[str, bool], Callable[[], None]] = {
+    (name, hit): CACHE_REQUESTS.labels(name, "hit" if hit else "miss").inc
+    for name in CACHES for hit in (True, False)
+}
+
+
+class _StageTimer:
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = _perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observe(_perf_counter() - self._start)
+        return False
+
+
+def stage(name: str) -> _StageTimer:
+    """Context manager timing one pipeline stage: ``with stage("ocr"): ...``"""
+    observe = _stage_observers.get(name)
+    if observe is None:
+        observe = _stage_observers[name] = STAGE_LATENCY.labels(name).observe
+    return _StageTimer(observe)
+
+
+def record_cache(name: str, hit: bool):
+    _cache_counters[(name, hit)]()
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that records latency and in-flight requests under its path template."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path
+        in_flight = {method: REQUESTS_IN_FLIGHT.labels(method, route) for method in self.methods}
+        observers: Dict[Tuple[str, int], Callable[[float], None]] = {}
+
+        async def instrumented_handler(request):
+            method = request.method
+            gauge = in_flight.get(method) or REQUESTS_IN_FLIGHT.labels(method, route)
+            gauge.inc()
+            status_code = 500
+            start = _perf_counter()
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            finally:
+                elapsed = _perf_counter() - start
+                gauge.dec()
+                observe = observers.get((method, status_code))
+                if observe is None:
+                    observe = observers[(method, status_code)] = REQUEST_LATENCY.labels(
+                        method, route, str(status_code)
+                    ).observe
+                observe(elapsed)
+
+        return instrumented_handler
+
+
+def render_latest() -> bytes:
+    """Exposition text for /metrics, aggregated across workers in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
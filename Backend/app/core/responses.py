@@ -0,0 +1,65 @@
+# app/core/responses.py
+"""
+JSON rendering and ``fields=`` projection.
+
+``FastJSONResponse`` is the app's default response class. It renders with
+orjson when installed and with compact ``json.dumps`` otherwise.
+
+Endpoints that return large objects accept an opt-in ``fields`` query
+parameter (``?fields=id,original_filename``) so clients receive only what
+they render:
+
+    fields: Optional[FrozenSet[str]] = Depends(field_projection("id", "summary"))
+    ...
+    return project(payload, fields)
+
+Unknown names are a 400, so a typo doesn't silently return an empty object.
+"""
+import json
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional
+
+from fastapi import HTTPException, Query, status
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def field_projection(*names: str) -> Callable[..., Optional[FrozenSet[str]]]:
+    """Dependency parsing ``?fields=a,b`` against the names an endpoint can return."""
+    allowed = frozenset(names)
+
+    def dependency(
+        fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(names)}")
+    ) -> Optional[FrozenSet[str]]:
+        if not fields:
+            return None
+        requested = frozenset(name.strip() for name in fields.split(",") if name.strip())
+        unknown = requested - allowed
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        return requested or None
+
+    return dependency
+
+
+def project(payload: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return payload
+    return {key: value for key, value in payload.items() if key in fields}
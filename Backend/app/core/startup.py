@@ -0,0 +1,96 @@
+# app/core/startup.py
+"""
+Startup profiling and warm-up.
+
+Nothing expensive happens at import time: the DB engine, JWKS, embedding model
+and LLM clients are all created lazily on first use. ``warm_up`` creates them
+ahead of the first request, running the independent ones in parallel, and
+``profiler`` records how long each startup phase took.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Collects (phase, start, duration) timings relative to process start-up."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start - self.started, time.perf_counter() - start))
+
+    def report(self, title: str = "Startup timings"):
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        logger.info(
+            "%s (total %.3fs)", title, time.perf_counter() - self.started,
+            extra={"phases": {name: {"offset_s": round(offset, 3), "seconds": round(duration, 3)}
+                              for name, offset, duration in phases}},
+        )
+
+
+profiler = StartupProfiler()
+
+# name -> {"ok": bool, "seconds": float, "error": Optional[str]}
+warmup_status: Dict[str, Dict] = {}
+warmup_done = threading.Event()
+
+
+def _warmup_tasks() -> Dict[str, Callable[[], None]]:
+    # Imported here so importing this module stays cheap
+    from ..databse import get_engine
+    from ..core.auth import fetch_jwks
+    from ..services.document_store import get_document_store
+    from ..services.llm_router import get_llm_router
+    from ..services.user_directory import ensure_indexes
+
+    return {
+        # Tables already exist (init_db runs in lifespan); this opens the pool and builds indexes
+        "database": lambda: ensure_indexes(get_engine()),
+        "jwks": fetch_jwks,
+        "embedding_model": lambda: get_document_store().embedding_model.embed_query("warm-up"),
+        "llm_clients": get_llm_router,
+    }
+
+
+def _run(name: str, task: Callable[[], None]):
+    start = time.perf_counter()
+    error: Optional[str] = None
+    with profiler.phase(f"warmup:{name}"):
+        try:
+            task()
+        except Exception as e:
+            # Not fatal: the dependency is initialised lazily on first use
+            error = str(e)
+            logger.warning("Warm-up of %s failed: %s", name, error)
+    warmup_status[name] = {"ok": error is None, "seconds": time.perf_counter() - start, "error": error}
+
+
+def warm_up(tasks: Optional[Dict[str, Callable[[], None]]] = None):
+    """Initialise independent dependencies in parallel, then print timings."""
+    tasks = tasks if tasks is not None else _warmup_tasks()
+    with ThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix="warmup") as pool:
+        for name, task in tasks.items():
+            pool.submit(_run, name, task)
+
+    # First probe pass, so readiness has latencies as soon as warm-up is done
+    from .health import health_checker
+    with profiler.phase("warmup:probes"):
+        health_checker.refresh(force=True)
+    warmup_done.set()
+    profiler.report()
@@ -0,0 +1,357 @@
+# app/core/tracing.py
+"""
+Lightweight in-process tracing.
+
+Spans follow the OpenTelemetry data model (128-bit trace id, 64-bit span ids,
+parent links, attributes, status) and context is propagated with the W3C
+``traceparent`` header, so traces can be joined with an OTel collector later.
+
+Every request records its spans; whether the finished trace is exported is
+decided when the root span ends: traces are kept if they were head-sampled
+(TRACING_SAMPLE_RATE, or the sampled flag of an incoming traceparent) and,
+regardless of sampling, when the request took longer than
+TRACING_SLOW_THRESHOLD_MS (kept as exemplars). Exporters write JSON lines to
+a file or keep traces in memory for tests. The file exporter only enqueues
+the trace; a background thread serializes and writes it, like the logging
+queue (app/core/logging_config.py).
+
+Usage:
+
+    with start_span("s3.put_object", bucket=bucket):
+        ...
+
+    @traced("document_store.store_document")
+    def store_document(...): ...
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import settings
+from .metrics import TRACES_DROPPED
+
+# Cap per trace so loops (e.g. account deletion) can't grow a trace unbounded
+MAX_SPANS_PER_TRACE = 1000
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Trace:
+    __slots__ = ("trace_id", "sampled", "spans", "dropped")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if len(self.trace.spans) < MAX_SPANS_PER_TRACE:
+            self.trace.spans.append(self)
+        else:
+            self.trace.dropped += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+# ---------------------------
+# Exporters
+# ---------------------------
+class MemoryExporter:
+    """Keeps exported traces in a list; meant for tests."""
+
+    def __init__(self):
+        self.traces: List[Dict[str, Any]] = []
+
+    def export(self, record: Dict[str, Any]):
+        self.traces.append(record)
+
+
+class FileExporter:
+    """
+    Appends one JSON line per exported trace, from a writer thread. When
+    ``max_queue`` traces are waiting, further ones are dropped and counted
+    (``traces_dropped_total``) rather than blocking the request.
+    """
+
+    def __init__(self, path: str, max_queue: int = 1000):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def export(self, record: Dict[str, Any]):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            TRACES_DROPPED.inc()
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                record = self._queue.get()
+                # Write whatever queued up behind it, then flush once
+                while record is not None:
+                    f.write(json.dumps(record, default=str) + "\n")
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                f.flush()
+                if record is None:
+                    return
+
+    def close(self, timeout: float = 5.0):
+        """Write the queued traces and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+def _default_exporter():
+    if settings.TRACING_EXPORTER == "file":
+        return FileExporter(settings.TRACING_FILE, settings.TRACING_QUEUE_SIZE)
+    if settings.TRACING_EXPORTER == "memory":
+        return MemoryExporter()
+    return None
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, slow_threshold_ms: float, exporter=None):
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_root(self, name: str, traceparent: Optional[str] = None, **attributes) -> Span:
+        """Start a request's root span, continuing an incoming W3C trace if given."""
+        parent_id = None
+        match = _TRACEPARENT.match(traceparent or "")
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            trace = Trace(trace_id, sampled=bool(int(flags, 16) & 1))
+        else:
+            trace = Trace(f"{random.getrandbits(128):032x}", sampled=random.random() < self.sample_rate)
+        return Span(trace, name, parent_id, attributes)
+
+    def finish_root(self, root: Span):
+        root.end()
+        if self.exporter is None:
+            return
+        slow = root.duration_ms >= self.slow_threshold_ms
+        if not (root.trace.sampled or slow):
+            return
+        self.exporter.export({
+            "trace_id": root.trace.trace_id,
+            "root": root.name,
+            "duration_ms": round(root.duration_ms, 3),
+            "sampled": root.trace.sampled,
+            "exemplar": slow,
+            "dropped_spans": root.trace.dropped,
+            "spans": [span.to_dict() for span in root.trace.spans],
+        })
+
+
+tracer = Tracer(
+    sample_rate=settings.TRACING_SAMPLE_RATE,
+    slow_threshold_ms=settings.TRACING_SLOW_THRESHOLD_MS,
+    exporter=_default_exporter(),
+)
+
+
+# ---------------------------
+# Span API
+# ---------------------------
+class start_span:
+    """
+    Context manager for a child of the current span. Outside a traced request
+    (or with tracing disabled) it does nothing.
+    """
+    __slots__ = ("name", "attributes", "span")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is not None:
+            self.span = Span(parent.trace, self.name, parent.span_id, self.attributes)
+            self.span._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        if span is not None:
+            if exc is not None:
+                span.error = f"{exc_type.__name__}: {exc}"
+            _current_span.reset(span._token)
+            span.end()
+        return False
+
+
+def traced(name: Optional[str] = None):
+    """Decorator wrapping a sync or async function in a span."""
+    def decorator(fn: Callable):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes):
+    """Record an already-finished child span (e.g. from SQLAlchemy events)."""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    span = Span(parent.trace, name, parent.span_id, attributes)
+    span.start_ns = start_ns
+    span.end_ns = end_ns
+    if len(parent.trace.spans) < MAX_SPANS_PER_TRACE:
+        parent.trace.spans.append(span)
+    else:
+        parent.trace.dropped += 1
+
+
+def detached_span(name: str, **attributes) -> Optional[Span]:
+    """
+    Child span of the current span that is not made current itself, for
+    lifetimes that cross threads or generator boundaries (e.g. DB sessions).
+    Call ``.end()`` on it when done.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent header value for outgoing calls made in the current span."""
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+
+# ---------------------------
+# ASGI middleware
+# ---------------------------
+class TracingMiddleware:
+    """Opens a root span per HTTP request and returns its traceparent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                incoming = value.decode("latin-1")
+                break
+
+        root = tracer.start_root(f"{scope['method']} {scope['path']}", incoming, **{"http.method": scope["method"]})
+        token = _current_span.set(root)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"traceparent", root.traceparent.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except Exception as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                # Name by route template so traces group like the metrics do
+                root.name = f"{scope['method']} {route.path}"
+            _current_span.reset(token)
+            tracer.finish_root(root)
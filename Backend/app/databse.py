@@ -1,12 +1,16 @@
 import os
 import json
+import logging
+import threading
+import time
 from urllib.parse import quote_plus
 
-import boto3
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+logger = logging.getLogger(__name__)
+
 # ---------------------------
 # Fetch DB credentials from Secrets Manager
 # ---------------------------
@@ -14,6 +18,8 @@ def get_rds_secret(secret_name: str, region: str) -> dict:
     """
     Fetch RDS credentials stored in AWS Secrets Manager.
     """
+    import boto3  # deferred: only needed when credentials come from Secrets Manager
+
     client = boto3.client("secretsmanager", region_name=region)
     response = client.get_secret_value(SecretId=secret_name)
     secret = json.loads(response["SecretString"])
@@ -50,23 +56,86 @@ def build_database_url():
 # ---------------------------
 # SQLAlchemy setup
 # ---------------------------
-DATABASE_URL = build_database_url()
-print(f"Connecting to DB: {DATABASE_URL.split('@')[1]}")  # safe: hides username/password
-
-# Connect args (can include sslmode if needed)
-connect_args = {}
-if "sslmode=require" in DATABASE_URL:
-    connect_args["sslmode"] = "require"
-
-engine = create_engine(
-    DATABASE_URL,
-    connect_args=connect_args,
-    pool_pre_ping=True,     # auto-reconnect stale connections
-    pool_recycle=3600,      # recycle connections every hour
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The engine is created on first use rather than at import time, so importing
+# the app (and every model) doesn't call Secrets Manager or touch the network.
 Base = declarative_base()
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Create the SQLAlchemy engine on first call and return it."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                database_url = build_database_url()
+                logger.info("Connecting to DB: %s", database_url.rsplit('@', 1)[-1])  # safe: hides username/password
+
+                # Connect args (can include sslmode if needed)
+                connect_args = {}
+                if "sslmode=require" in database_url:
+                    connect_args["sslmode"] = "require"
+
+                _engine = create_engine(
+                    database_url,
+                    connect_args=connect_args,
+                    pool_pre_ping=True,     # auto-reconnect stale connections
+                    pool_recycle=3600,      # recycle connections every hour
+                )
+                _instrument_engine(_engine)
+                _session_factory.configure(bind=_engine)
+    return _engine
+
+
+def _instrument_engine(engine):
+    """Record each statement as a db.query span when tracing is on."""
+    from .core.tracing import record_span, tracer
+
+    if not tracer.enabled:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_ns", []).append(time.time_ns())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_ns = conn.info["query_start_ns"].pop()
+        record_span("db.query", start_ns, time.time_ns(), **{"db.statement": statement[:200]})
+
+
+def SessionLocal():
+    """Open a new session, creating the engine first if needed."""
+    get_engine()
+    return _session_factory()
+
+
+# Columns added to existing tables after they were first created; create_all
+# only creates missing tables. (table, column, SQL type)
+_ADDED_COLUMNS = [
+    ("reports", "summarized_at", "TIMESTAMP WITH TIME ZONE"),
+]
+
+
+def _add_missing_columns(engine):
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column, sql_type in _ADDED_COLUMNS:
+            if column not in {c["name"] for c in inspector.get_columns(table)}:
+                logger.info("Adding column %s.%s", table, column)
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+
+
+def init_db():
+    """Create the engine and any missing tables. Called from the app's lifespan."""
+    # Import models so they are registered on Base.metadata
+    from .models import users, reports, reindex, chat, webhooks  # noqa: F401
+    Base.metadata.create_all(bind=get_engine())
+    _add_missing_columns(get_engine())
 
 # ---------------------------
 # FastAPI DB dependency
@@ -75,8 +144,13 @@ def get_db():
     """
     Provide a SQLAlchemy session per request in FastAPI.
     """
+    from .core.tracing import detached_span
+
     db = SessionLocal()
+    span = detached_span("db.session")
     try:
         yield db
     finally:
         db.close()
+        if span is not None:
+            span.end()
@@ -0,0 +1,29 @@
+# app/models/chat.py
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.databse import Base
+
+class ChatSession(Base):
+    """A user's conversation: rolling summary plus bookkeeping. Turns are in chat_turns."""
+    __tablename__ = "chat_sessions"
+
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_turns = Column(Integer, nullable=False, default=0)  # turns folded into summary
+    turn_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class ChatTurn(Base):
+    """One question/answer pair. Append-only; ``seq`` counts from 1 within a session."""
+    __tablename__ = "chat_turns"
+    __table_args__ = (UniqueConstraint("session_id", "seq", name="uq_chat_turn_seq"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(36), ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
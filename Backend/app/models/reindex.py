@@ -0,0 +1,21 @@
+# app/models/reindex.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.databse import Base
+
+class ReindexCheckpoint(Base):
+    """Per-user progress of a reindex run, so interrupted runs can resume."""
+    __tablename__ = "reindex_checkpoints"
+    __table_args__ = (UniqueConstraint("run_id", "clerk_id", name="uq_reindex_run_user"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String(64), nullable=False, index=True)
+    clerk_id = Column(String(64), nullable=False)
+    index_version = Column(String(255), nullable=False)
+    status = Column(String(16), nullable=False, default="pending")  # pending | done | failed
+    reports = Column(Integer, default=0)
+    chunks = Column(Integer, default=0)
+    seconds = Column(Float, default=0.0)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,5 +1,5 @@
 # app/models/reports.py
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Float, ARRAY
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Float, ARRAY, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -18,9 +18,40 @@ class Reports(Base):
     extracted_text = Column(Text)
     summary = Column(Text, nullable=True)
     text_vector = Column(ARRAY(Float), nullable=True)
+    # Set whenever summary/text_vector are (re)written; part of ReportIndex's version
+    summarized_at = Column(DateTime(timezone=True), nullable=True)
     
     # Foreign Keys
     user_id = Column(Integer, ForeignKey("users.id"))
     
     # Relationships
-    user = relationship("User", back_populates="reports") 
\ No newline at end of file
+    user = relationship("User", back_populates="reports") 
+    previews = relationship("ReportPreview", lazy="selectin", order_by="ReportPreview.page",
+                            cascade="all, delete-orphan")
+
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        return next((preview.url for preview in self.previews if preview.kind == "thumbnail"), None)
+
+    @property
+    def preview_urls(self) -> List[str]:
+        return [preview.url for preview in self.previews if preview.kind == "page"]
+
+class ReportPreview(Base):
+    """Rendered page image of a report, stored in S3 under its sha256 (app/services/thumbnails.py)."""
+    __tablename__ = "report_previews"
+    __table_args__ = (UniqueConstraint("report_id", "page", name="uq_report_preview_page"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False, index=True)
+    page = Column(Integer, nullable=False)  # 1-based
+    kind = Column(String(16), nullable=False)  # thumbnail | page
+    digest = Column(String(64), nullable=False, index=True)
+    s3_key = Column(String, nullable=False)
+    width = Column(Integer)
+    height = Column(Integer)
+
+    @property
+    def url(self) -> str:
+        # Served by GET /api/reports/thumbnails/{digest}.jpg
+        return f"/api/reports/thumbnails/{self.digest}.jpg"
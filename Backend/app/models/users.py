@@ -41,4 +41,24 @@ class User(Base):
     
     # Relationships
     role = relationship("UserRole", back_populates="users")
-    reports = relationship("Reports", back_populates="user")
\ No newline at end of file
+    reports = relationship("Reports", back_populates="user")
+    image_variants = relationship("ProfileImageVariant", order_by="ProfileImageVariant.width",
+                                  cascade="all, delete-orphan")
+
+class ProfileImageVariant(Base):
+    """One resized copy of a user's profile image, named by its sha256 (app/services/profile_images.py)."""
+    __tablename__ = "profile_image_variants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    digest = Column(String(64), nullable=False, index=True)
+    content_type = Column(String(32), nullable=False)
+    location = Column(String, nullable=False)  # s3://bucket/key or a path under static/
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    @property
+    def url(self) -> str:
+        # Served by GET /api/users/images/{digest}.{ext}
+        return f"/api/users/images/{self.digest}.{self.content_type.split('/')[-1]}"
@@ -0,0 +1,25 @@
+# app/models/webhooks.py
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.databse import Base
+
+class ClerkWebhookEvent(Base):
+    """
+    Inbox of received Clerk webhooks, one row per svix message id. The unique
+    svix_id drops redeliveries; app/services/clerk_webhooks.py applies pending
+    rows to ``users`` in batches.
+    """
+    __tablename__ = "clerk_webhook_events"
+    __table_args__ = (Index("ix_clerk_webhook_events_status_id", "status", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    svix_id = Column(String(64), unique=True, nullable=False)
+    event_type = Column(String(64), nullable=False)
+    clerk_id = Column(String(64), nullable=False, index=True)
+    occurred_at = Column(BigInteger, nullable=False)  # Clerk's event timestamp, ms since epoch
+    payload = Column(Text, nullable=False)  # the fields to apply, as JSON
+    status = Column(String(16), nullable=False, default="pending")  # pending | done | failed
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -3,43 +3,38 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
+import logging
 
 from ..models.users import User, UserRole
 from ..schemas.users import TokenResponse
 from ..databse import get_db
 # from ..core.auth import verify_password, create_access_token, get_password_hash
 from ..config import settings
+from ..core.metrics import InstrumentedRoute
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.post("/token", response_model=TokenResponse)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    # --- Start Debug Logging ---
-    print(f"Attempting login for username: '{form_data.username}'")
     user = db.query(User).filter(User.email == form_data.username).first()
 
     if not user:
-        print(f"User '{form_data.username}' not found in database.")
+        logger.info("Login failed: unknown user", extra={"email": form_data.username})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password", # Keep generic for security
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    print(f"User found: ID={user.id}, Email='{user.email}'")
-    print(f"Password from form: '{form_data.password}' (Length: {len(form_data.password)})")
-    print(f"Hash from DB: '{user.hashed_password}' (Length: {len(user.hashed_password)})")
-
     password_match = verify_password(form_data.password, user.hashed_password)
-    print(f"Result of verify_password: {password_match}")
-    # --- End Debug Logging ---
 
-    # Original verification logic
     if not password_match:
-        print("Password verification failed.") # Added log
+        logger.info("Login failed: wrong password for user %s", user.id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -55,7 +50,7 @@ async def login_for_access_token(
     # Get user role
     role_name = user.role.name if user.role else "user"
     
-    print("Login successful, returning token.") # Added log
+    logger.info("Login successful for user %s", user.id)
     return {
         "access_token": access_token,
         "token_type": "bearer",
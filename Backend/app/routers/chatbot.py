@@ -1,27 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Body
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import Dict, Any, List
-import os
-import json
-from langchain.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-import google.generativeai as genai
+from typing import Dict, Any, Optional
+import logging
 
 from ..models.users import User
 from ..databse import get_db
+from ..core.admission import rate_limit, stage_queue
 from ..core.auth import get_current_user
-from ..services.document_store import DocumentStore
+from ..services.chat_sessions import get_chat_session_store, is_follow_up, rewrite_question
+from ..services.context_builder import build_context
+from ..services.document_store import get_document_store
+from ..services.llm_router import LLMUnavailable, get_llm_router
+from ..services.report_summaries import get_report_index
 from ..config import settings
+from ..core.metrics import InstrumentedRoute, stage
+from ..core.tracing import start_span, traced
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Configure Gemini
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-# Configure OpenAI
-os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
+router = APIRouter(route_class=InstrumentedRoute)
 
 PROMPT_TEMPLATE = """
 You are a medical document assistant that helps users understand their EXISTING medical reports and prescriptions. 
@@ -35,7 +33,7 @@ CRITICAL RULES:
 
 Context from uploaded documents:
 {context}
-
+{history}
 Question: {question}
 
 Instructions:
@@ -63,45 +61,88 @@ def extract_filename(source_path: str) -> str:
     return filename if filename else "Unknown Document"
 
 
-@router.post("/chat", response_model=Dict[str, Any])
+@router.post("/chat", response_model=Dict[str, Any], dependencies=[Depends(rate_limit("chat"))])
+@traced("chatbot.process_chat_message")
 async def process_chat_message(
+    background_tasks: BackgroundTasks,
     query: str = Body(..., embed=True),
+    session_id: Optional[str] = Body(None, embed=True),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        document_store = DocumentStore()
-        vectorstore = document_store.get_vectorstore(current_user.clerk_id)
+        sessions = get_chat_session_store()
+        chat_session = sessions.open(db, current_user.id, session_id)
+
+        document_store = get_document_store()
+        # Blocking: a disk load, or an HTTP call to the owning node (CLUSTER_NODES)
+        vectorstore = await run_in_threadpool(document_store.get_vectorstore, current_user.clerk_id)
         
         # Handle case where no documents are uploaded
         if vectorstore is None:
             return {
                 "message": "I couldn't find any medical reports to reference. Please upload your medical documents first so I can provide accurate information about your health records.",
-                "citations": []
+                "citations": [],
+                "session_id": chat_session.id
             }
 
-        llm = ChatOpenAI(model_name=settings.LLM_MODEL_NAME, temperature=0.2)
+        # Bounded view of the conversation: rolling summary + last few turns
+        history = sessions.history(chat_session)
+
+        # Follow-ups ("and the second one?") are searched as standalone questions
+        search_query = query
+        if is_follow_up(query, chat_session):
+            with stage("query_rewrite"):
+                search_query = await rewrite_question(query, history)
 
-        prompt = PromptTemplate(
-            template=PROMPT_TEMPLATE,
-            input_variables=["context", "question"]
+        # Two-stage retrieval: pick the closest reports by summary vector, then
+        # search chunks only within them
+        def embed_and_pick_reports():
+            query_vector = document_store.embedding_model.embed_query(search_query)
+            return query_vector, get_report_index().top_reports(db, current_user.id, query_vector)
+
+        # CPU-bound embedding plus a DB query: a worker thread, within the embedding concurrency limit
+        async with stage_queue("embedding").slot():
+            query_vector, report_ids = await run_in_threadpool(embed_and_pick_reports)
+        scored_chunks = await run_in_threadpool(
+            document_store.search_by_vector, vectorstore, query_vector, settings.CONTEXT_FETCH_K, report_ids
         )
+        if report_ids and not scored_chunks:
+            # Chunks indexed before they carried report ids; see app.cli.reindex
+            scored_chunks = await run_in_threadpool(
+                document_store.search_by_vector, vectorstore, query_vector, settings.CONTEXT_FETCH_K
+            )
 
-        # Use retriever to get relevant documents
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-        
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type_kwargs={
-                "prompt": prompt,
-                "document_variable_name": "context"
-            }
+        # Merge, dedupe and pack the chunks into the context token budget
+        with stage("context_build"):
+            context, source_documents = build_context(scored_chunks)
+
+        prompt = PROMPT_TEMPLATE.format(
+            context=context,
+            history=f"\nConversation so far:\n{history}\n" if history else "",
+            question=query,
         )
 
-        result = qa_chain.invoke({"query": query})
+        # Routed across the configured providers, with hedging and failover
+        try:
+            with stage("llm_call"), start_span("llm.complete"):
+                answer = await get_llm_router().complete(prompt)
+        except LLMUnavailable as e:
+            logger.warning("LLM unavailable: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The assistant is temporarily unavailable. Please try again shortly.",
+                headers={"Retry-After": str(int(settings.LLM_BREAKER_COOLDOWN_SECONDS))},
+            )
+
+        result = {"result": answer, "source_documents": source_documents}
+
+        # Record the turn; turns that leave the history window are folded
+        # into the summary after the response is sent
+        chat_session = sessions.append_turn(db, chat_session, query, answer)
+        if sessions.needs_summary(chat_session):
+            background_tasks.add_task(sessions.summarize, chat_session.id)
+        background_tasks.add_task(sessions.purge_expired)
         
         # Get the AI's response
         ai_response = result["result"].lower()
@@ -118,16 +159,16 @@ async def process_chat_message(
         
         is_refusal = any(indicator in ai_response for indicator in refusal_indicators)
         
-        print(f"\nQuery: {query}")
-        print(f"AI Response preview: {result['result'][:300]}...")
-        print(f"Is refusal/no-info response: {is_refusal}")
-        
         # If AI refused or said it doesn't have info, don't show any citations
         if is_refusal:
-            print("AI indicated no relevant information - returning empty citations")
+            logger.info(
+                "Chat answered with no relevant information",
+                extra={"query": query, "answer": answer, "sources": len(source_documents), "citations": 0},
+            )
             return {
                 "message": result["result"],
-                "citations": []
+                "citations": [],
+                "session_id": chat_session.id
             }
         
         # Extract keywords from the AI response (remove common words)
@@ -136,65 +177,99 @@ async def process_chat_message(
         
         # Filter to meaningful keywords (length > 3)
         response_keywords = {word.strip('.,!?:;()[]{}') for word in response_words if len(word) > 3}
-        
-        print(f"Response keywords: {list(response_keywords)[:15]}...")  # Show first 15
 
         # Analyze which source documents were actually used in the response
         citations = []
         seen_documents = set()
         
-        if "source_documents" in result and response_keywords:
-            print(f"\nAnalyzing {len(result['source_documents'])} source documents:")
-            
-            for idx, doc in enumerate(result["source_documents"]):
-                metadata = doc.metadata
-                document_name = metadata.get('filename') or metadata.get('source', '')
-                content = doc.page_content.lower() if hasattr(doc, 'page_content') else ''
+        # Per-document scoring is logged at DEBUG only, without keywords (they
+        # are taken from the answer, i.e. medical content)
+        log_scores = logger.isEnabledFor(logging.DEBUG)
+        with stage("citation_scoring"):
+            if "source_documents" in result and response_keywords:
+                for idx, doc in enumerate(result["source_documents"]):
+                    metadata = doc.metadata
+                    document_name = metadata.get('filename') or metadata.get('source', '')
+                    content = doc.page_content.lower() if hasattr(doc, 'page_content') else ''
                 
-                # Count how many response keywords appear in this document
-                matching_keywords = [kw for kw in response_keywords if kw in content]
-                match_score = len(matching_keywords)
+                    # Count how many response keywords appear in this document
+                    matching_keywords = [kw for kw in response_keywords if kw in content]
+                    match_score = len(matching_keywords)
                 
-                # Calculate match percentage
-                match_percentage = (match_score / len(response_keywords) * 100) if response_keywords else 0
-                
-                print(f"  Doc {idx}: {document_name}")
-                print(f"    Keyword matches: {match_score}/{len(response_keywords)} ({match_percentage:.1f}%)")
-                print(f"    Sample matches: {matching_keywords[:8]}")
-                
-                # Balanced criteria:
-                # - Good keyword match (25%+) with minimum 4 keywords, OR
-                # - Very high keyword match (40%+) regardless of count
-                MIN_MATCH_PERCENTAGE_HIGH = 40  # Very confident match
-                MIN_MATCH_PERCENTAGE_MED = 25   # Medium confidence
-                MIN_KEYWORD_COUNT = 4
+                    # Calculate match percentage
+                    match_percentage = (match_score / len(response_keywords) * 100) if response_keywords else 0
+
+                    # Balanced criteria:
+                    # - Good keyword match (25%+) with minimum 4 keywords, OR
+                    # - Very high keyword match (40%+) regardless of count
+                    MIN_MATCH_PERCENTAGE_HIGH = 40  # Very confident match
+                    MIN_MATCH_PERCENTAGE_MED = 25   # Medium confidence
+                    MIN_KEYWORD_COUNT = 4
                 
-                is_relevant = (
-                    (match_percentage >= MIN_MATCH_PERCENTAGE_HIGH) or
-                    (match_percentage >= MIN_MATCH_PERCENTAGE_MED and match_score >= MIN_KEYWORD_COUNT)
-                )
+                    is_relevant = (
+                        (match_percentage >= MIN_MATCH_PERCENTAGE_HIGH) or
+                        (match_percentage >= MIN_MATCH_PERCENTAGE_MED and match_score >= MIN_KEYWORD_COUNT)
+                    )
                 
-                if is_relevant:
-                    if document_name:
-                        cleaned_name = extract_filename(document_name)
+                    if is_relevant:
+                        if document_name:
+                            cleaned_name = extract_filename(document_name)
                         
-                        if cleaned_name and cleaned_name not in seen_documents:
-                            seen_documents.add(cleaned_name)
-                            citations.append({"document_name": cleaned_name})
-                            print(f"    ✓ CITED (relevant to response)")
-                else:
-                    print(f"    ✗ Not cited (insufficient relevance: {match_percentage:.1f}% with {match_score} keywords)")
-        
-        print(f"\nFinal citations: {[c['document_name'] for c in citations]}")
+                            if cleaned_name and cleaned_name not in seen_documents:
+                                seen_documents.add(cleaned_name)
+                                citations.append({"document_name": cleaned_name})
+
+                    if log_scores:
+                        logger.debug(
+                            "Doc %d: %d/%d keyword matches (%.1f%%), relevant=%s",
+                            idx, match_score, len(response_keywords), match_percentage, is_relevant,
+                        )
+
+        logger.info(
+            "Chat answered",
+            extra={"query": query, "answer": answer, "sources": len(source_documents), "citations": len(citations)},
+        )
 
         return {
             "message": result["result"],
-            "citations": citations
+            "citations": citations,
+            "session_id": chat_session.id
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error during processing: {str(e)}")
+        logger.exception("Chat processing failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process chat message: {str(e)}"
         )
+
+
+@router.get("/sessions/{session_id}", response_model=Dict[str, Any])
+async def get_chat_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    turns = get_chat_session_store().turns(db, current_user.id, session_id)
+    if turns is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+    return {
+        "session_id": session_id,
+        "turns": [
+            {"question": turn.question, "answer": turn.answer, "created_at": turn.created_at}
+            for turn in turns
+        ]
+    }
+
+
+@router.delete("/sessions/{session_id}", response_model=Dict[str, Any])
+async def delete_chat_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not get_chat_session_store().delete(db, current_user.id, session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+    return {"success": True}
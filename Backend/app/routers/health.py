@@ -0,0 +1,36 @@
+# app/routers/health.py
+from fastapi import APIRouter, Response, status
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..core.health import health_checker
+from ..core.startup import warmup_done, warmup_status
+from ..core.metrics import InstrumentedRoute
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+@router.get("/live")
+async def liveness():
+    """The process is up and serving. Says nothing about its dependencies."""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness(response: Response):
+    """
+    Ready once warm-up has finished and every dependency probe passes.
+    Reports each dependency's last probe latency either way.
+    """
+    warmed_up = warmup_done.is_set() or settings.STARTUP_WARMUP == "off"
+    dependencies = health_checker.results
+    if warmed_up:
+        dependencies = await run_in_threadpool(health_checker.refresh)
+
+    ready = warmed_up and health_checker.healthy()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return {
+        "status": "ready" if ready else "not_ready",
+        "warmup": {"done": warmup_done.is_set(), "tasks": warmup_status},
+        "dependencies": dependencies,
+    }
@@ -0,0 +1,120 @@
+# app/routers/internal.py
+"""
+Node-to-node vector API, used when CLUSTER_NODES spreads node-local indexes
+over several nodes (see app/services/vector_routing.py). Every endpoint acts
+on this node's own store and requires the X-Cluster-Secret header.
+"""
+import json
+import logging
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Body, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..core.admission import stage_queue
+from ..core.cluster import verify_cluster_secret
+from ..core.metrics import InstrumentedRoute
+from ..services.document_store import build_dir, get_local_document_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=InstrumentedRoute, dependencies=[Depends(verify_cluster_secret)])
+
+
+def _rows(scored) -> List[Dict[str, Any]]:
+    return [{"page_content": doc.page_content, "metadata": doc.metadata, "score": float(score)}
+            for doc, score in scored]
+
+
+@router.get("/vectors/{clerk_id}")
+async def index_exists(clerk_id: str):
+    store = get_local_document_store()
+    return {"exists": await run_in_threadpool(store.get_vectorstore, clerk_id) is not None}
+
+
+@router.get("/vectors/{clerk_id}/versions")
+async def index_versions(clerk_id: str):
+    return await run_in_threadpool(get_local_document_store().get_index_versions, clerk_id)
+
+
+@router.post("/vectors/{clerk_id}/search")
+async def search(
+    clerk_id: str,
+    k: int = Body(5),
+    embedding: Optional[List[float]] = Body(None),
+    query: Optional[str] = Body(None),
+    report_ids: Optional[List[int]] = Body(None),
+):
+    """
+    With ``embedding``: (chunk, relevance) pairs, like DocumentStore.search_by_vector.
+    With ``query``: (chunk, distance) pairs, like get_relevant_documents.
+    """
+    store = get_local_document_store()
+    if embedding is None:
+        return {"results": _rows(await run_in_threadpool(store.get_relevant_documents, clerk_id, query or "", k))}
+
+    def run():
+        vector_store = store.get_vectorstore(clerk_id)
+        if vector_store is None:
+            return []
+        return store.search_by_vector(vector_store, embedding, k, report_ids)
+
+    return {"results": _rows(await run_in_threadpool(run))}
+
+
+@router.post("/vectors/{clerk_id}/documents")
+async def add_documents(clerk_id: str, documents: List[Dict[str, Any]] = Body(..., embed=True)):
+    """Chunk, embed and store documents (``{"text", "metadata"}`` each) in one write."""
+    store = get_local_document_store()
+    items = [(document["text"], document["metadata"]) for document in documents]
+    async with stage_queue("embedding").slot():
+        await run_in_threadpool(store.store_documents, clerk_id, items)
+    return {"success": True}
+
+
+@router.delete("/vectors/{clerk_id}/reports/{report_id}")
+async def delete_report(clerk_id: str, report_id: int):
+    await run_in_threadpool(get_local_document_store().delete_document, report_id, clerk_id)
+    return {"success": True}
+
+
+@router.delete("/vectors/{clerk_id}")
+async def delete_user(clerk_id: str):
+    await run_in_threadpool(get_local_document_store().delete_user_collection, clerk_id)
+    return {"success": True}
+
+
+@router.post("/vectors/{clerk_id}/import")
+async def import_index(clerk_id: str, request: Request):
+    """
+    Replace a user's index with the chunks streamed in the body (one JSON
+    object per line, as produced by DocumentStore.export_vectors). The index is
+    built side by side and swapped in only once the stream is complete.
+    """
+    store = get_local_document_store()
+    new_dir = build_dir(clerk_id, f"transfer-{uuid.uuid4().hex[:8]}")
+    vector_store = await run_in_threadpool(store.open_vectorstore, clerk_id, new_dir)
+    page_size = max(1, settings.CLUSTER_TRANSFER_PAGE_SIZE)
+    received = 0
+    try:
+        pending, buffer = [], b""
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            pending.extend(json.loads(line) for line in lines if line.strip())
+            if len(pending) >= page_size:
+                await run_in_threadpool(store.add_vectors, vector_store, pending)
+                received += len(pending)
+                pending = []
+        if buffer.strip():
+            pending.append(json.loads(buffer))
+        await run_in_threadpool(store.add_vectors, vector_store, pending)
+        received += len(pending)
+        await run_in_threadpool(store.swap_user_index, clerk_id, new_dir)
+    except BaseException:
+        await run_in_threadpool(store.discard_build, clerk_id, new_dir)
+        raise
+    logger.info("Imported %s chunks for user %s", received, clerk_id)
+    return {"chunks": received}
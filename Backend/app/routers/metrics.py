@@ -0,0 +1,12 @@
+# app/routers/metrics.py
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from ..core.metrics import InstrumentedRoute, render_latest
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
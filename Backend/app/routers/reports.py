@@ -1,9 +1,14 @@
 # app/routers/reports.py
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, File, UploadFile, Form, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
+import asyncio
+import logging
 import os
+import re
 import shutil
 import uuid
 from datetime import datetime
@@ -12,15 +17,35 @@ from botocore.client import Config as BotoConfig
 from botocore.exceptions import BotoCoreError, ClientError
 
 from ..models.users import User
-from ..models.reports import Reports
+from ..models.reports import ReportPreview, Reports
 from ..schemas.reports import ReportResponse
 from ..databse import get_db
+from ..core.admission import charge_rate_limit, rate_limit, stage_queue
 from ..core.auth import get_current_user
+from ..core.http_cache import make_etag, not_modified, not_modified_response, set_cache_headers
+from ..core.responses import FastJSONResponse, field_projection, project
 from ..services.textract_helper import TextractHelper
-from ..services.document_store import DocumentStore
+from ..services.document_store import get_document_store
+from ..services.report_summaries import summarize_report
+from ..services.thumbnails import (
+    CONTENT_TYPE as THUMBNAIL_CONTENT_TYPE, delete_previews, render_previews, store_previews, thumbnail_cache,
+)
 from ..config import settings
+from ..core.metrics import InstrumentedRoute, record_cache, stage
+from ..core.tracing import start_span, traced
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+# ?fields= projections (app/core/responses.py)
+report_fields = field_projection(*ReportResponse.model_fields)
+upload_fields = field_projection("success", "message", "extracted_text", "report_id", "s3_uri", "thumbnail_url")
+
+def _report_payload(reports: List[Reports], fields: FrozenSet[str]) -> list:
+    return [ReportResponse.model_validate(report).model_dump(mode="json", include=fields) for report in reports]
 
 def _s3():
     # Check if AWS credentials are configured
@@ -49,32 +74,63 @@ def _from_s3_uri(uri: str) -> tuple[str, str]:
     bucket, key = rest.split("/", 1)
     return bucket, key
 
-@router.post("/upload", response_model=dict)
-async def upload_file(
-    file: UploadFile = File(...),
-    description: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    print("upload_file called")
+def _s3_extra_args(file: UploadFile, description: Optional[str], current_user: User) -> dict:
+    extra_args = {
+        "ContentType": file.content_type or "application/octet-stream",
+        "Metadata": {
+            "user_id": str(current_user.id),
+            "clerk_id": str(current_user.clerk_id),
+            "original_filename": file.filename,
+            "description": description or "",
+            "upload_date": datetime.utcnow().isoformat()
+        }
+    }
     
-    # Check if S3 is configured
+    # Add KMS encryption if configured
+    if getattr(settings, "AWS_S3_KMS_KEY_ID", None):
+        extra_args["ServerSideEncryption"] = "aws:kms"
+        extra_args["SSEKMSKeyId"] = settings.AWS_S3_KMS_KEY_ID
+    return extra_args
+
+def _upload_preconditions() -> TextractHelper:
+    """Fail fast when S3 or OCR is not configured; returns the OCR helper."""
     if not (hasattr(settings, 'AWS_S3_BUCKET') and settings.AWS_S3_BUCKET):
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="S3 storage is not configured. Please contact an administrator."
         )
-    
-    # Prepare OCR helper early to fail fast if misconfigured
     try:
-        ocr_helper = TextractHelper()
+        return TextractHelper()
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="OCR service is not properly configured. Please contact an administrator."
         )
 
-    print("here")
+async def _ocr_and_render(ocr_helper: TextractHelper, temp_file_path: str, filename: str):
+    """OCR the file and render its thumbnails side by side. Rendering never raises."""
+    async def ocr():
+        # Bounded so a burst of uploads can't pile up on Textract
+        async with stage_queue("ocr").slot():
+            return await run_in_threadpool(ocr_helper.extract_text_from_pdf, temp_file_path)
+
+    return await asyncio.gather(ocr(), run_in_threadpool(render_previews, temp_file_path, filename))
+
+@router.post("/upload", response_model=dict, dependencies=[Depends(rate_limit("upload"))])
+@traced("reports.upload_file")
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    description: Optional[str] = Form(None),
+    fields: Optional[FrozenSet[str]] = Depends(upload_fields),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    logger.debug("upload_file called by %s", current_user.clerk_id)
+
+    # Check that S3 and OCR are configured before touching the file
+    ocr_helper = _upload_preconditions()
+
     # Temp dir for OCR
     temp_dir = os.path.join(settings.TEMP_DIRECTORY)
     os.makedirs(temp_dir, exist_ok=True)
@@ -91,9 +147,11 @@ async def upload_file(
         with open(temp_file_path, "wb") as temp_file:
             shutil.copyfileobj(file.file, temp_file)
 
-        # OCR processing
+        # OCR processing, with the thumbnail rendered alongside
         try:
-            extracted_text = ocr_helper.extract_text_from_pdf(temp_file_path)
+            extracted_text, previews = await _ocr_and_render(ocr_helper, temp_file_path, file.filename)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -102,23 +160,24 @@ async def upload_file(
 
         # Upload to S3
         s3_client = _s3()
-        extra_args = {
-            "ContentType": file.content_type or "application/octet-stream",
-            "Metadata": {
-                "user_id": str(current_user.id),
-                "clerk_id": str(current_user.clerk_id),
-                "original_filename": file.filename,
-                "description": description or "",
-                "upload_date": datetime.utcnow().isoformat()
-            }
-        }
-        
-        # Add KMS encryption if configured
-        if getattr(settings, "AWS_S3_KMS_KEY_ID", None):
-            extra_args["ServerSideEncryption"] = "aws:kms"
-            extra_args["SSEKMSKeyId"] = settings.AWS_S3_KMS_KEY_ID
+        extra_args = _s3_extra_args(file, description, current_user)
+
+        with stage("s3_put"), start_span("s3.upload_file", bucket=bucket):
+            await run_in_threadpool(s3_client.upload_file, temp_file_path, bucket, s3_key, ExtraArgs=extra_args)
+        preview_rows = await run_in_threadpool(store_previews, s3_client, bucket, current_user.clerk_id, previews)
 
-        s3_client.upload_file(temp_file_path, bucket, s3_key, ExtraArgs=extra_args)
+        # DB record first (not committed until the vectors are stored), so
+        # every chunk can carry the report id
+        report = Reports(
+            file_path=_to_s3_uri(bucket, s3_key),
+            original_filename=file.filename,
+            description=description,
+            extracted_text=extracted_text,
+            user_id=current_user.id,
+            previews=preview_rows
+        )
+        db.add(report)
+        db.flush()
 
         # Document store
         metadata = {
@@ -126,43 +185,44 @@ async def upload_file(
             "description": description or "",
             "upload_date": datetime.utcnow().isoformat(),
             "report_type": "pdf",
-            "s3_uri": _to_s3_uri(bucket, s3_key)
+            "s3_uri": _to_s3_uri(bucket, s3_key),
+            "report_id": report.id
         }
         try:
-            document_store = DocumentStore()
-            vector_store = document_store.store_document(
-                current_user.clerk_id,
-                file.filename,
-                extracted_text,
-                metadata,
-                str(current_user.id)
-            )
+            document_store = get_document_store()
+            async with stage_queue("embedding").slot():
+                vector_store = await run_in_threadpool(
+                    document_store.store_document,
+                    current_user.clerk_id,
+                    file.filename,
+                    extracted_text,
+                    metadata,
+                    str(current_user.id)
+                )
             document_store.persist_all()
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to store document vectors: {str(e)}"
             )
 
-        # Save DB record
-        report = Reports(
-            file_path=_to_s3_uri(bucket, s3_key),
-            original_filename=file.filename,
-            description=description,
-            extracted_text=extracted_text,
-            user_id=current_user.id
-        )
-        db.add(report)
         db.commit()
         db.refresh(report)
 
-        return {
+        # Summary and document-level vector, after the response is sent
+        if settings.REPORT_SUMMARIES_ENABLED:
+            background_tasks.add_task(summarize_report, report.id)
+
+        return project({
             "success": True,
             "message": "File uploaded and processed successfully",
             "extracted_text": extracted_text,
             "report_id": report.id,
-            "s3_uri": report.file_path
-        }
+            "s3_uri": report.file_path,
+            "thumbnail_url": report.thumbnail_url
+        }, fields)
 
     except HTTPException:
         raise
@@ -184,18 +244,209 @@ async def upload_file(
         except Exception:
             pass
 
+async def _extract_and_put(file: UploadFile, description: Optional[str], ocr_helper: TextractHelper,
+                           current_user: User) -> tuple[str, str, List[ReportPreview]]:
+    """OCR one file and upload it and its thumbnails to S3. Returns (extracted text, S3 URI, previews)."""
+    temp_dir = os.path.join(settings.TEMP_DIRECTORY)
+    os.makedirs(temp_dir, exist_ok=True)
+
+    file_extension = os.path.splitext(file.filename)[1]
+    unique_basename = f"{uuid.uuid4()}{file_extension}"
+    s3_key = f"users/{current_user.clerk_id}/{unique_basename}"
+    bucket = settings.AWS_S3_BUCKET
+    temp_file_path = os.path.join(temp_dir, unique_basename)
+    try:
+        with open(temp_file_path, "wb") as temp_file:
+            shutil.copyfileobj(file.file, temp_file)
+
+        extracted_text, previews = await _ocr_and_render(ocr_helper, temp_file_path, file.filename)
+
+        s3_client = _s3()
+        extra_args = _s3_extra_args(file, description, current_user)
+        with stage("s3_put"), start_span("s3.upload_file", bucket=bucket):
+            await run_in_threadpool(s3_client.upload_file, temp_file_path, bucket, s3_key, ExtraArgs=extra_args)
+        preview_rows = await run_in_threadpool(store_previews, s3_client, bucket, current_user.clerk_id, previews)
+        return extracted_text, _to_s3_uri(bucket, s3_key), preview_rows
+    finally:
+        try:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+        except Exception:
+            pass
+
+def _delete_s3_objects(uris: List[str]):
+    """Best-effort removal of objects whose report was never saved."""
+    s3_client = _s3()
+    for uri in uris:
+        try:
+            bucket, key = _from_s3_uri(uri)
+            s3_client.delete_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            logger.warning("Could not delete orphaned S3 object %s: %s", uri, e)
+
+@router.post("/upload/batch", response_model=dict)
+@traced("reports.upload_files")
+async def upload_files(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    descriptions: Optional[List[str]] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload several reports in one request.
+
+    Files are extracted (OCR) and uploaded to S3 up to UPLOAD_BATCH_CONCURRENCY
+    at a time. The chunks of every extracted file are then embedded together,
+    in shared batches, and saved with one vector-store write and one database
+    transaction. ``descriptions``, if given, matches ``files`` by position.
+
+    Returns one result per file, in order. A file that fails does not fail the
+    others. Each file takes one token from the user's upload rate limit.
+    """
+    if not files:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No files were uploaded")
+    if len(files) > settings.UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.UPLOAD_BATCH_MAX_FILES} files can be uploaded at once"
+        )
+    await charge_rate_limit("upload", current_user.clerk_id, cost=len(files))
+    ocr_helper = _upload_preconditions()
+    descriptions = list(descriptions or [])
+    descriptions += [None] * (len(files) - len(descriptions))
+
+    results = [{"filename": file.filename, "success": False} for file in files]
+    semaphore = asyncio.Semaphore(max(1, settings.UPLOAD_BATCH_CONCURRENCY))
+
+    async def extract(index: int):
+        async with semaphore:
+            try:
+                return await _extract_and_put(files[index], descriptions[index], ocr_helper, current_user)
+            except HTTPException as e:
+                results[index]["error"] = e.detail
+            except (BotoCoreError, ClientError) as e:
+                results[index]["error"] = f"S3 error: {str(e)}"
+            except Exception as e:
+                logger.exception("Extracting %s failed", files[index].filename)
+                results[index]["error"] = f"OCR processing failed: {str(e)}"
+            return None
+
+    extracted = await asyncio.gather(*(extract(index) for index in range(len(files))))
+    ready = [(index, *item) for index, item in enumerate(extracted) if item is not None]
+
+    if ready:
+        # One transaction for the batch; rows are flushed first so every
+        # chunk can carry its report id
+        upload_date = datetime.utcnow().isoformat()
+        reports = []
+        for index, text, s3_uri, preview_rows in ready:
+            report = Reports(
+                file_path=s3_uri,
+                original_filename=files[index].filename,
+                description=descriptions[index],
+                extracted_text=text,
+                user_id=current_user.id,
+                previews=preview_rows
+            )
+            db.add(report)
+            reports.append(report)
+        db.flush()
+
+        items = [
+            (text, {
+                "filename": files[index].filename,
+                "description": descriptions[index] or "",
+                "upload_date": upload_date,
+                "report_type": "pdf",
+                "s3_uri": s3_uri,
+                "report_id": report.id
+            })
+            for (index, text, s3_uri, _), report in zip(ready, reports)
+        ]
+        document_store = get_document_store()
+        try:
+            async with stage_queue("embedding").slot():
+                await run_in_threadpool(document_store.store_documents, current_user.clerk_id, items)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            error = e.detail if isinstance(e, HTTPException) else f"Failed to store document vectors: {str(e)}"
+            logger.warning("Batch upload of %s files failed: %s", len(ready), error)
+            # Also when store_documents raised: it may have written some of the
+            # vectors (or all of them, on a remote node that then timed out)
+            for report_id in [metadata["report_id"] for _, metadata in items]:
+                try:
+                    await run_in_threadpool(document_store.delete_document, report_id, current_user.clerk_id)
+                except Exception as delete_error:
+                    logger.warning("Could not delete vectors of report %s: %s", report_id, delete_error)
+            await run_in_threadpool(_delete_s3_objects, [s3_uri for _, _, s3_uri, _ in ready])
+            await run_in_threadpool(
+                delete_previews, db, _s3(), settings.AWS_S3_BUCKET, current_user.id, current_user.clerk_id,
+                [row.digest for *_, preview_rows in ready for row in preview_rows]
+            )
+            for index, *_ in ready:
+                results[index]["error"] = error
+        else:
+            for (index, _, s3_uri, _), report in zip(ready, reports):
+                results[index].update(success=True, report_id=report.id, s3_uri=s3_uri,
+                                      thumbnail_url=report.thumbnail_url)
+                # Summary and document-level vector, after the response is sent
+                if settings.REPORT_SUMMARIES_ENABLED:
+                    background_tasks.add_task(summarize_report, report.id)
+
+    uploaded = sum(1 for result in results if result["success"])
+    return {
+        "success": uploaded == len(files),
+        "uploaded": uploaded,
+        "failed": len(files) - uploaded,
+        "results": results
+    }
+
+def _reports_etag(db: Session, user_id: int, fields: Optional[FrozenSet[str]]) -> str:
+    """
+    Fingerprint of everything the file list shows, from one aggregate query:
+    uploads and deletions change the count or max id, background summaries
+    and re-summarization the latest summarized_at, thumbnail backfills the
+    newest preview id.
+    """
+    last_preview = (
+        db.query(func.max(ReportPreview.id))
+        .join(Reports, Reports.id == ReportPreview.report_id)
+        .filter(Reports.user_id == user_id)
+        .scalar_subquery()
+    )
+    fingerprint = (
+        db.query(func.count(Reports.id), func.max(Reports.id), func.max(Reports.summarized_at), last_preview)
+        .filter(Reports.user_id == user_id)
+        .one()
+    )
+    return make_etag("reports", user_id, sorted(fields or ()), *fingerprint)
+
 @router.get("/files", response_model=List[ReportResponse])
 async def list_files(
+    request: Request,
+    response: Response,
+    fields: Optional[FrozenSet[str]] = Depends(report_fields),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
+        etag = _reports_etag(db, current_user.id, fields)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+
         reports = (
             db.query(Reports)
             .filter(Reports.user_id == current_user.id)
             .order_by(Reports.uploaded_at.desc())
             .all()
         )
+        if fields:
+            projected = FastJSONResponse(_report_payload(reports, fields))
+            set_cache_headers(projected, etag)
+            return projected
+        set_cache_headers(response, etag)
         return reports
     except Exception as e:
         raise HTTPException(
@@ -206,15 +457,19 @@ async def list_files(
 @router.get("/files/{report_id}", response_model=ReportResponse)
 async def get_file_details(
     report_id: int,
+    fields: Optional[FrozenSet[str]] = Depends(report_fields),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
         report = db.query(Reports).filter(
+            Reports.id == report_id,
             Reports.user_id == current_user.id
         ).first()
         if not report:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report not found")
+        if fields:
+            return FastJSONResponse(_report_payload([report], fields)[0])
         return report
     except HTTPException:
         raise
@@ -241,27 +496,80 @@ async def delete_file(
         # 1. Delete from S3 if this is an S3-backed report
         try:
             bucket, key = _from_s3_uri(report.file_path)
-            _s3().delete_object(Bucket=bucket, Key=key)
+            with start_span("s3.delete_object", bucket=bucket):
+                _s3().delete_object(Bucket=bucket, Key=key)
         except ValueError:
             if os.path.exists(report.file_path):
                 os.remove(report.file_path)
 
         # 2. Remove from vector store
-        document_store = DocumentStore()
-        document_store.delete_document(report_id=report.id, user_id=current_user.clerk_id)
+        document_store = get_document_store()
+        await run_in_threadpool(document_store.delete_document, report_id=report.id, user_id=current_user.clerk_id)
 
         # 3. Remove the report from DB
+        digests = [preview.digest for preview in report.previews]
         db.delete(report)
         db.commit()
 
+        # 4. Thumbnails no other report of the user shares
+        if digests:
+            await run_in_threadpool(
+                delete_previews, db, _s3(), settings.AWS_S3_BUCKET, current_user.id, current_user.clerk_id, digests
+            )
+
         return {"success": True, "message": "Report deleted successfully"}
     except (BotoCoreError, ClientError) as e:
         raise HTTPException(status_code=502, detail=f"S3 error: {str(e)}")
     except Exception as e:
-        print(f"Error deleting document: {e}")
+        logger.exception("Error deleting report %s", report_id)
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
-@router.get("/files/{report_id}/download")
+@router.get("/thumbnails/{digest}.jpg")
+async def get_thumbnail(
+    digest: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    A report thumbnail or page preview. The URL names the image's sha256, so
+    the bytes behind it never change: clients may cache it for a year and
+    revalidate with If-None-Match.
+    """
+    if not _DIGEST.fullmatch(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found")
+    preview = (
+        db.query(ReportPreview)
+        .join(Reports, Reports.id == ReportPreview.report_id)
+        .filter(ReportPreview.digest == digest, Reports.user_id == current_user.id)
+        .first()
+    )
+    if not preview:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not found")
+
+    etag = f'"{digest}"'
+    cache_control = f"private, max-age={settings.THUMBNAIL_MAX_AGE_SECONDS}, immutable"
+    if not_modified(request, etag):
+        return not_modified_response(etag, cache_control)
+
+    data = thumbnail_cache.get(digest)
+    record_cache("thumbnail", data is not None)
+    if data is None:
+        bucket = settings.AWS_S3_BUCKET
+        try:
+            s3_client = _s3()
+            with start_span("s3.get_object", bucket=bucket):
+                obj = await run_in_threadpool(s3_client.get_object, Bucket=bucket, Key=preview.s3_key)
+                data = await run_in_threadpool(obj["Body"].read)
+        except (BotoCoreError, ClientError) as e:
+            logger.warning("S3 error reading thumbnail %s: %s", digest, e)
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"S3 error: {str(e)}")
+        thumbnail_cache.put(digest, data)
+    response = Response(content=data, media_type=THUMBNAIL_CONTENT_TYPE)
+    set_cache_headers(response, etag, cache_control)
+    return response
+
+@router.get("/files/{report_id}/download", dependencies=[Depends(rate_limit("download"))])
 async def download_file(
     report_id: int,
     db: Session = Depends(get_db),
@@ -283,7 +591,8 @@ async def download_file(
                 s3_client = _s3()
                 
                 # Check if object exists and get its metadata
-                s3_client.head_object(Bucket=bucket, Key=key)
+                with start_span("s3.head_object", bucket=bucket):
+                    s3_client.head_object(Bucket=bucket, Key=key)
                 
                 # Generate presigned URL
                 params = {
@@ -302,7 +611,7 @@ async def download_file(
                     "filename": report.original_filename
                 })
             except (BotoCoreError, ClientError) as e:
-                print(f"S3 error details: {e}")
+                logger.warning("S3 error generating download link: %s", e)
                 raise HTTPException(
                     status_code=status.HTTP_502_BAD_GATEWAY,
                     detail=f"S3 error: {str(e)}"
@@ -318,7 +627,7 @@ async def download_file(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Download error: {e}")
+        logger.exception("Download error for report %s", report_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate download link: {str(e)}"
@@ -1,25 +1,37 @@
 # app/routers/users.py
 import base64
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Form, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Form, Query, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 import httpx
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Literal, Optional
+import re
 import uuid
-import traceback
+import logging
 import os
 from ..models.users import User, UserRole
-from ..schemas.users import UserCreate, UserResponse, UserUpdate, ResetPassword
+from ..schemas.users import UserCreate, UserResponse, UserUpdate, ResetPassword, ProfileImageResponse, UserPage
 from ..databse import get_db
 from ..core.auth import get_current_user
+from ..core.http_cache import make_etag, not_modified, not_modified_response, set_cache_headers
 import boto3
 from botocore.client import Config as BotoConfig
 from botocore.exceptions import BotoCoreError, ClientError
 from ..models.reports import Reports
-from ..services.document_store import DocumentStore
+from ..services.document_store import get_document_store
+from ..services.profile_images import delete_unused, load_image, read_capped, replace_profile_image
+from ..services.user_directory import list_users_page
 from ..config import settings
+from ..core.metrics import InstrumentedRoute
+from ..core.tracing import start_span
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
 
 # ---- S3 helpers copied from reports.py ----
 def _s3():
@@ -46,6 +58,19 @@ def _from_s3_uri(uri: str) -> tuple[str, str]:
     bucket, key = rest.split("/", 1)
     return bucket, key
 
+def _user_response(user: User) -> UserResponse:
+    return UserResponse(
+        id=user.id,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        organisation_name=user.organisation_name,
+        is_active=user.is_active,
+        role=user.role.name if user.role else None,
+        image_url=user.image_url,
+        image_variants=[ProfileImageResponse.model_validate(variant) for variant in user.image_variants]
+    )
+
 # Replace with your Clerk JWT verification logic
 CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL")
 CLERK_API_KEY = os.getenv("CLERK_API_KEY")
@@ -86,7 +111,7 @@ async def create_user(
         
         return {"success": True, "message": "User created successfully"}
     except Exception as e:
-        print(traceback.format_exc())
+        logger.exception("User creation failed")
         return {"success": False, "message": "User creation failed"}
 
 @router.post("/edit", response_model=dict)
@@ -132,7 +157,7 @@ async def edit_user(
         
         return {"success": True, "message": "User updated successfully"}
     except Exception as e:
-        print(traceback.format_exc())
+        logger.exception("User update failed")
         return {"success": False, "message": "User update failed"}
 
 @router.delete("/delete-account", response_model=dict)
@@ -142,7 +167,7 @@ async def delete_user(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        print("Deleting account for Clerk ID:", user_id)
+        logger.info("Deleting account for Clerk ID %s", user_id)
 
         # 1️⃣ Find user by clerk_id
         user = db.query(User).filter(User.clerk_id == user_id).first()
@@ -150,7 +175,7 @@ async def delete_user(
             return {"success": 0, "message": "User not found"}
 
         internal_user_id = user.id
-        document_store = DocumentStore()
+        document_store = get_document_store()
         s3_client = _s3()
         bucket = settings.AWS_S3_BUCKET
 
@@ -162,18 +187,19 @@ async def delete_user(
                 if report.file_path and report.file_path.startswith("s3://"):
                     try:
                         b, key = _from_s3_uri(report.file_path)
-                        s3_client.delete_object(Bucket=b, Key=key)
-                        print(f"Deleted report file {key}")
+                        with start_span("s3.delete_object", bucket=b):
+                            s3_client.delete_object(Bucket=b, Key=key)
+                        logger.debug("Deleted report file %s", key)
                     except Exception as e:
-                        print(f"⚠️ Error deleting S3 object {report.file_path}: {e}")
+                        logger.warning("Error deleting S3 object %s: %s", report.file_path, e)
             except Exception:
                 pass
 
             # Delete individual document from Chroma
             try:
-                document_store.delete_document(report_id=report.id, user_id=user.clerk_id)
+                await run_in_threadpool(document_store.delete_document, report_id=report.id, user_id=user.clerk_id)
             except Exception as e:
-                print(f"⚠️ Error deleting document from Chroma: {e}")
+                logger.warning("Error deleting document from Chroma: %s", e)
 
             db.delete(report)
 
@@ -181,26 +207,27 @@ async def delete_user(
 
         # Delete entire user's Chroma collection
         try:
-            document_store.delete_user_collection(user_id=user.clerk_id)
-            print(f"✅ Deleted Chroma collection for user: {user.clerk_id}")
+            await run_in_threadpool(document_store.delete_user_collection, user_id=user.clerk_id)
+            logger.info("Deleted Chroma collection for user %s", user.clerk_id)
         except Exception as e:
-            print(f"⚠️ Error deleting Chroma collection: {e}")
+            logger.warning("Error deleting Chroma collection: %s", e)
 
         # 3️⃣ Delete user's entire S3 folder
         try:
             user_prefix = f"users/{user.clerk_id}/"
-            listed = s3_client.list_objects_v2(Bucket=bucket, Prefix=user_prefix)
-            if "Contents" in listed:
-                delete_keys = [{"Key": obj["Key"]} for obj in listed["Contents"]]
-                s3_client.delete_objects(Bucket=bucket, Delete={"Objects": delete_keys})
-                print(f"Deleted folder: {user_prefix}")
+            with start_span("s3.delete_prefix", bucket=bucket):
+                listed = s3_client.list_objects_v2(Bucket=bucket, Prefix=user_prefix)
+                if "Contents" in listed:
+                    delete_keys = [{"Key": obj["Key"]} for obj in listed["Contents"]]
+                    s3_client.delete_objects(Bucket=bucket, Delete={"Objects": delete_keys})
+                logger.info("Deleted S3 folder %s", user_prefix)
         except (BotoCoreError, ClientError) as e:
-            print(f"⚠️ Error deleting S3 folder: {e}")
+            logger.warning("Error deleting S3 folder: %s", e)
 
         # 4️⃣ Delete user from Clerk
         try:
             if not CLERK_SECRET_KEY:
-                print("⚠️ CLERK_SECRET_KEY not configured, skipping Clerk deletion")
+                logger.warning("CLERK_SECRET_KEY not configured, skipping Clerk deletion")
             else:
                 async with httpx.AsyncClient() as client:
                     clerk_response = await client.delete(
@@ -212,60 +239,107 @@ async def delete_user(
                     )
                     
                     if clerk_response.status_code == 200:
-                        print(f"✅ Deleted user from Clerk: {user_id}")
+                        logger.info("Deleted user from Clerk: %s", user_id)
                     elif clerk_response.status_code == 404:
-                        print(f"⚠️ User not found in Clerk: {user_id}")
+                        logger.warning("User not found in Clerk: %s", user_id)
                     else:
-                        print(f"⚠️ Clerk deletion failed with status {clerk_response.status_code}: {clerk_response.text}")
+                        logger.warning("Clerk deletion failed with status %s: %s", clerk_response.status_code, clerk_response.text)
                         
         except Exception as e:
-            print(f"⚠️ Error deleting from Clerk: {e}")
+            logger.warning("Error deleting from Clerk: %s", e)
             # Continue with local deletion even if Clerk fails
 
-        # 5️⃣ Delete user from Postgres
+        # 5️⃣ Delete user from Postgres, then any profile images only they used
+        images = [(variant.digest, variant.location) for variant in user.image_variants]
         db.delete(user)
         db.commit()
+        await delete_unused(db, images, s3_client)
 
-        print("✅ User deletion complete")
+        logger.info("User deletion complete for Clerk ID %s", user_id)
         return {"success": True, "message": "User and all related data deleted successfully"}
 
     except Exception as e:
-        print(traceback.format_exc())
+        logger.exception("User deletion failed")
         db.rollback()
         return {"success": False, "message": f"User deletion failed: {str(e)}"}
 
 @router.get("/list", response_model=List[UserResponse])
 async def list_users(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        users = db.query(User).all()
-        return [
-            UserResponse(
-                id=user.id,
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                organisation_name=user.organisation_name,
-                is_active=user.is_active,
-                role=user.role.name if user.role else None
-            )
-            for user in users
-        ]
+        # Sign-ups and deletions change the count or max id; profile edits
+        # bump updated_at
+        fingerprint = db.query(func.count(User.id), func.max(User.id), func.max(User.updated_at)).one()
+        etag = make_etag("users", *fingerprint)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        set_cache_headers(response, etag)
+
+        # Roles and images in two queries, not one per user; admin screens
+        # should use the paginated /admin/list
+        users = db.query(User).options(joinedload(User.role), selectinload(User.image_variants)).all()
+        return [_user_response(user) for user in users]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Something went wrong"
         )
 
+@router.get("/admin/list", response_model=UserPage)
+async def list_users_paginated(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: Literal["newest", "email"] = "newest",
+    q: Optional[str] = Query(None, max_length=100),
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    One page of users for admin screens, searchable by email and name. Pass
+    ``next_cursor`` back as ``cursor`` for the next page; ``total`` is an
+    estimate on Postgres (see app/services/user_directory.py).
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    page = list_users_page(db, limit=limit, cursor=cursor, sort=sort, q=q, role=role, is_active=is_active)
+    return UserPage(
+        items=[_user_response(user) for user in page["items"]],
+        next_cursor=page["next_cursor"],
+        total=page["total"],
+        total_is_estimate=page["total_is_estimate"],
+    )
+
 @router.get("/details/{user_id}", response_model=UserResponse)
 async def get_user_details(
     user_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
+        # Every edit goes through the ORM, which bumps updated_at
+        version = (
+            db.query(User.created_at, User.updated_at, User.role_id)
+            .filter(User.id == user_id)
+            .first()
+        )
+        if not version:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        etag = make_etag("user", user_id, *version)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        set_cache_headers(response, etag)
+
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(
@@ -273,15 +347,7 @@ async def get_user_details(
                 detail="User not found"
             )
         
-        return UserResponse(
-            id=user.id,
-            email=user.email,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            organisation_name=user.organisation_name,
-            is_active=user.is_active,
-            role=user.role.name if user.role else None
-        )
+        return _user_response(user)
     except HTTPException:
         raise
     except Exception as e:
@@ -369,7 +435,7 @@ async def update_profile(
         return {"success": True, "message": "User updated successfully"}
 
     except Exception:
-        print(traceback.format_exc())
+        logger.exception("User update failed")
         return {"success": False, "message": "User update failed"}
     
 
@@ -388,31 +454,60 @@ async def edit_user_image(
                 "message": "Not authorized to update image of other users"
             }
 
-
         user = db.query(User).filter(User.id == id).first()
         if not user:
             return {"success": 0, "message": "User not found"}
 
-        # Save the uploaded image as before
-        UPLOAD_DIR = "static/uploads"
-        import os
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-        import uuid
-        file_ext = os.path.splitext(image.filename)[1]
-        unique_filename = f"{uuid.uuid4().hex}{file_ext}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-        contents = await image.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        # Size cap, decode and resizing happen in services/profile_images.py;
+        # invalid images surface as 400/413/415
+        contents = await read_capped(image)
+        s3_client = _s3() if settings.PROFILE_IMAGE_STORAGE == "s3" else None
+        variants = await replace_profile_image(db, user, contents, s3_client)
 
-        user.image_url = f"uploads/{unique_filename}"
-        db.commit()
-
-        return {"success": True, "message": "User image updated successfully"}
+        return {
+            "success": True,
+            "message": "User image updated successfully",
+            "image_url": user.image_url,
+            "variants": [ProfileImageResponse.model_validate(variant).model_dump() for variant in variants],
+        }
 
+    except HTTPException:
+        raise
     except Exception:
-        import traceback
-        traceback.print_exc()
+        logger.exception("User image update failed")
+        db.rollback()
         return {"success": False, "message": "User image update failed"}
+
+@router.get("/images/{digest}.{ext}")
+async def get_profile_image(
+    digest: str,
+    ext: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    A profile image variant. Public like the static uploads it replaces; the
+    name is the sha256 of the bytes, so it is cached for a year as immutable.
+    """
+    if not _DIGEST.fullmatch(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    etag = f'"{digest}"'
+    cache_control = f"public, max-age={settings.PROFILE_IMAGE_MAX_AGE_SECONDS}, immutable"
+    if not_modified(request, etag):
+        return not_modified_response(etag, cache_control)
+
+    try:
+        image = await load_image(db, digest, _s3)
+    except (BotoCoreError, ClientError) as e:
+        logger.warning("S3 error reading profile image %s: %s", digest, e)
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"S3 error: {str(e)}")
+    except FileNotFoundError:
+        image = None
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    data, content_type = image
+    response = Response(content=data, media_type=content_type)
+    set_cache_headers(response, etag, cache_control)
+    return response
@@ -16,6 +16,9 @@ class ReportResponse(ReportBase):
     original_filename: str
     uploaded_at: datetime
     summary: Optional[str] = None
+    # Content-addressed images, served by GET /api/reports/thumbnails/{sha256}.jpg
+    thumbnail_url: Optional[str] = None
+    preview_urls: List[str] = []
     
     class Config:
         from_attributes = True
@@ -38,13 +38,29 @@ class UserUpdate(BaseModel):
 class UserImageUpdate(BaseModel):
     id: int  # user id whose image will be updated
 
+class ProfileImageResponse(BaseModel):
+    width: int
+    height: int
+    url: str
+
+    class Config:
+        from_attributes = True
+
 class UserResponse(UserBase):
     id: int
-    role: str  # Role name
+    role: Optional[str] = None  # Role name
+    image_url: Optional[str] = None
+    image_variants: List[ProfileImageResponse] = []
     
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+    total: int
+    total_is_estimate: bool
+
 class ResetPassword(BaseModel):
     id: int
     formdata: dict = Field(..., example={
@@ -0,0 +1,372 @@
+# app/services/chat_sessions.py
+"""
+Server-side chat sessions with bounded history.
+
+Turns are appended to ``chat_turns`` in Postgres. ``chat_sessions`` holds a
+rolling summary, the number of turns folded into it and an expiry that is
+pushed forward by CHAT_SESSION_TTL_SECONDS on every turn. A hot in-memory
+tier (LRU, CHAT_SESSION_CACHE_SIZE per process) keeps recent sessions, so a
+turn costs one INSERT + UPDATE and no reads.
+
+What the LLM sees of the conversation is fixed-size: the summary (at most
+CHAT_SUMMARY_MAX_WORDS) plus the last CHAT_HISTORY_TURNS turns, each answer
+clipped to CHAT_TURN_MAX_TOKENS. Once a turn falls out of that window it is
+folded into the summary by one LLM call in a background task after the
+response. The summary is updated incrementally, never rebuilt from the full
+transcript.
+
+Follow-up questions ("what about the second one?") are rewritten into a
+standalone question from the summary and recent turns before retrieval. The
+original question is still what gets answered.
+
+Several workers may serve the same session. A stale hot entry shows up as a
+``seq`` conflict on insert; the session is then reloaded and the turn
+retried. Summary writes are conditional on ``summarized_turns``.
+"""
+import collections
+import logging
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Deque, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..databse import SessionLocal
+from ..models.chat import ChatSession, ChatTurn
+from .context_builder import count_tokens
+from .llm_router import LLMUnavailable, get_llm_router
+
+logger = logging.getLogger(__name__)
+
+# Expired sessions are deleted at most this often, per process
+PURGE_INTERVAL_SECONDS = 600
+
+SUMMARY_PROMPT = """
+Update the running summary of a conversation between a user and a medical
+document assistant. Keep facts about the user's reports, medications and
+results that later questions may refer to; drop pleasantries. Use at most
+{max_words} words. Reply with the summary only.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:
+"""
+
+REWRITE_PROMPT = """
+Rewrite the user's latest question as a standalone question that can be
+understood without the conversation, resolving references like "it" or "that
+report". Keep it short. If it is already standalone, repeat it unchanged.
+Reply with the question only.
+
+Conversation:
+{history}
+
+Latest question: {question}
+
+Standalone question:
+"""
+
+# Questions that lean on earlier turns
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|his|her|same|also|else|above|"
+    r"previous|earlier|again|one|ones)\b|^\s*(and|or|what about|how about|why|so)\b",
+    re.IGNORECASE,
+)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to about ``max_tokens`` tokens on a word boundary."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " ..."
+
+
+class SessionState:
+    """Hot copy of a session: summary, counters and the last few turns."""
+
+    __slots__ = ("id", "user_id", "summary", "summarized_turns", "turn_count", "recent", "expires_at")
+
+    def __init__(self, id: str, user_id: int, summary: str, summarized_turns: int, turn_count: int,
+                 recent: List[Tuple[int, str, str]], expires_at: float, window: int):
+        self.id = id
+        self.user_id = user_id
+        self.summary = summary
+        self.summarized_turns = summarized_turns
+        self.turn_count = turn_count
+        self.recent: Deque[Tuple[int, str, str]] = collections.deque(recent, maxlen=max(1, window))
+        self.expires_at = expires_at  # time.time() epoch
+
+
+class ChatSessionStore:
+    def __init__(self, ttl_seconds: Optional[float] = None, window: Optional[int] = None,
+                 cache_size: Optional[int] = None):
+        self.ttl_seconds = settings.CHAT_SESSION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.window = settings.CHAT_HISTORY_TURNS if window is None else window
+        self.cache_size = settings.CHAT_SESSION_CACHE_SIZE if cache_size is None else cache_size
+        self._hot: "collections.OrderedDict[str, SessionState]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._summarizing = set()
+        self._last_purge = 0.0
+
+    # ---------------------------
+    # Hot tier
+    # ---------------------------
+    def _remember(self, state: SessionState):
+        with self._lock:
+            self._hot[state.id] = state
+            self._hot.move_to_end(state.id)
+            while len(self._hot) > self.cache_size:
+                self._hot.popitem(last=False)
+
+    def _cached(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            state = self._hot.get(session_id)
+            if state is None:
+                return None
+            if state.expires_at <= time.time():
+                del self._hot[session_id]
+                return None
+            self._hot.move_to_end(session_id)
+            return state
+
+    def _forget(self, session_id: str):
+        with self._lock:
+            self._hot.pop(session_id, None)
+
+    # ---------------------------
+    # Postgres
+    # ---------------------------
+    def _load(self, db: Session, session_id: str) -> Optional[SessionState]:
+        row = db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.expires_at > _now(),
+        ).first()
+        if row is None:
+            return None
+        turns = db.query(ChatTurn.seq, ChatTurn.question, ChatTurn.answer).filter(
+            ChatTurn.session_id == session_id,
+            ChatTurn.seq > row.turn_count - self.window,
+        ).order_by(ChatTurn.seq).all()
+        expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+        state = SessionState(row.id, row.user_id, row.summary or "", row.summarized_turns, row.turn_count,
+                             [tuple(turn) for turn in turns], expires_at.timestamp(), self.window)
+        self._remember(state)
+        return state
+
+    def open(self, db: Session, user_id: int, session_id: Optional[str] = None) -> SessionState:
+        """
+        The user's session ``session_id``, or a new one if it is missing,
+        expired or belongs to someone else.
+        """
+        if session_id:
+            state = self._cached(session_id) or self._load(db, session_id)
+            if state is not None and state.user_id == user_id:
+                return state
+
+        new_id = str(uuid.uuid4())
+        expires_at = _now() + timedelta(seconds=self.ttl_seconds)
+        db.add(ChatSession(id=new_id, user_id=user_id, summary="", summarized_turns=0,
+                           turn_count=0, expires_at=expires_at))
+        db.commit()
+        state = SessionState(new_id, user_id, "", 0, 0, [], expires_at.timestamp(), self.window)
+        self._remember(state)
+        return state
+
+    def append_turn(self, db: Session, state: SessionState, question: str, answer: str) -> SessionState:
+        """Append a turn and extend the session's expiry; returns the up-to-date state."""
+        for attempt in range(3):
+            seq = state.turn_count + 1
+            expires_at = _now() + timedelta(seconds=self.ttl_seconds)
+            db.add(ChatTurn(session_id=state.id, seq=seq, question=question, answer=answer))
+            db.execute(update(ChatSession).where(ChatSession.id == state.id)
+                       .values(turn_count=seq, expires_at=expires_at))
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker appended to this session: reload and retry
+                db.rollback()
+                fresh = self._load(db, state.id)
+                if fresh is None:
+                    raise
+                state = fresh
+                continue
+            state.turn_count = seq
+            state.recent.append((seq, question, answer))
+            state.expires_at = expires_at.timestamp()
+            self._remember(state)
+            return state
+        raise RuntimeError(f"Could not append to chat session {state.id}")
+
+    def turns(self, db: Session, user_id: int, session_id: str) -> Optional[List[ChatTurn]]:
+        """All turns of a live session of the user, oldest first; None if there is none."""
+        row = db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id,
+            ChatSession.expires_at > _now(),
+        ).first()
+        if row is None:
+            return None
+        return db.query(ChatTurn).filter(ChatTurn.session_id == session_id).order_by(ChatTurn.seq).all()
+
+    def delete(self, db: Session, user_id: int, session_id: str) -> bool:
+        self._forget(session_id)
+        row = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.user_id == user_id).first()
+        if row is None:
+            return False
+        db.query(ChatTurn).filter(ChatTurn.session_id == session_id).delete(synchronize_session=False)
+        db.delete(row)
+        db.commit()
+        return True
+
+    def purge_expired(self):
+        """Delete expired sessions and their turns, at most every PURGE_INTERVAL_SECONDS."""
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+
+        db = SessionLocal()
+        try:
+            expired = select(ChatSession.id).where(ChatSession.expires_at <= _now())
+            turns = db.query(ChatTurn).filter(ChatTurn.session_id.in_(expired)).delete(synchronize_session=False)
+            sessions = db.query(ChatSession).filter(ChatSession.expires_at <= _now()).delete(synchronize_session=False)
+            db.commit()
+            if sessions:
+                logger.info("Purged %d expired chat sessions (%d turns)", sessions, turns)
+        except Exception:
+            db.rollback()
+            logger.exception("Purging expired chat sessions failed")
+        finally:
+            db.close()
+
+    # ---------------------------
+    # History, summaries, follow-ups
+    # ---------------------------
+    def history(self, state: SessionState) -> str:
+        """Fixed-size view of the conversation for prompts: summary plus the last turns."""
+        parts = []
+        if state.summary:
+            parts.append(f"Summary of earlier conversation: {state.summary}")
+        for _, question, answer in state.recent:
+            parts.append(f"User: {question}\nAssistant: {_clip(answer, settings.CHAT_TURN_MAX_TOKENS)}")
+        return "\n".join(parts)
+
+    def needs_summary(self, state: SessionState) -> bool:
+        return state.turn_count - self.window > state.summarized_turns
+
+    def _fetch_unsummarized(self, session_id: str):
+        db = SessionLocal()
+        try:
+            row = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+            if row is None:
+                return None
+            upto = row.turn_count - self.window
+            turns = db.query(ChatTurn.question, ChatTurn.answer).filter(
+                ChatTurn.session_id == session_id,
+                ChatTurn.seq > row.summarized_turns,
+                ChatTurn.seq <= upto,
+            ).order_by(ChatTurn.seq).all()
+            return row.summary or "", row.summarized_turns, upto, turns
+        finally:
+            db.close()
+
+    def _store_summary(self, session_id: str, previous: int, summary: str, upto: int) -> bool:
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == session_id, ChatSession.summarized_turns == previous)
+                .values(summary=summary, summarized_turns=upto)
+            )
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+    async def summarize(self, session_id: str):
+        """Fold turns that left the history window into the summary. Run after the response."""
+        if session_id in self._summarizing:
+            return
+        self._summarizing.add(session_id)
+        try:
+            fetched = await run_in_threadpool(self._fetch_unsummarized, session_id)
+            if fetched is None or not fetched[3]:
+                return
+            summary, previous, upto, turns = fetched
+            prompt = SUMMARY_PROMPT.format(
+                max_words=settings.CHAT_SUMMARY_MAX_WORDS,
+                summary=summary or "(none)",
+                turns="\n".join(f"User: {q}\nAssistant: {_clip(a, settings.CHAT_TURN_MAX_TOKENS * 2)}"
+                                for q, a in turns),
+            )
+            new_summary = (await get_llm_router().complete(prompt)).strip()
+            if await run_in_threadpool(self._store_summary, session_id, previous, new_summary, upto):
+                state = self._cached(session_id)
+                if state is not None and state.summarized_turns == previous:
+                    state.summary, state.summarized_turns = new_summary, upto
+        except LLMUnavailable as e:
+            # Retried after the next turn; the window still bounds the prompt
+            logger.warning("Chat summary deferred for session %s: %s", session_id, e)
+        except Exception:
+            logger.exception("Updating chat summary failed for session %s", session_id)
+        finally:
+            self._summarizing.discard(session_id)
+
+
+def is_follow_up(question: str, state: SessionState) -> bool:
+    """Whether ``question`` should be rewritten before retrieval (CHAT_REWRITE_FOLLOW_UPS)."""
+    mode = settings.CHAT_REWRITE_FOLLOW_UPS
+    if state.turn_count == 0 or mode == "never":
+        return False
+    if mode == "always":
+        return True
+    return bool(_FOLLOW_UP.search(question)) or len(question.split()) <= 4
+
+
+async def rewrite_question(question: str, history: str) -> str:
+    """Standalone version of a follow-up question, for retrieval. Falls back to the question."""
+    try:
+        rewritten = await get_llm_router().complete(REWRITE_PROMPT.format(history=history, question=question))
+    except LLMUnavailable as e:
+        logger.warning("Follow-up rewrite skipped: %s", e)
+        return question
+    rewritten = rewritten.strip().strip('"').strip()
+    # A runaway answer is worse for retrieval than the original question
+    if not rewritten or len(rewritten) > 4 * len(question) + 200:
+        return question
+    return rewritten
+
+
+_chat_session_store: Optional[ChatSessionStore] = None
+_chat_session_store_lock = threading.Lock()
+
+def get_chat_session_store() -> ChatSessionStore:
+    global _chat_session_store
+    if _chat_session_store is None:
+        with _chat_session_store_lock:
+            if _chat_session_store is None:
+                _chat_session_store = ChatSessionStore()
+    return _chat_session_store
@@ -0,0 +1,186 @@
+# app/services/chunking.py
+import re
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+
+# Chunk sizes per embedding model, in word pieces. max_tokens is the model's
+# max sequence length (special tokens included); anything beyond it is
+# truncated by the encoder and never embedded.
+MODEL_CHUNK_PROFILES: Dict[str, Dict[str, int]] = {
+    "sentence-transformers/all-MiniLM-L6-v2": {"max_tokens": 256, "overlap_tokens": 32},
+    "sentence-transformers/all-MiniLM-L12-v2": {"max_tokens": 256, "overlap_tokens": 32},
+    "sentence-transformers/all-mpnet-base-v2": {"max_tokens": 384, "overlap_tokens": 48},
+    "BAAI/bge-small-en-v1.5": {"max_tokens": 512, "overlap_tokens": 64},
+}
+
+# Rows of OCR'd tables: pipe/tab separated, or columns aligned with 2+ spaces
+_TABLE_ROW = re.compile(r"\||\t|\S {2,}\S")
+
+
+def chunk_profile(model_name: str) -> Dict[str, Optional[int]]:
+    """
+    Resolve chunk sizes for a model. CHUNK_MAX_TOKENS / CHUNK_OVERLAP_TOKENS
+    override the built-in profile; max_tokens None means "ask the model".
+    """
+    profile = (
+        MODEL_CHUNK_PROFILES.get(model_name)
+        or MODEL_CHUNK_PROFILES.get(f"sentence-transformers/{model_name}")
+        or {}
+    )
+    overlap = settings.CHUNK_OVERLAP_TOKENS
+    return {
+        "max_tokens": settings.CHUNK_MAX_TOKENS or profile.get("max_tokens"),
+        "overlap_tokens": overlap if overlap >= 0 else profile.get("overlap_tokens", 0),
+    }
+
+
+def chunker_signature(splitter=None) -> str:
+    """
+    Short description of the chunking configuration, used in index versions.
+    Given the splitter actually built, a token chunker that fell back to the
+    character splitter is reported as such.
+    """
+    fell_back = splitter is not None and not isinstance(splitter, TokenAwareChunker)
+    if settings.CHUNKER == "character" or fell_back:
+        return f"chunk={settings.CHUNK_SIZE}/{settings.CHUNK_OVERLAP}"
+    profile = chunk_profile(settings.EMBEDDING_MODEL_NAME)
+    return f"tokens={profile['max_tokens'] or 'auto'}/{profile['overlap_tokens']}"
+
+
+def overlap_chars() -> int:
+    """
+    Roughly how many characters adjacent chunks share, for the configured
+    chunker (token overlap estimated at ~4 characters per token).
+    """
+    if settings.CHUNKER == "character":
+        return settings.CHUNK_OVERLAP
+    return 4 * (chunk_profile(settings.EMBEDDING_MODEL_NAME)["overlap_tokens"] or 0)
+
+
+def _split_blocks(text: str) -> List[List[str]]:
+    """
+    Group OCR lines into blocks that should stay together when they fit:
+    runs of table rows, and runs of prose lines separated by blank lines.
+    """
+    blocks: List[List[str]] = []
+    current: List[str] = []
+    current_is_table = False
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = []
+            continue
+        is_table = bool(_TABLE_ROW.search(line))
+        if current and is_table != current_is_table:
+            blocks.append(current)
+            current = []
+        current.append(line)
+        current_is_table = is_table
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+class TokenAwareChunker:
+    """
+    Split OCR text into chunks that fit the embedding model's sequence limit.
+
+    Lengths are measured with the model's own (fast) tokenizer. Chunks are
+    built from whole lines, table and paragraph blocks are kept together when
+    they fit, and only single lines longer than the budget are cut mid-line
+    (on token boundaries). Overlap is carried over as whole trailing lines.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int = 0):
+        self.tokenizer = tokenizer
+        special = tokenizer.num_special_tokens_to_add() if hasattr(tokenizer, "num_special_tokens_to_add") else 2
+        self.budget = max(8, max_tokens - special)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.budget // 2))
+
+    def _count(self, lines: List[str]) -> List[int]:
+        if not lines:
+            return []
+        encoded = self.tokenizer(lines, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def _split_long_line(self, line: str) -> List[str]:
+        encoded = self.tokenizer(line, add_special_tokens=False, return_offsets_mapping=True)
+        offsets = encoded["offset_mapping"]
+        step = self.budget - self.overlap_tokens
+        pieces = []
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.budget]
+            pieces.append(line[window[0][0]:window[-1][1]])
+            if start + self.budget >= len(offsets):
+                break
+        return pieces
+
+    def split_text(self, text: str) -> List[str]:
+        blocks = _split_blocks(text)
+        counts = iter(self._count([line for block in blocks for line in block]))
+
+        chunks: List[str] = []
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        carried = 0  # leading lines of `current` that are overlap from the previous chunk
+
+        def flush():
+            nonlocal current, current_tokens, carried
+            if len(current) > carried:
+                chunks.append("\n".join(line for line, _ in current))
+            tail: List[Tuple[str, int]] = []
+            tail_tokens = 0
+            for line, n in reversed(current):
+                if tail_tokens + n > self.overlap_tokens:
+                    break
+                tail.insert(0, (line, n))
+                tail_tokens += n
+            current, current_tokens, carried = tail, tail_tokens, len(tail)
+
+        for block in blocks:
+            sized = [(line, next(counts)) for line in block]
+            block_tokens = sum(n for _, n in sized)
+            # Start a fresh chunk rather than splitting a block that fits in one
+            if block_tokens <= self.budget and current_tokens + block_tokens > self.budget:
+                flush()
+                while current and current_tokens + block_tokens > self.budget:
+                    current_tokens -= current.pop(0)[1]
+                    carried -= 1
+            for line, n in sized:
+                if n > self.budget:
+                    flush()
+                    chunks.extend(self._split_long_line(line))
+                    current, current_tokens, carried = [], 0, 0
+                    continue
+                if current_tokens + n > self.budget:
+                    flush()
+                    # Drop overlap that no longer leaves room for this line
+                    while current and current_tokens + n > self.budget:
+                        current_tokens -= current.pop(0)[1]
+                        carried -= 1
+                current.append((line, n))
+                current_tokens += n
+        flush()
+        return chunks
+
+
+def build_text_splitter(embedding_model=None):
+    """
+    Text splitter for DocumentStore, selected by CHUNKER ("token" or
+    "character"). The token chunker needs the embedding model's tokenizer and
+    falls back to the character splitter if the model does not expose one.
+    """
+    tokenizer = getattr(embedding_model, "tokenizer", None)
+    if settings.CHUNKER == "token" and tokenizer is not None:
+        profile = chunk_profile(settings.EMBEDDING_MODEL_NAME)
+        max_tokens = profile["max_tokens"] or embedding_model.max_seq_length
+        return TokenAwareChunker(tokenizer, max_tokens, profile["overlap_tokens"])
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP
+    )
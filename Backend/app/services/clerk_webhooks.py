@@ -0,0 +1,315 @@
+# app/services/clerk_webhooks.py
+"""
+Clerk webhook inbox.
+
+``POST /api/clerk-webhook`` does three things and then returns:
+
+1. It checks the svix signature (``svix-id``, ``svix-timestamp`` and
+   ``svix-signature`` headers) against CLERK_WEBHOOK_SECRET. The timestamp
+   must be within CLERK_WEBHOOK_TOLERANCE_SECONDS.
+2. It extracts the user fields and inserts them into ``clerk_webhook_events``
+   with ON CONFLICT (svix_id) DO NOTHING. A redelivery is acknowledged but
+   not queued again.
+3. It wakes ``webhook_processor``.
+
+The processor applies pending events in arrival order,
+CLERK_WEBHOOK_BATCH_SIZE at a time, one transaction per batch:
+
+- Each user's events in the batch are folded, in event time order, into one
+  final row. created, updated and deleted for a user become a single write.
+- The rows are written with one INSERT ... ON CONFLICT (clerk_id) DO UPDATE.
+  A second statement handles users who only got ``user.updated``, whose
+  is_active is left as it is. Users who were only deleted get one UPDATE.
+- The events are marked done in the same transaction.
+
+On Postgres each batch takes a transaction-level advisory lock. Across
+uvicorn workers only one batch is applied at a time, so a user's events are
+never applied out of order.
+
+If a batch hits a constraint, such as an email already used by another
+account, its events are retried one at a time. The ones that still fail are
+marked ``failed`` with the error.
+
+Events queued by other workers are picked up on the idle poll
+(CLERK_WEBHOOK_POLL_SECONDS). Done events are kept for
+CLERK_WEBHOOK_RETENTION_DAYS, which covers svix's retry schedule.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Mapping, Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..core.metrics import CLERK_WEBHOOK_EVENTS, stage
+from ..databse import SessionLocal
+from ..models.users import User
+from ..models.webhooks import ClerkWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EVENTS = ("user.created", "user.updated", "user.deleted")
+_PROFILE_FIELDS = ("email", "username", "first_name", "last_name")
+# Key of the advisory lock held while a batch is applied
+_ADVISORY_LOCK_KEY = 0x436C65726B
+
+
+def verify_signature(headers: Mapping[str, str], body: bytes) -> str:
+    """Check the svix signature of ``body``; returns the svix message id."""
+    secret = settings.CLERK_WEBHOOK_SECRET
+    if not secret:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="CLERK_WEBHOOK_SECRET is not configured")
+    msg_id = headers.get("svix-id")
+    timestamp = headers.get("svix-timestamp")
+    signatures = headers.get("svix-signature")
+    if not (msg_id and timestamp and signatures):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing svix headers")
+    try:
+        sent = int(timestamp)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid svix timestamp")
+    if abs(time.time() - sent) > settings.CLERK_WEBHOOK_TOLERANCE_SECONDS:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Webhook timestamp is too old")
+
+    key = base64.b64decode(secret[len("whsec_"):] if secret.startswith("whsec_") else secret)
+    signed = f"{msg_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    # Several space-separated "v1,<base64>" entries while a secret is rotated
+    for signature in signatures.split():
+        version, _, value = signature.partition(",")
+        if version == "v1" and hmac.compare_digest(value, expected):
+            return msg_id
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid webhook signature")
+
+
+def _primary_email(data: dict) -> Optional[str]:
+    email_addresses = data.get("email_addresses") or []
+    primary_email_id = data.get("primary_email_address_id")
+    for email_obj in email_addresses:
+        if email_obj.get("id") == primary_email_id:
+            return email_obj.get("email_address")
+    # fallback if primary_email_id missing or not found
+    return email_addresses[0].get("email_address") if email_addresses else None
+
+
+def parse_event(payload: dict) -> dict:
+    """
+    The event's type, Clerk user id, time and the user fields it sets. Raises
+    400 for the events the synchronous handler rejected.
+    """
+    event_type = payload.get("type")
+    data = payload.get("data")
+    if not event_type or not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing event type or data")
+    if event_type not in SUPPORTED_EVENTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported event type")
+    clerk_user_id = data.get("id")
+    if not clerk_user_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing user id")
+
+    if event_type == "user.deleted":
+        fields = {"is_active": False}
+    else:
+        primary_email = _primary_email(data)
+        if not primary_email:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing email address")
+        fields = {
+            "email": primary_email,
+            "username": data.get("username") or primary_email,  # fallback to email if username is null
+            "first_name": data.get("first_name"),
+            "last_name": data.get("last_name"),
+        }
+        if event_type == "user.created":
+            fields["is_active"] = True
+
+    occurred_at = payload.get("timestamp") or data.get("updated_at") or int(time.time() * 1000)
+    return {"event_type": event_type, "clerk_id": clerk_user_id, "occurred_at": int(occurred_at), "fields": fields}
+
+
+def _insert(db: Session, table):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+
+def enqueue(db: Session, svix_id: str, event: dict) -> bool:
+    """Record a verified event; False if this svix id was already received."""
+    stmt = _insert(db, ClerkWebhookEvent.__table__).values(
+        svix_id=svix_id,
+        event_type=event["event_type"],
+        clerk_id=event["clerk_id"],
+        occurred_at=event["occurred_at"],
+        payload=json.dumps(event["fields"]),
+        status="pending",
+    ).on_conflict_do_nothing(index_elements=["svix_id"])
+    queued = db.execute(stmt).rowcount == 1
+    db.commit()
+    CLERK_WEBHOOK_EVENTS.labels("queued" if queued else "duplicate").inc()
+    return queued
+
+
+def fold(events) -> Dict[str, dict]:
+    """Each user's fields after all of their events, applied in event time order."""
+    users: Dict[str, dict] = {}
+    for event in sorted(events, key=lambda e: (e.occurred_at, e.id)):
+        users.setdefault(event.clerk_id, {}).update(json.loads(event.payload))
+    return users
+
+
+def _apply(db: Session, users: Dict[str, dict]):
+    now = datetime.now(timezone.utc)
+    set_active, keep_active, deactivate = [], [], []
+    for clerk_id, fields in users.items():
+        if "email" not in fields:
+            deactivate.append(clerk_id)  # only user.deleted
+        elif "is_active" in fields:
+            set_active.append({"clerk_id": clerk_id, **fields, "updated_at": now})
+        else:
+            # user.updated only: a new row starts active, an existing one keeps is_active
+            keep_active.append({"clerk_id": clerk_id, **fields, "is_active": True, "updated_at": now})
+
+    table = User.__table__
+    for rows, columns in ((set_active, _PROFILE_FIELDS + ("is_active", "updated_at")),
+                          (keep_active, _PROFILE_FIELDS + ("updated_at",))):
+        if rows:
+            # One statement, executed for all rows (batched into multi-row VALUES by the driver)
+            stmt = _insert(db, table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["clerk_id"], set_={column: stmt.excluded[column] for column in columns},
+            )
+            db.execute(stmt, rows)
+    if deactivate:
+        db.execute(update(table).where(table.c.clerk_id.in_(deactivate)).values(is_active=False, updated_at=now))
+
+
+def process_batch(db: Session, limit: Optional[int] = None) -> int:
+    """
+    Apply up to ``limit`` pending events in one transaction. Returns how many
+    were taken; 0 when none are pending or another worker holds the lock.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+            db.rollback()
+            return 0
+    # Plain rows rather than entities: nothing here needs the identity map
+    events = (
+        db.query(ClerkWebhookEvent.id, ClerkWebhookEvent.svix_id, ClerkWebhookEvent.clerk_id,
+                 ClerkWebhookEvent.occurred_at, ClerkWebhookEvent.payload)
+        .filter(ClerkWebhookEvent.status == "pending")
+        .order_by(ClerkWebhookEvent.id)
+        .limit(limit or settings.CLERK_WEBHOOK_BATCH_SIZE)
+        .all()
+    )
+    if not events:
+        db.rollback()
+        return 0
+
+    table = ClerkWebhookEvent.__table__
+    failed: Dict[int, str] = {}
+    with stage("clerk_webhook_batch"):
+        try:
+            with db.begin_nested():
+                _apply(db, fold(events))
+        except IntegrityError as e:
+            logger.warning("Clerk webhook batch of %d hit %s; applying one at a time", len(events), e.orig)
+            for event in events:
+                try:
+                    with db.begin_nested():
+                        _apply(db, fold([event]))
+                except IntegrityError as e:
+                    logger.warning("Clerk webhook %s failed: %s", event.svix_id, e.orig)
+                    failed[event.id] = str(e.orig)[:1000]
+        now = datetime.now(timezone.utc)
+        db.execute(
+            update(table).where(table.c.id.in_([event.id for event in events if event.id not in failed]))
+            .values(status="done", processed_at=now)
+        )
+        for event_id, error in failed.items():
+            db.execute(update(table).where(table.c.id == event_id)
+                       .values(status="failed", error=error, processed_at=now))
+        db.commit()
+
+    failed_count = len(failed)
+    CLERK_WEBHOOK_EVENTS.labels("applied").inc(len(events) - failed_count)
+    if failed_count:
+        CLERK_WEBHOOK_EVENTS.labels("failed").inc(failed_count)
+    return len(events)
+
+
+def prune(db: Session) -> int:
+    """Delete done events older than CLERK_WEBHOOK_RETENTION_DAYS; failed ones are kept."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.CLERK_WEBHOOK_RETENTION_DAYS)
+    table = ClerkWebhookEvent.__table__
+    deleted = db.execute(delete(table).where(table.c.status == "done", table.c.processed_at < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+
+class WebhookProcessor:
+    """Background task draining the inbox; woken by each queued event, polling otherwise."""
+
+    def __init__(self):
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                await run_in_threadpool(self.drain)
+            except Exception:
+                logger.exception("Applying Clerk webhook events failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.CLERK_WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def drain(self) -> int:
+        """Apply batches until nothing is pending; returns the number of events taken."""
+        total = 0
+        db = SessionLocal()
+        try:
+            while True:
+                taken = process_batch(db)
+                if not taken:
+                    break
+                total += taken
+            if time.monotonic() - self._last_prune > 3600:
+                self._last_prune = time.monotonic()
+                prune(db)
+        finally:
+            db.close()
+        return total
+
+
+webhook_processor = WebhookProcessor()
@@ -0,0 +1,286 @@
+# app/services/context_builder.py
+"""
+Turn retrieved chunks into the context section of the chat prompt.
+
+Stuffing the top-k chunks verbatim repeats every chunk overlap and any
+near-identical boilerplate (lab footers, repeated report headers). Instead:
+
+1. **Merge**: chunks of the same report (``report_id``) with consecutive
+   ``chunk_id``s are joined into one passage. The text they share is dropped
+   only if it is a whole-word overlap of at least a quarter of the chunker's
+   overlap (MIN_STITCH_CHARS at least). Otherwise they are joined on a new
+   line. A chunk whose text is contained in another chunk of the report is
+   dropped.
+2. **Diversify**: passages are picked greedily by maximal marginal relevance
+   (retrieval relevance minus similarity to what is already picked).
+   Similarity is word-trigram Jaccard, so no extra embedding calls are made.
+   Passages at or above CONTEXT_DUPLICATE_THRESHOLD similarity to a picked one
+   are dropped, and so are boilerplate lines (long, digit-free prose such as
+   lab disclaimers) already present earlier in the context.
+3. **Pack**: passages are added in MMR order until CONTEXT_TOKEN_BUDGET prompt
+   tokens are used. The last passage is cut at a line boundary if enough of
+   the budget is left. Passages are grouped per report under a header naming
+   the document, so the LLM can cite it.
+
+Tokens are counted with tiktoken for LLM_MODEL_NAME when it is installed,
+otherwise estimated at ~4 characters per token.
+"""
+import functools
+import math
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from ..config import settings
+from .chunking import overlap_chars
+
+_WORD = re.compile(r"\w+")
+_DIGIT = re.compile(r"\d")
+# Repeated lines are only dropped if they look like boilerplate: at least this
+# many words and no digits (values, doses and dates are never dropped)
+MIN_BOILERPLATE_WORDS = 6
+# A passage cut to fit the budget must keep at least this many tokens
+MIN_TRUNCATED_TOKENS = 48
+# Shorter shared text is never treated as chunk overlap
+MIN_STITCH_CHARS = 16
+
+
+@functools.lru_cache(maxsize=None)
+def token_counter(model_name: str) -> Callable[[str], int]:
+    """Token counter for an LLM; falls back to a characters/4 estimate."""
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: math.ceil(len(text) / 4)
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    return token_counter(settings.LLM_MODEL_NAME)(text)
+
+
+def document_name(metadata: Dict) -> str:
+    return metadata.get("filename") or metadata.get("source") or "Unknown Document"
+
+
+def _report_key(metadata: Dict) -> str:
+    # Older vectors without a report_id fall back to the file they came from
+    report_id = metadata.get("report_id")
+    if report_id is not None:
+        return f"report:{report_id}"
+    return metadata.get("s3_uri") or document_name(metadata)
+
+
+def min_stitch_overlap() -> int:
+    return max(MIN_STITCH_CHARS, overlap_chars() // 4)
+
+
+def _overlap(head: str, tail: str, min_chars: int) -> int:
+    """
+    Length of the longest suffix of ``head`` that is a prefix of ``tail``,
+    starts and ends on word boundaries and is at least ``min_chars`` long;
+    0 if there is none.
+    """
+    for size in range(min(len(head), len(tail)), max(1, min_chars) - 1, -1):
+        start = len(head) - size
+        if start > 0 and not head[start - 1].isspace():
+            continue  # would start mid-word in head
+        if size < len(tail) and not (tail[size].isspace() or tail[size - 1].isspace()):
+            continue  # would end mid-word in tail
+        if tail.startswith(head[start:]):
+            return size
+    return 0
+
+
+def _stitch(head: str, tail: str, min_chars: int) -> str:
+    shared = _overlap(head, tail, min_chars)
+    if shared:
+        return head + tail[shared:]
+    return head + "\n" + tail
+
+
+class Passage:
+    """One or more consecutive chunks of a report, with the best relevance among them."""
+
+    __slots__ = ("text", "metadata", "relevance", "first_chunk", "last_chunk", "_shingles")
+
+    def __init__(self, text: str, metadata: Dict, relevance: float, chunk_id: Optional[int]):
+        self.text = text
+        self.metadata = metadata
+        self.relevance = relevance
+        self.first_chunk = chunk_id
+        self.last_chunk = chunk_id
+        self._shingles = None
+
+    @property
+    def shingles(self) -> frozenset:
+        if self._shingles is None:
+            words = _WORD.findall(self.text.lower())
+            self._shingles = frozenset(zip(words, words[1:], words[2:])) or frozenset(words)
+        return self._shingles
+
+    def similarity(self, other: "Passage") -> float:
+        a, b = self.shingles, other.shingles
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.text, metadata=self.metadata)
+
+
+def merge_chunks(scored_chunks: Sequence[Tuple[Document, float]]) -> List[Passage]:
+    """Merge adjacent/overlapping chunks of the same report into passages."""
+    by_report: Dict[str, List[Tuple[Document, float]]] = {}
+    for doc, relevance in scored_chunks:
+        by_report.setdefault(_report_key(doc.metadata), []).append((doc, relevance))
+
+    min_chars = min_stitch_overlap()
+    passages: List[Passage] = []
+    for chunks in by_report.values():
+        # Chunks without a chunk_id (older vectors) are never stitched
+        chunks.sort(key=lambda item: (item[0].metadata.get("chunk_id") is None, item[0].metadata.get("chunk_id") or 0))
+        report_passages: List[Passage] = []
+        for doc, relevance in chunks:
+            chunk_id = doc.metadata.get("chunk_id")
+            text = doc.page_content
+            container = next((p for p in report_passages if text in p.text), None)
+            if container is not None:
+                container.relevance = max(container.relevance, relevance)
+                continue
+            last = report_passages[-1] if report_passages else None
+            if last is not None and chunk_id is not None and last.last_chunk is not None \
+                    and chunk_id == last.last_chunk + 1:
+                last.text = _stitch(last.text, text, min_chars)
+                last.last_chunk = chunk_id
+                last.relevance = max(last.relevance, relevance)
+                last._shingles = None
+                continue
+            report_passages.append(Passage(text, doc.metadata, relevance, chunk_id))
+        passages.extend(report_passages)
+    return passages
+
+
+def select_diverse(passages: List[Passage], mmr_lambda: float, duplicate_threshold: float) -> List[Passage]:
+    """Order passages by maximal marginal relevance, dropping near-duplicates."""
+    remaining = sorted(passages, key=lambda p: p.relevance, reverse=True)
+    selected: List[Passage] = []
+    redundancy = [0.0] * len(remaining)
+    while remaining:
+        best = max(range(len(remaining)),
+                   key=lambda i: mmr_lambda * remaining[i].relevance - (1 - mmr_lambda) * redundancy[i])
+        picked = remaining.pop(best)
+        redundancy.pop(best)
+        selected.append(picked)
+
+        keep, keep_redundancy = [], []
+        for passage, current in zip(remaining, redundancy):
+            similarity = passage.similarity(picked)
+            if similarity < duplicate_threshold:
+                keep.append(passage)
+                keep_redundancy.append(max(current, similarity))
+        remaining, redundancy = keep, keep_redundancy
+    return selected
+
+
+def drop_repeated_lines(passages: List[Passage]) -> List[Passage]:
+    """Remove boilerplate lines already seen in an earlier passage (or earlier in the same one)."""
+    seen = set()
+    kept = []
+    for passage in passages:
+        lines = []
+        for line in passage.text.split("\n"):
+            key = " ".join(line.split()).lower()
+            if len(key.split()) >= MIN_BOILERPLATE_WORDS and not _DIGIT.search(key):
+                if key in seen:
+                    continue
+                seen.add(key)
+            lines.append(line)
+        if any(line.strip() for line in lines):
+            passage.text = "\n".join(lines)
+            passage._shingles = None
+            kept.append(passage)
+    return kept
+
+
+def _truncate(text: str, budget: int, count: Callable[[str], int]) -> str:
+    """Longest prefix of whole lines that fits ``budget`` tokens."""
+    lines = text.split("\n")
+    low, high = 0, len(lines)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count("\n".join(lines[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return "\n".join(lines[:low])
+
+
+def pack(passages: List[Passage], token_budget: int, count: Callable[[str], int]) -> List[Passage]:
+    """Passages (in order) that fit the budget, the last one possibly truncated."""
+    packed: List[Passage] = []
+    headers = set()
+    used = 0
+    for passage in passages:
+        name = document_name(passage.metadata)
+        key = _report_key(passage.metadata)
+        header_tokens = 0 if key in headers else count(f"[Document: {name}]\n")
+        tokens = count(passage.text) + header_tokens
+        if used + tokens <= token_budget:
+            packed.append(passage)
+        else:
+            left = token_budget - used - header_tokens
+            if left < MIN_TRUNCATED_TOKENS:
+                continue
+            text = _truncate(passage.text, left, count)
+            if not text:
+                continue
+            passage = Passage(text, passage.metadata, passage.relevance, passage.first_chunk)
+            tokens = count(text) + header_tokens
+            packed.append(passage)
+        headers.add(key)
+        used += tokens
+    return packed
+
+
+def render(passages: List[Passage]) -> str:
+    """
+    Context text: passages grouped per report under the document's name, in
+    report order. Two reports with the same filename get separate sections.
+    """
+    groups: Dict[str, List[Passage]] = {}
+    for passage in passages:
+        groups.setdefault(_report_key(passage.metadata), []).append(passage)
+    sections = []
+    for group in groups.values():
+        group.sort(key=lambda p: (p.first_chunk is None, p.first_chunk or 0))
+        name = document_name(group[0].metadata)
+        sections.append(f"[Document: {name}]\n" + "\n...\n".join(p.text for p in group))
+    return "\n\n".join(sections)
+
+
+def build_context(scored_chunks: Sequence[Tuple[Document, float]], token_budget: Optional[int] = None,
+                  mmr_lambda: Optional[float] = None, duplicate_threshold: Optional[float] = None,
+                  count: Optional[Callable[[str], int]] = None) -> Tuple[str, List[Document]]:
+    """
+    Build the prompt context from ``(chunk, relevance)`` pairs.
+
+    Returns the context text and the passages it contains as Documents (for
+    citations). Arguments default to the CONTEXT_* settings.
+    """
+    token_budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    mmr_lambda = settings.CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    if duplicate_threshold is None:
+        duplicate_threshold = settings.CONTEXT_DUPLICATE_THRESHOLD
+    count = count or count_tokens
+
+    passages = merge_chunks(scored_chunks)
+    passages = select_diverse(passages, mmr_lambda, duplicate_threshold)
+    passages = drop_repeated_lines(passages)
+    passages = pack(passages, token_budget, count)
+    return render(passages), [p.to_document() for p in passages]
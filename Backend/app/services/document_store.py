@@ -1,48 +1,158 @@
 # app/services/document_store.py
 from fastapi import HTTPException, status
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain.docstore.document import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import logging
 import os
 import shutil
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
 import uuid
 from ..config import settings
-from sentence_transformers import SentenceTransformer
+from .chunking import build_text_splitter, chunker_signature
+from ..core.metrics import record_cache, stage
+from ..core.tracing import traced
 
-from langchain.embeddings.base import Embeddings
-import numpy as np
-from typing import List
+if TYPE_CHECKING:
+    # chromadb is slow to import; it is loaded on first use instead
+    from langchain_chroma import Chroma
 
-class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+logger = logging.getLogger(__name__)
+
+def load_encoder(model_name: str, backend: str, threads: int):
+    """Load an in-process encoder for the "torch" or "onnx" backend."""
+    if backend == "onnx":
+        from .onnx_encoder import OnnxEncoder
+        return OnnxEncoder(model_name, quantize=settings.EMBEDDING_ONNX_QUANTIZE, threads=threads)
+    if backend == "torch":
+        import torch
         from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer(model_name)
+        torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+class SentenceTransformerEmbeddings(Embeddings):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", backend: Optional[str] = None,
+                 threads: Optional[int] = None):
+        self.backend = backend or settings.EMBEDDING_BACKEND
+        threads = threads or settings.embedding_threads()
+
+        if self.backend == "sidecar":
+            from .embedding_sidecar import SidecarEncoder
+            self.model = SidecarEncoder(
+                model_name,
+                settings.EMBEDDING_SIDECAR_SOCKET,
+                fallback_factory=lambda: load_encoder(model_name, settings.EMBEDDING_SIDECAR_BACKEND, threads),
+                timeout=settings.EMBEDDING_SIDECAR_TIMEOUT
+            )
+        else:
+            self.model = load_encoder(model_name, self.backend, threads)
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.model.max_seq_length
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        with stage("embedding"):
+            embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
         return embeddings.tolist()
 
     def embed_query(self, text: str) -> List[float]:
-        embedding = self.model.encode([text], show_progress_bar=False, convert_to_numpy=True)
+        with stage("embedding"):
+            embedding = self.model.encode([text], show_progress_bar=False, convert_to_numpy=True)
         return embedding[0].tolist()
 
+# Bumped when the metadata stored with each chunk changes shape, so older
+# indexes show up as stale. 2: every chunk carries its report_id.
+CHUNK_METADATA_VERSION = 2
+
+def current_index_version(text_splitter=None) -> str:
+    """
+    Tag stored on every vector so indexes built with a different model,
+    chunking configuration or metadata shape can be detected (and rebuilt by
+    app.cli.reindex). Pass the store's splitter so the chunker is described
+    as built, not as configured.
+    """
+    model = settings.EMBEDDING_MODEL_NAME
+    backend = settings.EMBEDDING_BACKEND
+    if backend == "sidecar":
+        backend = settings.EMBEDDING_SIDECAR_BACKEND
+    if backend == "onnx" and settings.EMBEDDING_ONNX_QUANTIZE:
+        model += "+int8"
+    return f"{model}|{chunker_signature(text_splitter)}|meta={CHUNK_METADATA_VERSION}"
+
+def build_dir(user_id, name: str) -> str:
+    """Directory of a side-by-side build (reindex run, transfer) of a user's index."""
+    return os.path.join(settings.CHROMA_PERSIST_DIRECTORY, ".builds", str(user_id), name)
+
 class DocumentStore:
     def __init__(self):
-        self.embedding_model = SentenceTransformerEmbeddings()
+        self.embedding_model = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME)
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
+        self.text_splitter = build_text_splitter(self.embedding_model)
+
+        self.index_version = current_index_version(self.text_splitter)
         
-        # Dictionary to store vector stores by user ID
+        # Dictionary to store vector stores by user ID, and the resolved
+        # directory each one was opened from
         self.vector_stores = {}
+        self._opened_dirs = {}
         
         # Ensure the persist directory exists
         os.makedirs(settings.CHROMA_PERSIST_DIRECTORY, exist_ok=True)
 
+    def user_dir(self, user_id) -> str:
+        """Path of a user's live index. May be a symlink to a versioned build."""
+        return os.path.join(settings.CHROMA_PERSIST_DIRECTORY, str(user_id))
+
+    def local_users(self) -> List[str]:
+        """Users with a live index on this node's disk."""
+        root = settings.CHROMA_PERSIST_DIRECTORY
+        return sorted(
+            name for name in os.listdir(root)
+            if not name.startswith(".") and ".legacy-" not in name and ".swap-" not in name
+            and os.path.isdir(os.path.join(root, name))
+        )
+
+    def open_vectorstore(self, user_id, persist_directory: str) -> "Chroma":
+        """Open (or create) the Chroma collection of a user at a given directory."""
+        from langchain_chroma import Chroma
+
+        os.makedirs(persist_directory, exist_ok=True)
+        return Chroma(
+            collection_name=f"user_{user_id}",
+            embedding_function=self.embedding_model,
+            persist_directory=persist_directory
+        )
+
+    def _open_live(self, user_id) -> "Chroma":
+        # Open through the resolved path: after a reindex swap the live symlink
+        # points elsewhere, and chromadb caches clients by path
+        live_dir = os.path.realpath(self.user_dir(user_id))
+        self._opened_dirs[user_id] = live_dir
+        return self.open_vectorstore(user_id, live_dir)
+
+    def discard_build(self, user_id, persist_directory: str):
+        """Remove a (possibly half-written) reindex build."""
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+    def _is_cached(self, user_id) -> bool:
+        """True if a handle is cached and still points at the live index."""
+        if user_id not in self.vector_stores:
+            record_cache("vector_store_handle", False)
+            return False
+        if self._opened_dirs.get(user_id) != os.path.realpath(self.user_dir(user_id)):
+            self.vector_stores.pop(user_id, None)
+            record_cache("vector_store_handle", False)
+            return False
+        record_cache("vector_store_handle", True)
+        return True
+
+    @traced("document_store.delete_user_collection")
     def delete_user_collection(self, user_id: str):
         """Delete entire collection and directory for a user"""
         try:
@@ -50,18 +160,24 @@ class DocumentStore:
             if user_id in self.vector_stores:
                 del self.vector_stores[user_id]
             
-            # Delete the physical directory
-            user_dir = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, str(user_id))
-            if os.path.exists(user_dir):
+            # Delete the physical directory (and the versioned build it points to)
+            user_dir = self.user_dir(user_id)
+            if os.path.islink(user_dir):
+                target = os.path.realpath(user_dir)
+                os.unlink(user_dir)
+                shutil.rmtree(target, ignore_errors=True)
+                logger.info("Deleted Chroma directory %s", target)
+            elif os.path.exists(user_dir):
                 shutil.rmtree(user_dir)
-                print(f"✅ Deleted Chroma directory: {user_dir}")
+                logger.info("Deleted Chroma directory %s", user_dir)
             else:
-                print(f"⚠️ Chroma directory not found: {user_dir}")
-                
+                logger.warning("Chroma directory not found: %s", user_dir)
+
         except Exception as e:
-            print(f"❌ Error deleting collection for user {user_id}: {e}")
+            logger.error("Error deleting collection for user %s: %s", user_id, e)
             raise
 
+    @traced("document_store.delete_document")
     def delete_document(self, report_id: int, user_id: int):
         """
         Deletes a document from the vector store based on report_id for a specific user.
@@ -73,25 +189,21 @@ class DocumentStore:
         Raises:
             HTTPException: If the document cannot be found or deleted.
         """
-        user_dir = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, str(user_id))
+        user_dir = self.user_dir(user_id)
         
-        if user_id not in self.vector_stores:
+        if not self._is_cached(user_id):
             if not os.path.exists(user_dir):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Vector store not found for user"
                 )
-            self.vector_stores[user_id] = Chroma(
-                collection_name=f"user_{user_id}",
-                embedding_function=self.embedding_model,
-                persist_directory=user_dir
-            )
+            self.vector_stores[user_id] = self._open_live(user_id)
 
         vector_store = self.vector_stores[user_id]
         
-        # If Chroma supports document deletion by ID, use that
+        # Every chunk carries the id of its report
         try:
-            vector_store.delete(ids=str(report_id))
+            vector_store.delete(where={"report_id": report_id})
 
         except Exception as e:
             raise HTTPException(
@@ -99,7 +211,8 @@ class DocumentStore:
                 detail=f"Failed to delete document from vector store: {str(e)}"
             )
     
-    def get_vectorstore(self, user_id: int) -> Optional[Chroma]:
+    @traced("document_store.get_vectorstore")
+    def get_vectorstore(self, user_id: int) -> Optional["Chroma"]:
         """
         Get the vector store for a specific user.
         
@@ -110,21 +223,41 @@ class DocumentStore:
             Optional[Chroma]: Vector store instance or None if not found
         """
         # Create user directory path
-        user_dir = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, str(user_id))
+        user_dir = self.user_dir(user_id)
         
         # Load vector store if not in memory
-        if user_id not in self.vector_stores:
+        if not self._is_cached(user_id):
             if not os.path.exists(user_dir):
                 return None
             
-            self.vector_stores[user_id] = Chroma(
-                collection_name=f"user_{user_id}",
-                embedding_function=self.embedding_model,
-                persist_directory=user_dir
-            )
+            self.vector_stores[user_id] = self._open_live(user_id)
         
         return self.vector_stores[user_id]
     
+    @traced("document_store.build_documents")
+    def build_documents(self, text: str, metadata: Dict[str, Any]) -> List[Document]:
+        """
+        Split text into chunks and wrap them as Documents tagged with metadata.
+        
+        Args:
+            text: Extracted text from the document
+            metadata: Document metadata copied onto every chunk
+            
+        Returns:
+            List[Document]: Chunk documents ready to be embedded
+        """
+        with stage("chunking"):
+            chunks = self.text_splitter.split_text(text)
+
+        documents = []
+        for idx, chunk in enumerate(chunks):
+            chunk_metadata = metadata.copy()
+            chunk_metadata["chunk_id"] = idx
+            chunk_metadata["index_version"] = self.index_version
+            documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
+
+    @traced("document_store.store_document")
     def store_document(self, user_id: int, filename: str, text: str, metadata: Dict[str, Any], user_uuid: str = None):
         """
         Store a document in the vector store for a specific user.
@@ -136,37 +269,42 @@ class DocumentStore:
             metadata: Document metadata
             user_uuid: User UUID (optional)
             
+        Returns:
+            Chroma: Vector store instance
+        """
+        return self.store_documents(user_id, [(text, metadata)])
+
+    @traced("document_store.store_documents")
+    def store_documents(self, user_id: int, items: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Store several documents of a user with a single vector-store write;
+        the chunks of all of them are embedded together, in shared batches.
+        
+        Args:
+            user_id: User ID
+            items: (extracted text, metadata) per document
+            
         Returns:
             Chroma: Vector store instance
         """
         # Create user directory if it doesn't exist
-        user_dir = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, str(user_id))
+        user_dir = self.user_dir(user_id)
         os.makedirs(user_dir, exist_ok=True)
         
-        # Split text into chunks
-        text_chunks = self.text_splitter.split_text(text)
-        
-        # Prepare documents with metadata
-        documents = []
-        for idx, chunk in enumerate(text_chunks):
-            chunk_metadata = metadata.copy()
-            chunk_metadata["chunk_id"] = idx
-            documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        documents = [doc for text, metadata in items for doc in self.build_documents(text, metadata)]
         
         # Create or get vector store for the user
-        if user_id not in self.vector_stores:
-            self.vector_stores[user_id] = Chroma(
-                collection_name=f"user_{user_id}",
-                embedding_function=self.embedding_model,
-                persist_directory=user_dir
-            )
+        if not self._is_cached(user_id):
+            self.vector_stores[user_id] = self._open_live(user_id)
         
         # Add documents to vector store
-        self.vector_stores[user_id].add_documents(documents)
+        if documents:
+            with stage("vector_add"):
+                self.vector_stores[user_id].add_documents(documents)
         
-        # Persist changes
         return self.vector_stores[user_id]
     
+    @traced("document_store.get_relevant_documents")
     def get_relevant_documents(self, user_id: int, query: str, top_k: int = 5):
         """
         Get relevant document chunks for a query.
@@ -180,26 +318,166 @@ class DocumentStore:
             List[Document]: List of relevant document chunks
         """
         # Create user directory path
-        user_dir = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, str(user_id))
+        user_dir = self.user_dir(user_id)
         
         # Load vector store if not in memory
-        if user_id not in self.vector_stores:
+        if not self._is_cached(user_id):
             if not os.path.exists(user_dir):
                 return []
             
-            self.vector_stores[user_id] = Chroma(
-                collection_name=f"user_{user_id}",
-                embedding_function=self.embedding_model,
-                persist_directory=user_dir
-            )
+            self.vector_stores[user_id] = self._open_live(user_id)
         
         # Search for relevant documents
-        docs_with_scores = self.vector_stores[user_id].similarity_search_with_score(
-            query, k=top_k
-        )
+        with stage("vector_search"):
+            docs_with_scores = self.vector_stores[user_id].similarity_search_with_score(
+                query, k=top_k
+            )
         
         return docs_with_scores
     
+    @traced("document_store.search_by_vector")
+    def search_by_vector(self, vector_store: "Chroma", embedding: List[float], k: int,
+                         report_ids: Optional[List[int]] = None):
+        """
+        Top ``k`` chunks for an already-embedded query, as (Document, relevance)
+        pairs with relevance in [0, 1]. ``report_ids`` restricts the search to
+        the chunks of those reports.
+        """
+        where = {"report_id": {"$in": list(report_ids)}} if report_ids else None
+        with stage("vector_search"):
+            docs_with_distances = vector_store.similarity_search_by_vector_with_relevance_scores(
+                embedding, k=k, filter=where
+            )
+        # Chroma returns distances; convert them like similarity_search_with_relevance_scores
+        relevance = vector_store._select_relevance_score_fn()
+        return [(doc, relevance(distance)) for doc, distance in docs_with_distances]
+
+    def export_vectors(self, user_id, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Every stored chunk of a user with its vector, page by page, for moving
+        an index to another node without re-embedding it.
+        """
+        vector_store = self.get_vectorstore(user_id)
+        if vector_store is None:
+            return
+        offset = 0
+        while True:
+            page = vector_store._collection.get(
+                limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"]
+            )
+            if not len(page["ids"]):
+                return
+            for chunk_id, content, metadata, embedding in zip(
+                page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+            ):
+                yield {"id": chunk_id, "document": content, "metadata": metadata,
+                       "embedding": [float(value) for value in embedding]}
+            offset += len(page["ids"])
+
+    def add_vectors(self, vector_store: "Chroma", rows: Iterable[Dict[str, Any]]):
+        """Add rows produced by ``export_vectors`` as they are."""
+        rows = list(rows)
+        if rows:
+            vector_store._collection.add(
+                ids=[row["id"] for row in rows],
+                embeddings=[row["embedding"] for row in rows],
+                documents=[row["document"] for row in rows],
+                metadatas=[row["metadata"] or None for row in rows],
+            )
+
+    def get_index_versions(self, user_id) -> Dict[str, int]:
+        """
+        Count a user's vectors per index version.
+
+        More than one key (or a key different from ``self.index_version``)
+        means the index is stale or half-migrated and should be rebuilt.
+        Vectors written before tagging was introduced are counted as "untagged".
+        """
+        vector_store = self.get_vectorstore(user_id)
+        if vector_store is None:
+            return {}
+
+        counts: Dict[str, int] = {}
+        for meta in vector_store.get(include=["metadatas"])["metadatas"]:
+            version = (meta or {}).get("index_version", "untagged")
+            counts[version] = counts.get(version, 0) + 1
+        return counts
+
+    @traced("document_store.swap_user_index")
+    def swap_user_index(self, user_id, new_dir: str):
+        """
+        Atomically make ``new_dir`` the live index of a user.
+
+        The live path is a symlink that is replaced with ``os.replace``, so
+        readers see either the old or the new index, never a partial one. A
+        legacy plain directory is moved aside first (a one-off, non-atomic step)
+        and removed together with the previous build once the swap is done.
+        """
+        user_dir = self.user_dir(user_id)
+        previous = None
+
+        if os.path.islink(user_dir):
+            previous = os.path.realpath(user_dir)
+        elif os.path.isdir(user_dir):
+            previous = f"{user_dir}.legacy-{uuid.uuid4().hex[:8]}"
+            os.rename(user_dir, previous)
+
+        tmp_link = f"{user_dir}.swap-{uuid.uuid4().hex[:8]}"
+        os.symlink(os.path.abspath(new_dir), tmp_link)
+        os.replace(tmp_link, user_dir)
+
+        # Drop any cached handle to the old index
+        self.vector_stores.pop(user_id, None)
+
+        if previous and os.path.realpath(previous) != os.path.realpath(new_dir):
+            shutil.rmtree(previous, ignore_errors=True)
+
     def persist_all(self):
         """Persist all vector stores to disk."""
         pass
+
+
+def build_document_store() -> DocumentStore:
+    """A new DocumentStore for VECTOR_BACKEND ("chroma" or "pgvector")."""
+    if settings.VECTOR_BACKEND == "pgvector":
+        from .pgvector_store import PgVectorDocumentStore
+        return PgVectorDocumentStore()
+    if settings.VECTOR_BACKEND == "chroma":
+        return DocumentStore()
+    raise ValueError(f"Unknown vector backend: {settings.VECTOR_BACKEND}")
+
+
+_document_store: Optional[DocumentStore] = None
+_routed_document_store = None
+_document_store_lock = threading.Lock()
+
+def get_local_document_store() -> DocumentStore:
+    """
+    Process-wide DocumentStore, created on first use (or during warm-up) so the
+    embedding model is loaded once per worker instead of once per request.
+    """
+    global _document_store
+    if _document_store is None:
+        with _document_store_lock:
+            if _document_store is None:
+                _document_store = build_document_store()
+    return _document_store
+
+def get_document_store() -> DocumentStore:
+    """
+    The store request handlers use. With CLUSTER_NODES set (and node-local
+    Chroma indexes), operations on users owned by another node are forwarded
+    to it; see app/services/vector_routing.py.
+    """
+    global _routed_document_store
+    from ..core.cluster import clustering_enabled
+
+    if not clustering_enabled():
+        return get_local_document_store()
+    if _routed_document_store is None:
+        from .vector_routing import RoutedDocumentStore
+        local = get_local_document_store()
+        with _document_store_lock:
+            if _routed_document_store is None:
+                _routed_document_store = RoutedDocumentStore(local)
+    return _routed_document_store
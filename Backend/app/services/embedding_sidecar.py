@@ -0,0 +1,272 @@
+# app/services/embedding_sidecar.py
+"""
+Shared embedding sidecar: one process holds the model, uvicorn workers talk to
+it over a Unix domain socket.
+
+Wire format (network byte order headers, little-endian float32 payloads):
+
+    request:  magic "EMB1" | op u8 | count u32 | count x u32 text lengths | utf-8 texts
+    response: magic "EMB1" | status u8 | rows u32 | dim u32 | body
+
+For OP_ENCODE the body is rows*dim float32 values. OP_INFO returns no body;
+rows carries the model's max sequence length and dim its embedding size. On
+error status is 1 and the body is a utf-8 message of ``rows`` bytes.
+
+The server batches texts from concurrent requests (across workers) into one
+encode call, bounded by a maximum batch size and a short wait window.
+"""
+import asyncio
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMB1"
+OP_ENCODE = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_REQUEST_HEADER = struct.Struct("!4sBI")
+_RESPONSE_HEADER = struct.Struct("!4sBII")
+
+# Seconds to stay on the in-process fallback before trying the sidecar again
+RETRY_AFTER_SECONDS = 10.0
+
+
+class SidecarError(RuntimeError):
+    """The sidecar answered with an error status."""
+
+
+def encode_request(op: int, texts: List[str]) -> bytes:
+    payloads = [text.encode("utf-8") for text in texts]
+    lengths = struct.pack(f"!{len(payloads)}I", *(len(p) for p in payloads))
+    return _REQUEST_HEADER.pack(MAGIC, op, len(payloads)) + lengths + b"".join(payloads)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Embedding sidecar closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class EmbeddingServer:
+    """asyncio Unix socket server around a single encoder instance."""
+
+    def __init__(self, encoder, socket_path: str, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.encoder = encoder
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.dim = 0
+        # One encode at a time; the encoder parallelises internally
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def serve_forever(self):
+        self.queue = asyncio.Queue()
+        self.dim = len(self.encoder.embed_query("dimension probe"))  # also warms the model up
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        batcher = asyncio.create_task(self._batcher())
+        logger.info("Embedding sidecar listening on %s", self.socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    magic, op, count = _REQUEST_HEADER.unpack(await reader.readexactly(_REQUEST_HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+                if magic != MAGIC:
+                    await self._write_error(writer, "bad magic")
+                    break
+
+                lengths = struct.unpack(f"!{count}I", await reader.readexactly(4 * count)) if count else ()
+                body = await reader.readexactly(sum(lengths)) if count else b""
+                texts, offset = [], 0
+                for length in lengths:
+                    texts.append(body[offset:offset + length].decode("utf-8"))
+                    offset += length
+
+                if op == OP_INFO:
+                    writer.write(_RESPONSE_HEADER.pack(MAGIC, STATUS_OK, self.encoder.max_seq_length, self.dim))
+                elif op == OP_ENCODE:
+                    future = asyncio.get_running_loop().create_future()
+                    await self.queue.put((texts, future))
+                    try:
+                        vectors = await future
+                    except Exception as e:
+                        await self._write_error(writer, str(e))
+                        continue
+                    writer.write(_RESPONSE_HEADER.pack(MAGIC, STATUS_OK, *vectors.shape))
+                    writer.write(vectors.astype("<f4", copy=False).tobytes())
+                else:
+                    await self._write_error(writer, f"unknown op {op}")
+                    continue
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _write_error(self, writer: asyncio.StreamWriter, message: str):
+        body = message.encode("utf-8")
+        writer.write(_RESPONSE_HEADER.pack(MAGIC, STATUS_ERROR, len(body), 0) + body)
+        await writer.drain()
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self.encoder.model.encode(texts, show_progress_bar=False, convert_to_numpy=True),
+                          dtype=np.float32)
+
+
+class SidecarEncoder:
+    """
+    Client side of the sidecar, shaped like the other encoders (``encode``,
+    ``tokenizer``, ``max_seq_length``). Falls back to loading the model
+    in-process when the sidecar is unreachable, and retries it later. A
+    request the sidecar answers with an error is also encoded in-process. The
+    sidecar stays in use for later requests, since the connection is still
+    in sync; if the input itself is bad, the in-process encode raises.
+    """
+
+    def __init__(self, model_name: str, socket_path: str, fallback_factory, timeout: float = 30.0):
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._fallback_factory = fallback_factory
+        self._fallback = None
+        self._tokenizer = None
+        self._max_seq_length: Optional[int] = None
+        self._down_until = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
+
+    def _request(self, op: int, texts: List[str]) -> Tuple[int, int, bytes]:
+        sock = self._connection()
+        sock.sendall(encode_request(op, texts))
+        magic, status, rows, dim = _RESPONSE_HEADER.unpack(_recv_exact(sock, _RESPONSE_HEADER.size))
+        if magic != MAGIC:
+            raise ConnectionError("Bad response from embedding sidecar")
+        if status != STATUS_OK:
+            raise SidecarError(_recv_exact(sock, rows).decode("utf-8", "replace"))
+        body = _recv_exact(sock, rows * dim * 4) if op == OP_ENCODE else b""
+        return rows, dim, body
+
+    def _local_encoder(self):
+        with self._lock:
+            if self._fallback is None:
+                self._fallback = self._fallback_factory()
+        return self._fallback
+
+    def _sidecar_available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _mark_down(self, error: Exception):
+        self._close()
+        self._down_until = time.monotonic() + RETRY_AFTER_SECONDS
+        logger.warning("Embedding sidecar unavailable (%s); encoding in-process", error)
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if self._sidecar_available():
+            try:
+                rows, dim, body = self._request(OP_ENCODE, list(texts))
+                return np.frombuffer(body, dtype="<f4").reshape(rows, dim)
+            except (OSError, ConnectionError) as e:
+                self._mark_down(e)
+            except SidecarError as e:
+                logger.warning("Embedding sidecar failed to encode %d texts (%s); encoding in-process", len(texts), e)
+        return self._local_encoder().encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar,
+                                            convert_to_numpy=convert_to_numpy)
+
+    @property
+    def tokenizer(self):
+        # Only the tokenizer is loaded in the worker, not the model weights
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        if self._max_seq_length is None:
+            if self._sidecar_available():
+                try:
+                    self._max_seq_length = self._request(OP_INFO, [])[0]
+                    return self._max_seq_length
+                except (OSError, ConnectionError) as e:
+                    self._mark_down(e)
+                except SidecarError as e:
+                    logger.warning("Embedding sidecar failed to report its model info (%s)", e)
+            self._max_seq_length = self._local_encoder().max_seq_length
+        return self._max_seq_length
@@ -0,0 +1,31 @@
+# app/services/llm.py
+import os
+import threading
+
+from ..config import settings
+
+_llm_clients_ready = False
+_llm_clients_lock = threading.Lock()
+
+def init_llm_clients():
+    """
+    Import the LLM libraries and configure API keys. Deferred until the first
+    chat request (or app warm-up) because these imports are slow.
+    """
+    global _llm_clients_ready
+    if _llm_clients_ready:
+        return
+    with _llm_clients_lock:
+        if _llm_clients_ready:
+            return
+        import langchain.prompts  # noqa: F401
+        import langchain_openai  # noqa: F401
+        import google.generativeai as genai
+
+        # Configure Gemini
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+
+        # Configure OpenAI
+        if settings.OPENAI_API_KEY:
+            os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
+        _llm_clients_ready = True
@@ -0,0 +1,301 @@
+# app/services/llm_router.py
+"""
+Latency-aware routing of chat completions across LLM providers.
+
+Each request goes to the provider with the lowest latency EWMA whose circuit
+breaker is closed. If it hasn't answered within its recent p95 latency
+(LLM_HEDGE_PERCENTILE, clamped to LLM_HEDGE_MIN/MAX_DELAY_SECONDS), a hedged
+request is sent to the alternate provider. The first answer wins and the
+other request is cancelled. If a call fails, the request fails over to the
+alternate at once.
+
+A per-process semaphore caps in-flight provider calls (LLM_MAX_CONCURRENCY).
+A request waits up to LLM_QUEUE_TIMEOUT_SECONDS for a slot. Hedges are only
+sent when a slot is free, so hedging adds no load once the cap is reached.
+
+Providers only need ``name`` and ``async complete(prompt) -> str``, so the
+router can be driven with local fakes (see benchmarks/llm_router.py).
+"""
+import asyncio
+import collections
+import math
+import threading
+import time
+from typing import Deque, Dict, List, Optional
+
+from ..config import settings
+from ..core.metrics import LLM_CALLS, LLM_HEDGES
+from ..core.tracing import start_span
+
+# Latencies needed before the observed percentile replaces the default hedge delay
+MIN_SAMPLES_FOR_PERCENTILE = 20
+
+
+class LLMUnavailable(Exception):
+    """No provider could answer: all circuits open, no capacity, or every call failed."""
+
+
+class LatencyTracker:
+    """EWMA of a provider's latency plus a window of recent samples for percentiles."""
+
+    def __init__(self, alpha: float, window: int = 200):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.samples: Deque[float] = collections.deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < MIN_SAMPLES_FOR_PERCENTILE:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)]
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. Once
+    ``cooldown_seconds`` have passed it is half-open: one trial call is let
+    through, which closes it on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def on_call(self):
+        if self.state == "half_open":
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        # A cancelled hedge loser says nothing about the provider's health
+        self.trial_in_flight = False
+
+
+class LLMRouter:
+    def __init__(self, providers: List, max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 queue_timeout: Optional[float] = None, hedge: Optional[bool] = None,
+                 hedge_percentile: Optional[float] = None, min_hedge_delay: Optional[float] = None,
+                 max_hedge_delay: Optional[float] = None, default_hedge_delay: Optional[float] = None,
+                 ewma_alpha: Optional[float] = None, breaker_failures: Optional[int] = None,
+                 breaker_cooldown: Optional[float] = None):
+        def pick(value, default):
+            return default if value is None else value
+
+        self.providers = list(providers)
+        self.max_concurrency = pick(max_concurrency, settings.LLM_MAX_CONCURRENCY)
+        self.timeout = pick(timeout, settings.LLM_TIMEOUT_SECONDS)
+        self.queue_timeout = pick(queue_timeout, settings.LLM_QUEUE_TIMEOUT_SECONDS)
+        self.hedge = pick(hedge, settings.LLM_HEDGE_ENABLED)
+        self.hedge_percentile = pick(hedge_percentile, settings.LLM_HEDGE_PERCENTILE)
+        self.min_hedge_delay = pick(min_hedge_delay, settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+        self.max_hedge_delay = pick(max_hedge_delay, settings.LLM_HEDGE_MAX_DELAY_SECONDS)
+        self.default_hedge_delay = pick(default_hedge_delay, settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS)
+        alpha = pick(ewma_alpha, settings.LLM_EWMA_ALPHA)
+        self.trackers: Dict[str, LatencyTracker] = {p.name: LatencyTracker(alpha) for p in self.providers}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            p.name: CircuitBreaker(pick(breaker_failures, settings.LLM_BREAKER_FAILURES),
+                                   pick(breaker_cooldown, settings.LLM_BREAKER_COOLDOWN_SECONDS))
+            for p in self.providers
+        }
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # One per event loop: asyncio primitives can't be shared across loops
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    def ranked_providers(self) -> List:
+        """Available providers, fastest EWMA first; unmeasured ones keep their configured order."""
+        order = {p.name: index for index, p in enumerate(self.providers)}
+        available = [p for p in self.providers if self.breakers[p.name].allow()]
+
+        def key(provider):
+            ewma = self.trackers[provider.name].ewma
+            return (ewma is None, ewma or 0.0, order[provider.name])
+
+        return sorted(available, key=key)
+
+    def hedge_delay(self, provider) -> float:
+        observed = self.trackers[provider.name].percentile(self.hedge_percentile)
+        delay = self.default_hedge_delay if observed is None else observed
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    async def _call(self, provider, prompt: str) -> str:
+        breaker = self.breakers[provider.name]
+        tracker = self.trackers[provider.name]
+        breaker.on_call()
+        started = time.perf_counter()
+        try:
+            with start_span("llm.provider", provider=provider.name):
+                text = await asyncio.wait_for(provider.complete(prompt), self.timeout)
+        except asyncio.CancelledError:
+            # The elapsed time is a lower bound on this call's latency; count
+            # it so a provider that keeps losing hedges stops being primary
+            tracker.observe(time.perf_counter() - started)
+            breaker.record_cancelled()
+            LLM_CALLS.labels(provider.name, "cancelled").inc()
+            raise
+        except Exception:
+            if time.perf_counter() - started >= self.timeout:
+                tracker.observe(self.timeout)
+            breaker.record_failure()
+            LLM_CALLS.labels(provider.name, "error").inc()
+            raise
+        tracker.observe(time.perf_counter() - started)
+        breaker.record_success()
+        LLM_CALLS.labels(provider.name, "ok").inc()
+        return text
+
+    def _launch(self, provider, prompt: str, slots: asyncio.Semaphore) -> asyncio.Task:
+        task = asyncio.create_task(self._call(provider, prompt))
+        # Released on completion, including a cancel before the task ever ran
+        task.add_done_callback(lambda _: slots.release())
+        return task
+
+    async def complete(self, prompt: str) -> str:
+        """Return the first successful completion; raises LLMUnavailable."""
+        candidates = self.ranked_providers()
+        if not candidates:
+            raise LLMUnavailable("No LLM provider is available" if self.providers
+                                 else "No LLM provider is configured")
+
+        slots = self._semaphore()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMUnavailable("Too many concurrent LLM requests")
+
+        primary, alternates = candidates[0], candidates[1:]
+        pending: Dict[asyncio.Task, object] = {self._launch(primary, prompt, slots): primary}
+        hedge_at = time.monotonic() + self.hedge_delay(primary) if self.hedge and alternates else None
+        hedged_to = None
+        errors: List[str] = []
+        try:
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Hedge: primary is past its p95; only if capacity allows
+                    hedge_at = None
+                    if slots.locked():
+                        LLM_HEDGES.labels("skipped").inc()
+                        continue
+                    await slots.acquire()
+                    hedged_to = alternates.pop(0)
+                    pending[self._launch(hedged_to, prompt, slots)] = hedged_to
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {type(e).__name__}: {e}")
+                        continue
+                    if hedged_to is not None:
+                        LLM_HEDGES.labels("won" if provider is hedged_to else "lost").inc()
+                    return text
+
+                # Every finished call failed: fail over to the next provider
+                if not pending and alternates:
+                    hedge_at = None
+                    try:
+                        await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    fallback = alternates.pop(0)
+                    pending[self._launch(fallback, prompt, slots)] = fallback
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise LLMUnavailable("; ".join(errors) or "No LLM capacity for failover")
+
+
+# ---------------------------
+# Providers
+# ---------------------------
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self, model_name: str, timeout: float):
+        from langchain_openai import ChatOpenAI
+
+        # Retries and hedging are the router's job
+        self._llm = ChatOpenAI(model_name=model_name, temperature=0.2, timeout=timeout, max_retries=0)
+
+    async def complete(self, prompt: str) -> str:
+        return (await self._llm.ainvoke(prompt)).content
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self, model_name: str):
+        import google.generativeai as genai
+
+        self._model = genai.GenerativeModel(model_name, generation_config={"temperature": 0.2})
+
+    async def complete(self, prompt: str) -> str:
+        return (await self._model.generate_content_async(prompt)).text
+
+
+def build_providers() -> List:
+    """Providers from LLM_PROVIDERS, in order, skipping any without an API key."""
+    from .llm import init_llm_clients
+
+    init_llm_clients()
+    providers = []
+    for name in (n.strip() for n in settings.LLM_PROVIDERS.split(",")):
+        if name == "openai" and settings.OPENAI_API_KEY:
+            providers.append(OpenAIProvider(settings.LLM_MODEL_NAME, settings.LLM_TIMEOUT_SECONDS))
+        elif name == "gemini" and settings.GEMINI_API_KEY:
+            providers.append(GeminiProvider(settings.GEMINI_MODEL_NAME))
+    return providers
+
+
+_llm_router: Optional[LLMRouter] = None
+_llm_router_lock = threading.Lock()
+
+def get_llm_router() -> LLMRouter:
+    """Process-wide router, created on first use (or during warm-up)."""
+    global _llm_router
+    if _llm_router is None:
+        with _llm_router_lock:
+            if _llm_router is None:
+                _llm_router = LLMRouter(build_providers())
+    return _llm_router
@@ -0,0 +1,175 @@
+# app/services/onnx_encoder.py
+"""
+ONNX Runtime encoder for sentence-transformers models.
+
+Exports the transformer of a SentenceTransformer model to ONNX once (optionally
+with dynamic int8 weight quantization), then serves ``encode`` with ONNX Runtime
+and numpy pooling. At runtime only the tokenizer and the ONNX graph are loaded,
+so torch is needed for the export step only.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+
+from ..config import settings
+
+
+def export_dir(model_name: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+    return os.path.join(settings.ONNX_CACHE_DIRECTORY, safe_name)
+
+
+# Written last: its presence means the export directory is complete
+COMPLETE_MARKER = "encoder_config.json"
+
+
+def _export(model_name: str, target: str):
+    """Write the ONNX graph, tokenizer and config for ``model_name`` into ``target``."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    pooling = next((m for m in st_model if isinstance(m, Pooling)), None)
+    pooling_mode = "mean"
+    if pooling is not None and pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling is not None and pooling.pooling_mode_max_tokens:
+        pooling_mode = "max"
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            os.path.join(target, "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(target)
+    with open(os.path.join(target, COMPLETE_MARKER), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "pooling": pooling_mode,
+            "normalize": any(isinstance(m, Normalize) for m in st_model),
+            "max_seq_length": st_model.max_seq_length,
+            "input_names": input_names,
+        }, f)
+
+
+def export_model(model_name: str, quantize: bool = False) -> str:
+    """
+    Export ``model_name`` to ONNX (plus tokenizer and pooling config) and
+    return the export directory. Safe to call again, and from several
+    processes at once: the export holds a file lock, is written to a temporary
+    directory and moved into place with ``os.replace``, so readers never see a
+    partial export.
+    """
+    # Ships with huggingface_hub, which the export needs anyway
+    from filelock import FileLock
+
+    target = export_dir(model_name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    with FileLock(target + ".lock"):
+        if not os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+            staging = tempfile.mkdtemp(prefix=os.path.basename(target) + ".tmp-", dir=os.path.dirname(target))
+            try:
+                _export(model_name, staging)
+                # Left behind by a crashed export from before the marker existed
+                shutil.rmtree(target, ignore_errors=True)
+                os.replace(staging, target)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+        int8_path = os.path.join(target, "model.int8.onnx")
+        if quantize and not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            staging = f"{int8_path}.tmp-{os.getpid()}"
+            try:
+                quantize_dynamic(os.path.join(target, "model.onnx"), staging, weight_type=QuantType.QInt8)
+                os.replace(staging, int8_path)
+            finally:
+                if os.path.exists(staging):
+                    os.remove(staging)
+
+    return target
+
+
+class OnnxEncoder:
+    """
+    Drop-in replacement for the parts of ``SentenceTransformer`` the app uses:
+    ``encode``, ``tokenizer`` and ``max_seq_length``.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        target = export_dir(model_name)
+        model_file = "model.int8.onnx" if quantize else "model.onnx"
+        if not all(os.path.exists(os.path.join(target, name)) for name in (COMPLETE_MARKER, model_file)):
+            export_model(model_name, quantize=quantize)
+
+        with open(os.path.join(target, COMPLETE_MARKER)) as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(target)
+        self.max_seq_length = self.config["max_seq_length"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            # Pin the pool size so N uvicorn workers don't each spin up one
+            # thread per core
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(target, model_file), options, providers=["CPUExecutionProvider"]
+        )
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.config["pooling"] == "cls":
+            return hidden[:, 0]
+        mask = mask[..., None].astype(hidden.dtype)
+        if self.config["pooling"] == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        # Sort by length so each batch pads to a similar size, then restore order
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        outputs = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.config["input_names"]}
+            hidden = self.session.run(["last_hidden_state"], feed)[0]
+            pooled = self._pool(hidden, encoded["attention_mask"])
+            if self.config["normalize"]:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for position, i in enumerate(idx):
+                outputs[i] = pooled[position]
+        if not outputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(outputs).astype(np.float32)
@@ -0,0 +1,327 @@
+# app/services/pgvector_store.py
+"""
+Vector index in Postgres with pgvector (VECTOR_BACKEND=pgvector).
+
+Chroma keeps each user's index in a directory under CHROMA_PERSIST_DIRECTORY,
+so every API replica has its own copy. This backend keeps all chunks in one
+``document_chunks`` table in the application database instead, so every
+replica sees the same index.
+
+- Chunks carry the owner's clerk id, the report id and their chunk id as
+  columns; the full chunk metadata is kept as JSONB.
+- Search uses an HNSW index (cosine distance), filtered to one user (and
+  optionally to some reports). With PGVECTOR_ITERATIVE_SCAN on, pgvector keeps
+  walking the graph until enough rows pass the filter, so small users still
+  get ``k`` results out of a large shared index.
+- Inserts are streamed with COPY, PGVECTOR_COPY_BATCH rows per statement, in
+  one transaction per call.
+- Deleting a report or a user is a single DELETE.
+- Reindex builds are rows tagged with a build name. Swapping one in deletes
+  the ``live`` rows and renames the build in one transaction.
+
+The table is created on first use. Its vector dimension is fixed by the
+embedding model; switching to a model with another dimension means dropping
+the table and reindexing. Existing Chroma directories are imported with
+``python -m app.cli.migrate_chroma_to_pgvector``.
+
+Vectors are sent as pgvector's text format, so only psycopg2 is needed on the
+client side.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from sqlalchemy import text
+
+from ..config import settings
+from ..core.metrics import stage
+from ..core.tracing import traced
+from ..databse import get_engine
+from .chunking import build_text_splitter
+from .document_store import DocumentStore, SentenceTransformerEmbeddings, current_index_version
+
+logger = logging.getLogger(__name__)
+
+TABLE = "document_chunks"
+LIVE_BUILD = "live"
+
+_COPY_COLUMNS = "clerk_id, build, report_id, chunk_id, content, metadata, index_version, embedding"
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    """pgvector's text format: ``[0.1,0.2,...]``."""
+    return "[" + ",".join(str(float(value)) for value in vector) + "]"
+
+
+def ensure_schema(engine, dimension: int):
+    """
+    Create the extension, table and indexes if missing, once per process.
+
+    Raises RuntimeError if the table exists with another vector dimension.
+    """
+    key = (id(engine), dimension)
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {TABLE} (
+                    id BIGSERIAL PRIMARY KEY,
+                    clerk_id VARCHAR(255) NOT NULL,
+                    build VARCHAR(64) NOT NULL DEFAULT '{LIVE_BUILD}',
+                    report_id INTEGER,
+                    chunk_id INTEGER,
+                    content TEXT NOT NULL,
+                    metadata JSONB NOT NULL DEFAULT '{{}}',
+                    index_version VARCHAR(255),
+                    embedding vector({int(dimension)}) NOT NULL
+                )
+            """))
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_owner ON {TABLE} (clerk_id, build, report_id)"
+            ))
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_embedding ON {TABLE} "
+                f"USING hnsw (embedding vector_cosine_ops) "
+                f"WITH (m = {int(settings.PGVECTOR_HNSW_M)}, "
+                f"ef_construction = {int(settings.PGVECTOR_HNSW_EF_CONSTRUCTION)})"
+            ))
+            found = conn.execute(text(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = to_regclass(:table) AND attname = 'embedding'"
+            ), {"table": TABLE}).scalar()
+        if found != f"vector({int(dimension)})":
+            raise RuntimeError(
+                f"{TABLE}.embedding is {found} but the embedding model produces vector({dimension}); "
+                f"drop the table and reindex to change models"
+            )
+        _schema_ready.add(key)
+
+
+def swap_build(engine, clerk_id: str, build: str):
+    """Make a build the live index of a user, atomically for readers."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {TABLE} WHERE clerk_id = :clerk_id AND build = :live"),
+                     {"clerk_id": clerk_id, "live": LIVE_BUILD})
+        conn.execute(text(f"UPDATE {TABLE} SET build = :live WHERE clerk_id = :clerk_id AND build = :build"),
+                     {"clerk_id": clerk_id, "live": LIVE_BUILD, "build": build})
+
+
+def _where_sql(where: Optional[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """SQL for a Chroma-style equality filter; ``report_id`` may also be ``{"$in": [...]}``."""
+    clauses = []
+    rest = {}
+    for key, value in (where or {}).items():
+        if key == "report_id" and isinstance(value, dict):
+            clauses.append("report_id = ANY(:report_ids)")
+            params["report_ids"] = [int(report_id) for report_id in value["$in"]]
+        elif key == "report_id":
+            clauses.append("report_id = :report_id")
+            params["report_id"] = int(value)
+        else:
+            rest[key] = value
+    if rest:
+        clauses.append("metadata @> CAST(:metadata_filter AS jsonb)")
+        params["metadata_filter"] = json.dumps(rest)
+    return "".join(f" AND {clause}" for clause in clauses)
+
+
+class PgVectorCollection:
+    """
+    One user's chunks in one build: the pgvector counterpart of a Chroma
+    collection, with the subset of its interface the app uses.
+    """
+
+    def __init__(self, engine, clerk_id: str, build: str = LIVE_BUILD,
+                 embedding_model: Optional[SentenceTransformerEmbeddings] = None):
+        self.engine = engine
+        self.clerk_id = str(clerk_id)
+        self.build = build
+        self.embedding_model = embedding_model
+
+    def _params(self, **extra) -> Dict[str, Any]:
+        return {"clerk_id": self.clerk_id, "build": self.build, **extra}
+
+    def add_embedded(self, documents: Sequence[Document], embeddings: Sequence[Sequence[float]]) -> int:
+        """COPY pre-embedded chunks in batches, all in one transaction."""
+        batch_size = max(1, settings.PGVECTOR_COPY_BATCH)
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for start in range(0, len(documents), batch_size):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for doc, embedding in zip(documents[start:start + batch_size], embeddings[start:start + batch_size]):
+                    metadata = doc.metadata or {}
+                    writer.writerow([
+                        self.clerk_id, self.build, metadata.get("report_id"), metadata.get("chunk_id"),
+                        doc.page_content, json.dumps(metadata), metadata.get("index_version"),
+                        vector_literal(embedding),
+                    ])
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {TABLE} ({_COPY_COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        return len(documents)
+
+    def add_documents(self, documents: Sequence[Document]) -> int:
+        embeddings = self.embedding_model.embed_documents([doc.page_content for doc in documents])
+        return self.add_embedded(documents, embeddings)
+
+    def search(self, embedding: Sequence[float], k: int,
+               report_ids: Optional[Iterable[int]] = None) -> List[Tuple[Document, float]]:
+        """Top ``k`` chunks by cosine distance (lower is closer)."""
+        params = self._params(query=vector_literal(embedding), k=k)
+        where = _where_sql({"report_id": {"$in": list(report_ids)}} if report_ids else None, params)
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"),
+                         {"ef_search": str(max(settings.PGVECTOR_EF_SEARCH, k))})
+            if settings.PGVECTOR_ITERATIVE_SCAN != "off":
+                conn.execute(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"),
+                             {"mode": settings.PGVECTOR_ITERATIVE_SCAN})
+            rows = conn.execute(text(
+                f"SELECT content, metadata, embedding <=> CAST(:query AS vector) AS distance "
+                f"FROM {TABLE} WHERE clerk_id = :clerk_id AND build = :build{where} "
+                f"ORDER BY embedding <=> CAST(:query AS vector) LIMIT :k"
+            ), params).all()
+        # relaxed_order may return rows slightly out of order
+        results = [(Document(page_content=content, metadata=metadata or {}), float(distance))
+                   for content, metadata, distance in rows]
+        results.sort(key=lambda item: item[1])
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return self.search(self.embedding_model.embed_query(query), k)
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return [(doc, 1.0 - distance) for doc, distance in self.similarity_search_with_score(query, k)]
+
+    def get(self, where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None) -> Dict[str, list]:
+        """Chroma-style ``get``: ids, plus "documents" and/or "metadatas" if included."""
+        include = ["documents", "metadatas"] if include is None else include
+        params = self._params()
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT id, content, metadata FROM {TABLE} "
+                f"WHERE clerk_id = :clerk_id AND build = :build{_where_sql(where, params)} ORDER BY id"
+            ), params).all()
+        result = {"ids": [str(row_id) for row_id, _, _ in rows]}
+        if "documents" in include:
+            result["documents"] = [content for _, content, _ in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [metadata for _, _, metadata in rows]
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> int:
+        """Delete chunks by id or by filter in one statement. Returns the number deleted."""
+        params = self._params()
+        condition = _where_sql(where, params)
+        if ids is not None:
+            condition += " AND id = ANY(:ids)"
+            params["ids"] = [int(row_id) for row_id in ids]
+        with self.engine.begin() as conn:
+            return conn.execute(text(
+                f"DELETE FROM {TABLE} WHERE clerk_id = :clerk_id AND build = :build{condition}"
+            ), params).rowcount
+
+
+class PgVectorDocumentStore(DocumentStore):
+    """DocumentStore on the shared ``document_chunks`` table; no local state besides the model."""
+
+    def __init__(self):
+        self.embedding_model = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME)
+        self.text_splitter = build_text_splitter(self.embedding_model)
+        self.index_version = current_index_version(self.text_splitter)
+        self.vector_stores = {}
+        self._opened_dirs = {}
+
+        self.engine = get_engine()
+        self.dimension = len(self.embedding_model.embed_query("dimension probe"))
+        ensure_schema(self.engine, self.dimension)
+
+    def _collection(self, user_id, build: str = LIVE_BUILD) -> PgVectorCollection:
+        return PgVectorCollection(self.engine, user_id, build, self.embedding_model)
+
+    def _has_chunks(self, user_id) -> bool:
+        with self.engine.connect() as conn:
+            return bool(conn.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM {TABLE} WHERE clerk_id = :clerk_id AND build = :build)"
+            ), {"clerk_id": str(user_id), "build": LIVE_BUILD}).scalar())
+
+    def open_vectorstore(self, user_id, persist_directory: str) -> PgVectorCollection:
+        """A reindex build, named after the last component of ``persist_directory``."""
+        return self._collection(user_id, os.path.basename(os.path.normpath(persist_directory)))
+
+    def discard_build(self, user_id, persist_directory: str):
+        self.open_vectorstore(user_id, persist_directory).delete()
+
+    @traced("document_store.delete_user_collection")
+    def delete_user_collection(self, user_id: str):
+        """Delete every chunk of a user, live and in unfinished builds."""
+        with self.engine.begin() as conn:
+            deleted = conn.execute(text(f"DELETE FROM {TABLE} WHERE clerk_id = :clerk_id"),
+                                   {"clerk_id": str(user_id)}).rowcount
+        logger.info("Deleted %s chunks of user %s", deleted, user_id)
+
+    @traced("document_store.delete_document")
+    def delete_document(self, report_id: int, user_id: int):
+        """Delete a report's chunks. A report without chunks (e.g. no OCR text) is not an error."""
+        self._collection(user_id).delete(where={"report_id": report_id})
+
+    @traced("document_store.get_vectorstore")
+    def get_vectorstore(self, user_id: int) -> Optional[PgVectorCollection]:
+        """
+        The user's live chunks, or None if there are none. Checked on every call
+        (an indexed EXISTS) since another replica may have added or deleted them.
+        """
+        if not self._has_chunks(user_id):
+            return None
+        return self._collection(user_id)
+
+    @traced("document_store.store_documents")
+    def store_documents(self, user_id: int, items: List[Tuple[str, Dict[str, Any]]]):
+        documents = [doc for text, metadata in items for doc in self.build_documents(text, metadata)]
+        collection = self._collection(user_id)
+        if documents:
+            with stage("vector_add"):
+                collection.add_documents(documents)
+        return collection
+
+    @traced("document_store.get_relevant_documents")
+    def get_relevant_documents(self, user_id: int, query: str, top_k: int = 5):
+        with stage("vector_search"):
+            return self._collection(user_id).similarity_search_with_score(query, k=top_k)
+
+    @traced("document_store.search_by_vector")
+    def search_by_vector(self, vector_store: PgVectorCollection, embedding: List[float], k: int,
+                         report_ids: Optional[List[int]] = None):
+        with stage("vector_search"):
+            docs_with_distances = vector_store.search(embedding, k, report_ids)
+        return [(doc, 1.0 - distance) for doc, distance in docs_with_distances]
+
+    def get_index_versions(self, user_id) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT COALESCE(index_version, 'untagged'), count(*) FROM {TABLE} "
+                f"WHERE clerk_id = :clerk_id AND build = :build GROUP BY 1"
+            ), {"clerk_id": str(user_id), "build": LIVE_BUILD}).all()
+        return {version: count for version, count in rows}
+
+    @traced("document_store.swap_user_index")
+    def swap_user_index(self, user_id, new_dir: str):
+        """Replace the user's live chunks with a build in one transaction."""
+        swap_build(self.engine, str(user_id), os.path.basename(os.path.normpath(new_dir)))
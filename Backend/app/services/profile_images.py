@@ -0,0 +1,197 @@
+# app/services/profile_images.py
+"""
+Profile image pipeline.
+
+``POST /api/users/edit-image`` passes the upload here.
+
+1. The upload is read up to PROFILE_IMAGE_MAX_BYTES. Larger files are
+   rejected before they are decoded.
+2. In a worker thread, the image is decoded once: EXIF orientation is
+   applied and it is cropped to a centred square. It is then resized to each
+   width in PROFILE_IMAGE_SIZES that isn't larger than the source.
+3. Each variant is encoded as WebP, or as JPEG when Pillow lacks WebP
+   support, and named by the sha256 of its bytes.
+4. Variants are stored under ``static/uploads/avatars/`` or, with
+   PROFILE_IMAGE_STORAGE=s3, under ``users/{clerk_id}/avatars/`` in
+   AWS_S3_BUCKET.
+
+``GET /api/users/images/{sha256}.{ext}`` serves them with a one-year
+``immutable`` Cache-Control, since a name always means the same bytes.
+Avatars are shown without auth headers, as the old static files were, so the
+endpoint is public. A 256-bit digest can't be guessed. Clients pick the
+smallest variant at least as wide as they draw it.
+
+Pillow is imported only when an image is processed.
+"""
+import hashlib
+import io
+import logging
+import os
+import uuid
+from typing import List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..core.metrics import record_cache, stage
+from ..core.tracing import start_span
+from ..models.users import ProfileImageVariant, User
+from .thumbnails import ThumbnailCache
+
+logger = logging.getLogger(__name__)
+
+LOCAL_DIRECTORY = os.path.join("static", "uploads", "avatars")
+_ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF", "MPO"}
+
+image_cache = ThumbnailCache(settings.PROFILE_IMAGE_CACHE_BYTES)
+
+
+class Variant:
+    __slots__ = ("width", "height", "data", "content_type", "digest")
+
+    def __init__(self, width: int, height: int, data: bytes, content_type: str):
+        self.width = width
+        self.height = height
+        self.data = data
+        self.content_type = content_type
+        self.digest = hashlib.sha256(data).hexdigest()
+
+
+def _sizes() -> List[int]:
+    return sorted({int(size) for size in settings.PROFILE_IMAGE_SIZES.split(",") if size.strip()}, reverse=True)
+
+
+async def read_capped(upload: UploadFile) -> bytes:
+    """The upload's bytes; 413 once it passes PROFILE_IMAGE_MAX_BYTES."""
+    data = await upload.read(settings.PROFILE_IMAGE_MAX_BYTES + 1)
+    if len(data) > settings.PROFILE_IMAGE_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {settings.PROFILE_IMAGE_MAX_BYTES // (1024 * 1024)} MB"
+        )
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image")
+    return data
+
+
+def render_variants(data: bytes) -> List[Variant]:
+    """Decode once and encode every size. Raises HTTPException for unusable input."""
+    from PIL import Image, ImageOps, features
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in _ACCEPTED_FORMATS:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail=f"Unsupported image format: {image.format}")
+        # Checked here from the header, before decoding; Pillow's global
+        # MAX_IMAGE_PIXELS is shared with thumbnail rendering and left alone
+        if image.width * image.height > settings.PROFILE_IMAGE_MAX_PIXELS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image dimensions are too large")
+        largest = _sizes()[0]
+        image.draft("RGB", (largest, largest))  # JPEGs decode straight at a reduced scale
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except HTTPException:
+        raise
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image dimensions are too large")
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File is not a readable image")
+
+    side = min(image.size)
+    left, top = (image.width - side) // 2, (image.height - side) // 2
+    image = image.crop((left, top, left + side, top + side))
+
+    webp = features.check("webp")
+    content_type = "image/webp" if webp else "image/jpeg"
+    variants = []
+    for size in _sizes():
+        if size > side and variants:
+            continue  # never upscale; the largest size is always produced, capped at the source width
+        width = min(size, side)
+        if width != image.width:
+            image = image.resize((width, width), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP" if webp else "JPEG", quality=settings.PROFILE_IMAGE_QUALITY)
+        variants.append(Variant(image.width, image.height, buffer.getvalue(), content_type))
+    return variants[::-1]
+
+
+def _ext(content_type: str) -> str:
+    return content_type.split("/")[-1]
+
+
+async def _store(s3_client, clerk_id: str, variant: Variant) -> str:
+    name = f"{variant.digest}.{_ext(variant.content_type)}"
+    if settings.PROFILE_IMAGE_STORAGE == "s3":
+        bucket, key = settings.AWS_S3_BUCKET, f"users/{clerk_id}/avatars/{name}"
+        with start_span("s3.put_object", bucket=bucket):
+            await run_in_threadpool(
+                s3_client.put_object, Bucket=bucket, Key=key, Body=variant.data, ContentType=variant.content_type,
+                CacheControl=f"public, max-age={settings.PROFILE_IMAGE_MAX_AGE_SECONDS}, immutable",
+            )
+        return f"s3://{bucket}/{key}"
+    path = anyio.Path(LOCAL_DIRECTORY, name)
+    await path.parent.mkdir(parents=True, exist_ok=True)
+    if not await path.exists():
+        # Write then rename, so a concurrent reader never sees half a file
+        partial = anyio.Path(f"{path}.{uuid.uuid4().hex}.partial")
+        await partial.write_bytes(variant.data)
+        await partial.rename(path)
+    return str(path)
+
+
+async def replace_profile_image(db: Session, user: User, data: bytes, s3_client=None) -> List[ProfileImageVariant]:
+    """Render, store and record the variants of a new profile image; drops the previous ones."""
+    with stage("profile_image"):
+        variants = await run_in_threadpool(render_variants, data)
+    rows = []
+    for variant in variants:
+        location = await _store(s3_client, user.clerk_id, variant)
+        image_cache.put(variant.digest, variant.data)
+        rows.append(ProfileImageVariant(width=variant.width, height=variant.height, digest=variant.digest,
+                                        content_type=variant.content_type, location=location))
+    previous = [(row.digest, row.location) for row in user.image_variants]
+    user.image_variants = rows
+    user.image_url = rows[-1].url
+    db.commit()
+    await delete_unused(db, previous, s3_client)
+    return rows
+
+
+async def delete_unused(db: Session, images: List[Tuple[str, str]], s3_client=None):
+    """Best-effort removal of (digest, location) images no variant row refers to any more."""
+    for digest, location in images:
+        if db.query(ProfileImageVariant.id).filter(ProfileImageVariant.location == location).first():
+            continue
+        image_cache.discard(digest)
+        try:
+            if location.startswith("s3://"):
+                bucket, key = location[len("s3://"):].split("/", 1)
+                await run_in_threadpool(s3_client.delete_object, Bucket=bucket, Key=key)
+            else:
+                await anyio.Path(location).unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning("Could not delete profile image %s: %s", location, e)
+
+
+async def load_image(db: Session, digest: str, s3_client_factory) -> Optional[Tuple[bytes, str]]:
+    """(bytes, content type) of a stored variant, or None if no user has it."""
+    row = db.query(ProfileImageVariant).filter(ProfileImageVariant.digest == digest).first()
+    if row is None:
+        return None
+    data = image_cache.get(digest)
+    record_cache("profile_image", data is not None)
+    if data is None:
+        if row.location.startswith("s3://"):
+            bucket, key = row.location[len("s3://"):].split("/", 1)
+            s3_client = s3_client_factory()
+            with start_span("s3.get_object", bucket=bucket):
+                obj = await run_in_threadpool(s3_client.get_object, Bucket=bucket, Key=key)
+                data = await run_in_threadpool(obj["Body"].read)
+        else:
+            data = await anyio.Path(row.location).read_bytes()
+        image_cache.put(digest, data)
+    return data, row.content_type
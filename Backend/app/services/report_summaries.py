@@ -0,0 +1,218 @@
+# app/services/report_summaries.py
+"""
+Report summaries, document-level vectors and two-stage retrieval.
+
+After an upload is saved, ``summarize_report`` runs as a background task. It
+asks the LLM for a short summary of the report's OCR text, embeds the summary
+with the document store's model, and stores both on the row
+(``Reports.summary`` and ``Reports.text_vector``). Reports uploaded before
+this, or whose summary failed, are filled in by
+``python -m app.cli.summarize_reports``.
+
+The vectors drive the first stage of chat retrieval (``ReportIndex``). For a
+user with at least RETRIEVAL_TWO_STAGE_MIN_REPORTS reports:
+
+1. The query vector is compared with every report vector.
+2. Chunks are then searched only within the RETRIEVAL_TOP_REPORTS closest
+   reports, plus any report that has no vector yet.
+
+So chunk search doesn't slow down as a user's report count grows.
+
+REPORT_SUMMARY_LLM=fake swaps the LLM for ``FakeSummaryLLM``, a local,
+deterministic extractive summarizer for tests and offline runs.
+"""
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+
+from ..config import settings
+from ..databse import SessionLocal
+from ..models.reports import Reports
+from .context_builder import count_tokens
+from .document_store import get_document_store
+from .llm_router import LLMUnavailable, get_llm_router
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+Summarize this medical report for search. Name the kind of report, the date,
+the tests or findings with abnormal values, any diagnoses, and any medications
+with their doses. Use at most {max_words} words and plain sentences; do not
+add advice or anything not in the report.
+
+<report>
+{text}
+</report>
+
+Summary:
+"""
+
+_REPORT_BLOCK = re.compile(r"<report>\n?(.*?)\n?</report>", re.DOTALL)
+# Lines worth keeping in an extractive summary: key/value lines, results with
+# numbers, diagnoses and prescriptions
+_INFORMATIVE = re.compile(r":|\d|\b(diagnos|impression|rx|prescri|mg|mcg|tablet)", re.IGNORECASE)
+
+
+class FakeSummaryLLM:
+    """Local stand-in for the LLM: the first informative lines of the report, verbatim."""
+
+    name = "fake"
+
+    def __init__(self, max_words: Optional[int] = None):
+        self.max_words = max_words or settings.REPORT_SUMMARY_MAX_WORDS
+
+    async def complete(self, prompt: str) -> str:
+        match = _REPORT_BLOCK.search(prompt)
+        lines = [line.strip() for line in (match.group(1) if match else prompt).splitlines()]
+        summary, words = [], 0
+        for line in lines:
+            if not line or not _INFORMATIVE.search(line):
+                continue
+            line_words = len(line.split())
+            if words + line_words > self.max_words:
+                break
+            summary.append(line)
+            words += line_words
+        return " ".join(summary)
+
+
+def _summary_llm():
+    if settings.REPORT_SUMMARY_LLM == "fake":
+        return FakeSummaryLLM()
+    return get_llm_router()
+
+
+def _clip_tokens(text: str, max_tokens: int) -> str:
+    """Leading whole lines of ``text`` that fit ``max_tokens``."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines, kept, used = text.splitlines(), [], 0
+    for line in lines:
+        tokens = count_tokens(line) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(kept)
+
+
+def embed_summaries(summaries: List[str]) -> List[List[float]]:
+    """Document-level vectors, from the same model as the chunks."""
+    return get_document_store().embedding_model.embed_documents(summaries)
+
+
+async def summarize_report(report_id: int):
+    """Summarize and embed one report. Background task; failures are logged, not raised."""
+    def load() -> Optional[str]:
+        db = SessionLocal()
+        try:
+            report = db.query(Reports).filter(Reports.id == report_id).first()
+            return report.extracted_text if report is not None else None
+        finally:
+            db.close()
+
+    def save(summary: str, vector: List[float]):
+        db = SessionLocal()
+        try:
+            db.query(Reports).filter(Reports.id == report_id).update(
+                {Reports.summary: summary, Reports.text_vector: vector, Reports.summarized_at: func.now()},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    try:
+        text = await run_in_threadpool(load)
+        if not text or not text.strip():
+            return
+        prompt = SUMMARY_PROMPT.format(
+            max_words=settings.REPORT_SUMMARY_MAX_WORDS,
+            text=_clip_tokens(text, settings.REPORT_SUMMARY_INPUT_TOKENS),
+        )
+        summary = (await _summary_llm().complete(prompt)).strip()
+        if not summary:
+            return
+        vector = (await run_in_threadpool(embed_summaries, [summary]))[0]
+        await run_in_threadpool(save, summary, vector)
+    except LLMUnavailable as e:
+        logger.warning("Summary for report %s deferred: %s", report_id, e)
+    except Exception:
+        logger.exception("Summarizing report %s failed", report_id)
+
+
+class ReportIndex:
+    """
+    Per-process cache of each user's report vectors, for the first retrieval
+    stage. A cheap aggregate query (reports, vectors, highest id, latest
+    upload and latest summary time) detects uploads, deletes, new summaries
+    and re-summarized or re-embedded reports. Only then are the vectors
+    reloaded. At most ``cache_size`` users are kept, least recently used
+    first out.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = settings.RETRIEVAL_INDEX_CACHE_SIZE if cache_size is None else cache_size
+        self._entries: "OrderedDict[int, Tuple[tuple, np.ndarray, np.ndarray, List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, db, user_id: int, version: tuple):
+        rows = db.query(Reports.id, Reports.text_vector).filter(Reports.user_id == user_id).all()
+        ids = [report_id for report_id, vector in rows if vector]
+        unsummarized = [report_id for report_id, vector in rows if not vector]
+        matrix = np.asarray([vector for _, vector in rows if vector], dtype=np.float32)
+        if len(ids):
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        entry = (version, np.asarray(ids), matrix, unsummarized)
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def top_reports(self, db, user_id: int, query_vector: List[float],
+                    top_n: Optional[int] = None, min_reports: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Ids of the reports whose chunks should be searched, or None to search
+        all of them (too few reports to bother, or no vectors yet).
+        """
+        top_n = top_n or settings.RETRIEVAL_TOP_REPORTS
+        min_reports = settings.RETRIEVAL_TWO_STAGE_MIN_REPORTS if min_reports is None else min_reports
+
+        version = tuple(db.query(
+            func.count(Reports.id), func.count(Reports.text_vector), func.max(Reports.id),
+            func.max(Reports.uploaded_at), func.max(Reports.summarized_at),
+        ).filter(Reports.user_id == user_id).one())
+        if version[0] < max(min_reports, 1) or version[0] <= top_n:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is None or entry[0] != version:
+            entry = self._load(db, user_id, version)
+        _, ids, matrix, unsummarized = entry
+        if not len(ids):
+            return None
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        if len(ids) > top_n:
+            best = np.argpartition(-scores, top_n)[:top_n]
+        else:
+            best = np.arange(len(ids))
+        return [int(report_id) for report_id in ids[best]] + unsummarized
+
+
+_report_index = ReportIndex()
+
+def get_report_index() -> ReportIndex:
+    return _report_index
@@ -1,5 +1,7 @@
 import boto3
 from ..config import settings
+from ..core.metrics import stage
+from ..core.tracing import traced
 import logging
 from typing import Optional
 
@@ -13,15 +15,17 @@ class TextractHelper:
         )
         self.logger = logging.getLogger(__name__)
 
+    @traced("textract.extract_text_from_pdf")
     def extract_text_from_pdf(self, file_path: str) -> str:
         try:
             with open(file_path, 'rb') as document_file:
                 document_bytes = document_file.read()
 
-            response = self.client.analyze_document(
-                Document={'Bytes': document_bytes},
-                FeatureTypes=['TABLES', 'FORMS']
-            )
+            with stage("ocr"):
+                response = self.client.analyze_document(
+                    Document={'Bytes': document_bytes},
+                    FeatureTypes=['TABLES', 'FORMS']
+                )
 
             return self._parse_textract_response(response)
         except Exception as e:
@@ -0,0 +1,200 @@
+# app/services/thumbnails.py
+"""
+Report thumbnails and page previews.
+
+At upload time, the first page of each report is rendered to a small JPEG
+(THUMBNAIL_WIDTH wide). The next THUMBNAIL_PREVIEW_PAGES pages can also be
+rendered, wider (THUMBNAIL_PREVIEW_WIDTH). Rendering runs alongside OCR.
+
+Each image is stored content-addressed, next to the original:
+``users/{clerk_id}/thumbnails/{sha256}.jpg``. A digest always names the same
+bytes, so ``GET /api/reports/thumbnails/{sha256}.jpg`` can be cached by
+clients for a year (``immutable``). A small per-process LRU keeps hot images
+out of S3.
+
+PDFs are rendered with PyMuPDF and images are scaled with Pillow. Both are
+imported only when needed. Without them, or for a file that can't be
+rendered, the upload still succeeds with no thumbnail.
+``python -m app.cli.render_thumbnails`` fills in reports that have none.
+"""
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..core.metrics import stage
+from ..core.tracing import start_span
+from ..models.reports import ReportPreview, Reports
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "image/jpeg"
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class Preview:
+    """One rendered page. ``kind`` is "thumbnail" (page 1) or "page"."""
+
+    __slots__ = ("kind", "page", "data", "width", "height", "digest")
+
+    def __init__(self, kind: str, page: int, data: bytes, width: int, height: int):
+        self.kind = kind
+        self.page = page
+        self.data = data
+        self.width = width
+        self.height = height
+        self.digest = hashlib.sha256(data).hexdigest()
+
+
+def preview_key(clerk_id: str, digest: str) -> str:
+    return f"users/{clerk_id}/thumbnails/{digest}.jpg"
+
+
+def _encode(image, width: int) -> tuple:
+    """Scale a PIL image to ``width`` (never up) and encode it as JPEG."""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=settings.THUMBNAIL_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), image.width, image.height
+
+
+def _render_pdf(path: str) -> List[Preview]:
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    previews = []
+    with fitz.open(path) as pdf:
+        pages = min(pdf.page_count, 1 + max(0, settings.THUMBNAIL_PREVIEW_PAGES))
+        for number in range(pages):
+            kind, width = ("thumbnail", settings.THUMBNAIL_WIDTH) if number == 0 \
+                else ("page", settings.THUMBNAIL_PREVIEW_WIDTH)
+            page = pdf.load_page(number)
+            # Rasterize at the target width directly rather than at full DPI
+            zoom = width / max(page.rect.width, 1)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+            previews.append(Preview(kind, number + 1, *_encode(image, width)))
+    return previews
+
+
+def _render_image(path: str) -> List[Preview]:
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.draft("RGB", (settings.THUMBNAIL_WIDTH, settings.THUMBNAIL_WIDTH))  # cheap JPEG downscale
+        return [Preview("thumbnail", 1, *_encode(image, settings.THUMBNAIL_WIDTH))]
+
+
+def render_previews(path: str, filename: Optional[str] = None) -> List[Preview]:
+    """
+    Thumbnail (and page previews) of the file at ``path``. Returns [] when
+    thumbnails are disabled, the renderer isn't installed, or rendering fails.
+    """
+    if not settings.THUMBNAILS_ENABLED:
+        return []
+    name = (filename or path).lower()
+    try:
+        with stage("thumbnail"):
+            if name.endswith(".pdf"):
+                return _render_pdf(path)
+            if name.endswith(_IMAGE_EXTENSIONS):
+                return _render_image(path)
+    except ImportError as e:
+        logger.warning("Thumbnails skipped, renderer not installed: %s", e)
+    except Exception as e:
+        logger.warning("Could not render thumbnail for %s: %s", filename or path, e)
+    return []
+
+
+def store_previews(s3_client, bucket: str, clerk_id: str, previews: List[Preview]) -> List[ReportPreview]:
+    """
+    Put the images in S3 (a digest always maps to the same key, so storing one
+    twice is harmless) and return the rows to attach to the report. A failed
+    put is logged and leaves the report without previews.
+    """
+    extra_args = {
+        "ContentType": CONTENT_TYPE,
+        "CacheControl": f"private, max-age={settings.THUMBNAIL_MAX_AGE_SECONDS}, immutable",
+    }
+    if getattr(settings, "AWS_S3_KMS_KEY_ID", None):
+        extra_args["ServerSideEncryption"] = "aws:kms"
+        extra_args["SSEKMSKeyId"] = settings.AWS_S3_KMS_KEY_ID
+    rows = []
+    try:
+        for preview in previews:
+            key = preview_key(clerk_id, preview.digest)
+            with start_span("s3.put_object", bucket=bucket):
+                s3_client.put_object(Bucket=bucket, Key=key, Body=preview.data, **extra_args)
+            thumbnail_cache.put(preview.digest, preview.data)
+            rows.append(ReportPreview(page=preview.page, kind=preview.kind, digest=preview.digest,
+                                      s3_key=key, width=preview.width, height=preview.height))
+    except Exception as e:
+        logger.warning("Could not store thumbnails for user %s: %s", clerk_id, e)
+        return []
+    return rows
+
+
+def delete_previews(db: Session, s3_client, bucket: str, user_id: int, clerk_id: str, digests: Iterable[str]):
+    """Best-effort removal of images that none of the user's reports use any more."""
+    digests = set(digests)
+    if not digests:
+        return
+    in_use = {
+        digest for (digest,) in db.query(ReportPreview.digest)
+        .join(Reports, Reports.id == ReportPreview.report_id)
+        .filter(Reports.user_id == user_id, ReportPreview.digest.in_(digests))
+    }
+    for digest in digests - in_use:
+        thumbnail_cache.discard(digest)
+        try:
+            s3_client.delete_object(Bucket=bucket, Key=preview_key(clerk_id, digest))
+        except Exception as e:
+            logger.warning("Could not delete thumbnail %s: %s", digest, e)
+
+
+class ThumbnailCache:
+    """Per-process LRU of image bytes by digest, bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(digest)
+            if data is not None:
+                self._items.move_to_end(digest)
+            return data
+
+    def put(self, digest: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                return
+            self._items[digest] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def discard(self, digest: str):
+        with self._lock:
+            data = self._items.pop(digest, None)
+            if data is not None:
+                self._size -= len(data)
+
+
+thumbnail_cache = ThumbnailCache(settings.THUMBNAIL_CACHE_BYTES)
@@ -0,0 +1,180 @@
+# app/services/user_directory.py
+"""
+Admin user listing: keyset pages with server-side filters and search.
+
+``GET /api/users/admin/list`` returns up to ``limit`` users and an opaque
+``next_cursor``. Pages are keyset-based (``WHERE (key, id) > cursor``), so a
+deep page costs the same as the first. Users added while someone scrolls
+don't shift later pages.
+
+- ``sort=newest`` orders by id, descending. ``sort=email`` orders by email,
+  then id.
+- ``q`` is split on whitespace, and each term must match the email, first
+  name or last name, case-insensitively.
+- With USER_SEARCH_MODE=contains a term may match anywhere in the value. On
+  Postgres this is served by pg_trgm GIN indexes.
+- With USER_SEARCH_MODE=prefix a term must match the start of the value,
+  served by ``text_pattern_ops`` b-tree indexes.
+- ``role`` and ``is_active`` filter exactly.
+
+A page costs a fixed number of queries, whatever its size:
+
+1. the users with their role, through a joined eager load;
+2. their image variants, with a selectin load;
+3. the total.
+
+On Postgres the total is an estimate: ``pg_class.reltuples`` without filters,
+and the planner's row estimate with them. Other databases use COUNT(*).
+
+``ensure_indexes`` creates the indexes concurrently, once per process. It runs
+during warm-up and again before the first page is served.
+"""
+import base64
+import json
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from ..config import settings
+from ..models.users import User, UserRole
+
+logger = logging.getLogger(__name__)
+
+SORTS = ("newest", "email")
+_SEARCH_COLUMNS = ("email", "first_name", "last_name")
+_MAX_SEARCH_TERMS = 5
+
+_indexes_ready = set()
+_indexes_lock = threading.Lock()
+
+
+def ensure_indexes(engine):
+    """Create the search and filter indexes on ``users`` if missing (Postgres only)."""
+    key = id(engine)
+    if engine.dialect.name != "postgresql" or key in _indexes_ready:
+        return
+    with _indexes_lock:
+        if key in _indexes_ready:
+            return
+        try:
+            # CONCURRENTLY: building on a large users table doesn't block sign-ups
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                if settings.USER_SEARCH_MODE == "contains":
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_role_id ON users (role_id)"))
+                for column in _SEARCH_COLUMNS:
+                    if settings.USER_SEARCH_MODE == "contains":
+                        conn.execute(text(
+                            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_{column}_trgm "
+                            f"ON users USING gin (lower({column}) gin_trgm_ops)"
+                        ))
+                    else:
+                        conn.execute(text(
+                            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_{column}_prefix "
+                            f"ON users (lower({column}) text_pattern_ops)"
+                        ))
+        except Exception as e:
+            # Listing still works, by sequential scan; not retried on every request
+            logger.warning("Could not create user search indexes: %s", e)
+        _indexes_ready.add(key)
+
+
+def encode_cursor(sort: str, user: User) -> str:
+    values = [sort, user.email, user.id] if sort == "email" else [sort, user.id]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(sort: str, cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        valid = (
+            isinstance(values, list) and values[0] == sort and isinstance(values[-1], int)
+            and (len(values) == 2 or (len(values) == 3 and sort == "email"
+                                      and (values[1] is None or isinstance(values[1], str))))
+        )
+    except (ValueError, IndexError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values[1:]
+
+
+def _after(sort: str, values: list):
+    """Rows that come after the cursor in ``sort`` order."""
+    if sort == "email":
+        email, last_id = values
+        if email is None:  # NULL emails sort last
+            return and_(User.email.is_(None), User.id > last_id)
+        return or_(User.email > email, and_(User.email == email, User.id > last_id), User.email.is_(None))
+    (last_id,) = values
+    return User.id < last_id
+
+
+def search_filter(q: str):
+    """Each whitespace-separated term must match email, first or last name."""
+    clauses = []
+    for term in q.lower().split()[:_MAX_SEARCH_TERMS]:
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"{escaped}%" if settings.USER_SEARCH_MODE == "prefix" else f"%{escaped}%"
+        # lower(column) LIKE ... matches the expression indexes from ensure_indexes
+        clauses.append(or_(*(func.lower(getattr(User, column)).like(pattern, escape="\\")
+                             for column in _SEARCH_COLUMNS)))
+    return and_(*clauses)
+
+
+def estimate_total(db: Session, filters: List) -> Tuple[int, bool]:
+    """(total, is_estimate) for the filtered users, from planner statistics on Postgres."""
+    if db.get_bind().dialect.name == "postgresql":
+        if not filters:
+            rows = db.execute(text("SELECT reltuples FROM pg_class WHERE oid = 'users'::regclass")).scalar()
+            if rows is not None and rows >= 0:  # -1 until the table is first analyzed
+                return int(rows), True
+        else:
+            compiled = select(User.id).where(*filters).compile(dialect=db.get_bind().dialect)
+            plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"]), True
+    return db.query(func.count(User.id)).filter(*filters).scalar(), False
+
+
+def list_users_page(
+    db: Session,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "newest",
+    q: Optional[str] = None,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+) -> dict:
+    """One page of users: ``items``, ``next_cursor``, ``total`` and ``total_is_estimate``."""
+    ensure_indexes(db.get_bind())
+
+    filters = []
+    if q and q.strip():
+        filters.append(search_filter(q))
+    if role:
+        filters.append(User.role_id.in_(select(UserRole.id).where(UserRole.name == role)))
+    if is_active is not None:
+        filters.append(User.is_active == is_active)
+
+    query = (
+        db.query(User)
+        .options(joinedload(User.role), selectinload(User.image_variants))
+        .filter(*filters)
+    )
+    if cursor:
+        query = query.filter(_after(sort, _decode_cursor(sort, cursor)))
+    if sort == "email":
+        query = query.order_by(User.email.asc().nulls_last(), User.id.asc())
+    else:
+        query = query.order_by(User.id.desc())
+
+    users = query.limit(limit + 1).all()  # one extra row tells whether there is a next page
+    next_cursor = encode_cursor(sort, users[limit - 1]) if len(users) > limit else None
+    total, is_estimate = estimate_total(db, filters)
+    return {"items": users[:limit], "next_cursor": next_cursor, "total": total, "total_is_estimate": is_estimate}
@@ -0,0 +1,183 @@
+# app/services/vector_routing.py
+"""
+Forward vector operations to the node that owns the user's index.
+
+With CLUSTER_NODES set, each user's Chroma index lives on one node, picked
+by the consistent-hash ring in app/core/cluster.py. ``RoutedDocumentStore``
+wraps this node's DocumentStore:
+
+- Users owned by this node go straight to the local store.
+- For other users, search, add and delete are sent to the owner's
+  ``/internal/vectors`` endpoints (app/routers/internal.py), authenticated
+  with CLUSTER_SECRET.
+
+Chunking and embedding of uploads happen on the owner. For searches the
+query is embedded here and only the vector is sent.
+
+A node that can't be reached gives a 503. Requests are never served from a
+cold or stale local copy instead.
+"""
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+from langchain_core.documents import Document
+
+from ..config import settings
+from ..core.cluster import get_ring, owner_of
+from ..core.metrics import VECTOR_FORWARDS, stage
+from ..core.tracing import current_traceparent, start_span
+from .document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def _http() -> httpx.Client:
+    """Shared client, so connections to the other nodes are reused."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(timeout=settings.CLUSTER_FORWARD_TIMEOUT_SECONDS)
+    return _client
+
+
+def node_request(node: str, method: str, path: str, op: str, **kwargs) -> httpx.Response:
+    """Call another node's internal API. Unreachable nodes and 5xx answers become a 503."""
+    url = get_ring().url(node) + path
+    headers = {"X-Cluster-Secret": settings.CLUSTER_SECRET, **kwargs.pop("headers", {})}
+    traceparent = current_traceparent()
+    if traceparent:
+        headers["traceparent"] = traceparent
+    try:
+        with start_span("cluster.forward", node=node, op=op):
+            response = _http().request(method, url, headers=headers, **kwargs)
+    except httpx.HTTPError as e:
+        VECTOR_FORWARDS.labels(op, "error").inc()
+        logger.warning("Forwarding %s to node %s failed: %s", op, node, e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Document index temporarily unavailable")
+    if response.status_code >= 500:
+        VECTOR_FORWARDS.labels(op, "error").inc()
+        logger.warning("Node %s answered %s to %s: %s", node, response.status_code, op, response.text[:200])
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Document index temporarily unavailable")
+    VECTOR_FORWARDS.labels(op, "ok").inc()
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+    return response
+
+
+def _scored(rows: List[Dict[str, Any]]):
+    return [(Document(page_content=row["page_content"], metadata=row["metadata"] or {}), row["score"])
+            for row in rows]
+
+
+class RemoteVectorStore:
+    """Stand-in for a user's vector store that lives on another node."""
+
+    def __init__(self, node: str, user_id: str):
+        self.node = node
+        self.user_id = str(user_id)
+
+    def search(self, body: Dict[str, Any]):
+        response = node_request(self.node, "POST", f"/internal/vectors/{self.user_id}/search", "search", json=body)
+        return _scored(response.json()["results"])
+
+
+class RoutedDocumentStore:
+    """A DocumentStore that forwards operations on users owned by other nodes."""
+
+    def __init__(self, local: DocumentStore):
+        self.local = local
+
+    def __getattr__(self, name):
+        # Everything that doesn't touch an index (embedding_model,
+        # build_documents, index_version, ...) is the local store's
+        return getattr(self.local, name)
+
+    def get_vectorstore(self, user_id):
+        node = owner_of(user_id)
+        if node is None:
+            return self.local.get_vectorstore(user_id)
+        response = node_request(node, "GET", f"/internal/vectors/{user_id}", "exists")
+        return RemoteVectorStore(node, user_id) if response.json()["exists"] else None
+
+    def store_document(self, user_id, filename: str, text: str, metadata: Dict[str, Any], user_uuid: str = None):
+        return self.store_documents(user_id, [(text, metadata)])
+
+    def store_documents(self, user_id, items: List[Tuple[str, Dict[str, Any]]]):
+        node = owner_of(user_id)
+        if node is None:
+            return self.local.store_documents(user_id, items)
+        with stage("vector_add"):
+            node_request(node, "POST", f"/internal/vectors/{user_id}/documents", "add",
+                         json={"documents": [{"text": text, "metadata": metadata} for text, metadata in items]})
+        return RemoteVectorStore(node, user_id)
+
+    def delete_document(self, report_id: int, user_id):
+        node = owner_of(user_id)
+        if node is None:
+            return self.local.delete_document(report_id=report_id, user_id=user_id)
+        node_request(node, "DELETE", f"/internal/vectors/{user_id}/reports/{report_id}", "delete")
+
+    def delete_user_collection(self, user_id):
+        node = owner_of(user_id)
+        if node is None:
+            return self.local.delete_user_collection(user_id)
+        node_request(node, "DELETE", f"/internal/vectors/{user_id}", "delete")
+
+    def get_relevant_documents(self, user_id, query: str, top_k: int = 5):
+        node = owner_of(user_id)
+        if node is None:
+            return self.local.get_relevant_documents(user_id, query, top_k=top_k)
+        with stage("vector_search"):
+            return RemoteVectorStore(node, user_id).search({"query": query, "k": top_k})
+
+    def search_by_vector(self, vector_store, embedding: List[float], k: int,
+                         report_ids: Optional[Iterable[int]] = None):
+        if not isinstance(vector_store, RemoteVectorStore):
+            return self.local.search_by_vector(vector_store, embedding, k, report_ids)
+        with stage("vector_search"):
+            return vector_store.search({
+                "embedding": embedding, "k": k,
+                "report_ids": list(report_ids) if report_ids else None,
+            })
+
+    def get_index_versions(self, user_id) -> Dict[str, int]:
+        node = owner_of(user_id)
+        if node is None:
+            return self.local.get_index_versions(user_id)
+        return node_request(node, "GET", f"/internal/vectors/{user_id}/versions", "versions").json()
+
+
+def push_user_index(store: DocumentStore, node: str, user_id: str, page_size: int) -> int:
+    """
+    Stream a local user's index to ``node``, which builds it side by side and
+    swaps it in. Returns the number of chunks sent.
+    """
+    sent = 0
+
+    def body():
+        nonlocal sent
+        for row in store.export_vectors(user_id, page_size):
+            sent += 1
+            yield (json.dumps(row) + "\n").encode("utf-8")
+
+    response = node_request(node, "POST", f"/internal/vectors/{user_id}/import", "import", content=body(),
+                            headers={"Content-Type": "application/x-ndjson"},
+                            timeout=None)
+    received = response.json()["chunks"]
+    if received != sent:
+        raise RuntimeError(f"node {node} stored {received} of {sent} chunks")
+    return sent
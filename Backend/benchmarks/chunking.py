@@ -0,0 +1,83 @@
+# benchmarks/chunking.py
+"""
+Compare the character splitter with the token-aware chunker.
+
+    python -m benchmarks.chunking [--reports 200] [--top-k 5]
+
+Reports chunks/sec, chunk counts and recall@k on the synthetic corpus. A fact
+counts as recalled when one of the top-k chunks (by cosine similarity of the
+embedding model's vectors) contains its full answer line. Chunk text beyond
+the model's max sequence length is truncated by the encoder, which is what
+the character splitter loses.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.config import settings
+from app.services.chunking import TokenAwareChunker, chunk_profile
+from app.services.document_store import SentenceTransformerEmbeddings
+from benchmarks.corpus import build_corpus
+
+
+def _chunks_per_sec(splitter, reports, repeat: int = 3):
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = [chunk for report in reports for chunk in splitter.split_text(report)]
+        best = min(best, time.perf_counter() - started)
+    return chunks, len(chunks) / best
+
+
+def _recall(embeddings, chunks, facts, top_k: int) -> float:
+    chunk_vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    chunk_vectors /= np.linalg.norm(chunk_vectors, axis=1, keepdims=True)
+    query_vectors = np.asarray(embeddings.embed_documents([f["question"] for f in facts]), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    top = np.argsort(-(query_vectors @ chunk_vectors.T), axis=1)[:, :top_k]
+    hits = sum(
+        any(fact["answer"] in chunks[idx] for idx in row)
+        for fact, row in zip(facts, top)
+    )
+    return hits / len(facts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.reports)
+    embeddings = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME)
+    profile = chunk_profile(settings.EMBEDDING_MODEL_NAME)
+    max_tokens = profile["max_tokens"] or embeddings.max_seq_length
+
+    splitters = {
+        "character_1000_200": RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200),
+        f"token_{max_tokens}_{profile['overlap_tokens']}": TokenAwareChunker(
+            embeddings.tokenizer, max_tokens, profile["overlap_tokens"]
+        ),
+    }
+
+    results = {}
+    for name, splitter in splitters.items():
+        chunks, rate = _chunks_per_sec(splitter, corpus["reports"])
+        token_counts = [len(ids) for ids in embeddings.tokenizer(chunks, add_special_tokens=True)["input_ids"]]
+        results[name] = {
+            "chunks": len(chunks),
+            "chunks_per_sec": round(rate, 1),
+            "truncated_chunks": sum(n > embeddings.max_seq_length for n in token_counts),
+            f"recall_at_{args.top_k}": round(_recall(embeddings, chunks, corpus["facts"], args.top_k), 3),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# benchmarks/clerk_webhooks.py
+"""
+A burst of Clerk webhooks, handled the old way and through the inbox.
+
+    python -m benchmarks.clerk_webhooks [--events 10000] [--users 2000]
+        [--duplicates 0.1] [--batch 500] [--database-url postgresql+psycopg2://...]
+
+Builds --events user.created / user.updated / user.deleted events over --users
+users, from a fixed seed. A --duplicates fraction are redelivered with the
+same svix id, as svix does on retries. Each event is signed with a throwaway
+secret. Two runs:
+
+- ``synchronous``: the handler before the inbox. It parses each event,
+  queries the user, writes and commits. Redeliveries are applied again.
+- ``inbox``: ``verify_signature`` + ``parse_event`` + ``enqueue`` per event,
+  which is everything the request waits for. Then ``process_batch`` until
+  the inbox is empty.
+
+For each run the benchmark prints wall time, events per second, per-event
+acknowledgement latency (p50/p99) and the number of commits. It checks that
+both runs leave the same ``users`` rows. Without --database-url every run
+gets a fresh SQLite file. With a Postgres URL the users and inbox tables
+are emptied first, so use a scratch database.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+SECRET = "whsec_" + base64.b64encode(b"benchmark-signing-secret").decode()
+
+
+def _percentile_ms(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)] * 1000, 3)
+
+
+def build_events(count: int, users: int, duplicates: float, seed: int = 7) -> List[Tuple[str, bytes]]:
+    """(svix id, body) pairs: every user is created first, then updated or deleted at random."""
+    rng = random.Random(seed)
+    started = int(time.time() * 1000)
+    created, events = set(), []
+    for i in range(count):
+        user = rng.randrange(users)
+        if user not in created:
+            kind = "user.created"
+            created.add(user)
+        else:
+            kind = "user.deleted" if rng.random() < 0.05 else "user.updated"
+        data = {"id": f"user_{user:06d}", "deleted": True} if kind == "user.deleted" else {
+            "id": f"user_{user:06d}",
+            "email_addresses": [{"id": f"idn_{user}", "email_address": f"user{user}@example.com"}],
+            "primary_email_address_id": f"idn_{user}",
+            "first_name": f"First{i}",
+            "last_name": f"Last{user}",
+            "username": None,
+        }
+        body = json.dumps({"type": kind, "timestamp": started + i, "data": data}).encode()
+        events.append((f"msg_{i:08d}", body))
+        if rng.random() < duplicates:
+            events.append(events[-1])
+    return events
+
+
+def _headers(msg_id: str, body: bytes) -> dict:
+    timestamp = str(int(time.time()))
+    key = base64.b64decode(SECRET[len("whsec_"):])
+    signature = base64.b64encode(hmac.new(key, f"{msg_id}.{timestamp}.".encode() + body,
+                                          hashlib.sha256).digest()).decode()
+    return {"svix-id": msg_id, "svix-timestamp": timestamp, "svix-signature": f"v1,{signature}"}
+
+
+def _synchronous(db, body: bytes):
+    """The pre-inbox handler's database work for one event."""
+    from app.models.users import User
+    from app.services.clerk_webhooks import parse_event
+
+    event = parse_event(json.loads(body))
+    fields = event["fields"]
+    user = db.query(User).filter(User.clerk_id == event["clerk_id"]).first()
+    if event["event_type"] == "user.created" and user is None:
+        db.add(User(clerk_id=event["clerk_id"], **fields))
+    elif user is not None:
+        for name, value in fields.items():
+            setattr(user, name, value)
+    db.commit()
+
+
+def _reset(database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    from app import databse
+    from app.models import reports, reindex, chat  # noqa: F401  (resolve User's relationships)
+    from app.models.users import User, UserRole, ProfileImageVariant
+    from app.models.webhooks import ClerkWebhookEvent
+
+    databse._engine = None  # a fresh engine per run
+    engine = databse.get_engine()
+    tables = [UserRole.__table__, User.__table__, ProfileImageVariant.__table__, ClerkWebhookEvent.__table__]
+    databse.Base.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        for table in reversed(tables):
+            conn.execute(table.delete())
+    return databse.SessionLocal()
+
+
+def _users(db) -> List[tuple]:
+    from app.models.users import User
+
+    return sorted(db.query(User.clerk_id, User.email, User.first_name, User.last_name, User.is_active).all())
+
+
+def run_synchronous(database_url: str, events) -> Tuple[dict, List[tuple]]:
+    db = _reset(database_url)
+    latencies = []
+    started = time.perf_counter()
+    for msg_id, body in events:
+        begun = time.perf_counter()
+        _synchronous(db, body)
+        latencies.append(time.perf_counter() - begun)
+    elapsed = time.perf_counter() - started
+    result = {
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(len(events) / elapsed),
+        "ack_p50_ms": _percentile_ms(latencies, 50),
+        "ack_p99_ms": _percentile_ms(latencies, 99),
+        "commits": len(events),
+    }
+    return result, _users(db)
+
+
+def run_inbox(database_url: str, events, batch: int) -> Tuple[dict, List[tuple]]:
+    from app.services.clerk_webhooks import enqueue, parse_event, process_batch, verify_signature
+
+    db = _reset(database_url)
+    signed = [(_headers(msg_id, body), body) for msg_id, body in events]
+    latencies, duplicates = [], 0
+    started = time.perf_counter()
+    for headers, body in signed:
+        begun = time.perf_counter()
+        svix_id = verify_signature(headers, body)
+        duplicates += not enqueue(db, svix_id, parse_event(json.loads(body)))
+        latencies.append(time.perf_counter() - begun)
+    ingested = time.perf_counter()
+    batches = 0
+    while process_batch(db, batch):
+        batches += 1
+    finished = time.perf_counter()
+    result = {
+        "seconds": round(finished - started, 3),
+        "events_per_second": round(len(events) / (finished - started)),
+        "ack_p50_ms": _percentile_ms(latencies, 50),
+        "ack_p99_ms": _percentile_ms(latencies, 99),
+        "ingest_seconds": round(ingested - started, 3),
+        "apply_seconds": round(finished - ingested, 3),
+        "duplicates_dropped": duplicates,
+        "batches": batches,
+        "commits": len(events) + batches,
+    }
+    return result, _users(db)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--database-url", default="")
+    args = parser.parse_args()
+
+    os.environ["CLERK_WEBHOOK_SECRET"] = SECRET
+    from app.config import settings
+    settings.CLERK_WEBHOOK_SECRET = SECRET
+
+    events = build_events(args.events, args.users, args.duplicates)
+    with tempfile.TemporaryDirectory() as scratch:
+        def url(name: str) -> str:
+            return args.database_url or f"sqlite:///{os.path.join(scratch, name)}.db"
+
+        synchronous, sync_users = run_synchronous(url("synchronous"), events)
+        inbox, inbox_users = run_inbox(url("inbox"), events, args.batch)
+
+    print(json.dumps({
+        "events": len(events),
+        "users": args.users,
+        "backend": (args.database_url or "sqlite").split(":", 1)[0],
+        "synchronous": synchronous,
+        "inbox": inbox,
+        "same_users": sync_users == inbox_users,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
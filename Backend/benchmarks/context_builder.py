@@ -0,0 +1,100 @@
+# benchmarks/context_builder.py
+"""
+Prompt tokens of the chat context: stuffed top-k chunks vs the context builder.
+
+    python -m benchmarks.context_builder [--reports 200] [--questions 200]
+        [--fetch-k 5] [--budget 1500] [--chunker token|character]
+
+Indexes the synthetic corpus into a throwaway CHROMA_PERSIST_DIRECTORY (or,
+with VECTOR_BACKEND=pgvector, a throwaway user in document_chunks), then
+for each question retrieves --fetch-k chunks and builds the context two ways:
+
+- ``stuffed``: the chunks joined verbatim, as RetrievalQA's "stuff" chain did
+- ``built``: app.services.context_builder.build_context
+
+It reports prompt tokens per question (mean, p50, p95), the reduction, and
+answer recall, i.e. the share of questions whose full answer line is still in
+the context. Tokens are counted the way the app counts them (tiktoken if
+installed, otherwise ~4 characters per token).
+"""
+import argparse
+import json
+import math
+import shutil
+import statistics
+import tempfile
+
+from app.config import settings
+
+
+def _summary(tokens, recalled):
+    ordered = sorted(tokens)
+
+    def pct(q):
+        return ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)]
+
+    return {
+        "tokens_mean": round(statistics.mean(tokens), 1),
+        "tokens_p50": pct(50),
+        "tokens_p95": pct(95),
+        "answer_recall": round(sum(recalled) / len(recalled), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--fetch-k", type=int, default=settings.CONTEXT_FETCH_K)
+    parser.add_argument("--budget", type=int, default=settings.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--chunker", choices=["token", "character"], default=settings.CHUNKER)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sparkstorm-context-")
+    settings.CHROMA_PERSIST_DIRECTORY = workdir
+    settings.CHUNKER = args.chunker
+
+    from app.services.context_builder import build_context, count_tokens
+    from app.services.document_store import build_document_store
+    from benchmarks.corpus import build_corpus
+
+    corpus = build_corpus(args.reports, seed=args.seed)
+    facts = corpus["facts"][:args.questions]
+    store = build_document_store()
+    user_id = "bench_context"
+    try:
+        for idx, report in enumerate(corpus["reports"]):
+            name = f"report_{idx}.pdf"
+            store.store_document(user_id, name, report, {"filename": name, "s3_uri": f"s3://bench/{name}"})
+        vectorstore = store.get_vectorstore(user_id)
+
+        stuffed_tokens, stuffed_recall, built_tokens, built_recall = [], [], [], []
+        for fact in facts:
+            scored = vectorstore.similarity_search_with_relevance_scores(fact["question"], k=args.fetch_k)
+            stuffed = "\n\n".join(doc.page_content for doc, _ in scored)
+            built, _ = build_context(scored, token_budget=args.budget)
+            stuffed_tokens.append(count_tokens(stuffed))
+            stuffed_recall.append(fact["answer"] in stuffed)
+            built_tokens.append(count_tokens(built))
+            built_recall.append(fact["answer"] in built)
+    finally:
+        store.delete_user_collection(user_id)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stuffed_summary = _summary(stuffed_tokens, stuffed_recall)
+    built_summary = _summary(built_tokens, built_recall)
+    print(json.dumps({
+        "model": settings.EMBEDDING_MODEL_NAME,
+        "chunker": args.chunker,
+        "fetch_k": args.fetch_k,
+        "budget": args.budget,
+        "questions": len(facts),
+        "stuffed": stuffed_summary,
+        "built": built_summary,
+        "token_reduction": round(1 - sum(built_tokens) / sum(stuffed_tokens), 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
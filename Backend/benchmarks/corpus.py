@@ -0,0 +1,77 @@
+# benchmarks/corpus.py
+"""
+Deterministic synthetic medical-report corpus for offline benchmarks.
+
+Reports look like Textract output (one OCR line per line, lab results as
+column-aligned table rows). Each report carries a few unique "facts" with a
+matching question so retrieval recall can be measured without real data.
+"""
+import random
+from typing import Dict, List
+
+_TESTS = [
+    ("Hemoglobin", "g/dL", 11.0, 17.5), ("WBC Count", "10^3/uL", 3.5, 11.0),
+    ("Platelet Count", "10^3/uL", 140, 450), ("Fasting Glucose", "mg/dL", 65, 160),
+    ("HbA1c", "%", 4.5, 9.5), ("Total Cholesterol", "mg/dL", 120, 280),
+    ("LDL Cholesterol", "mg/dL", 50, 200), ("HDL Cholesterol", "mg/dL", 25, 90),
+    ("Triglycerides", "mg/dL", 60, 400), ("Serum Creatinine", "mg/dL", 0.5, 2.0),
+    ("TSH", "mIU/L", 0.3, 8.0), ("Vitamin D", "ng/mL", 8, 80), ("Vitamin B12", "pg/mL", 150, 900),
+    ("ALT (SGPT)", "U/L", 7, 90), ("AST (SGOT)", "U/L", 8, 80), ("Serum Sodium", "mmol/L", 130, 148),
+]
+_DRUGS = [
+    "Metformin 500 mg", "Atorvastatin 20 mg", "Amlodipine 5 mg", "Levothyroxine 50 mcg",
+    "Pantoprazole 40 mg", "Cetirizine 10 mg", "Vitamin D3 60000 IU", "Azithromycin 500 mg",
+    "Telmisartan 40 mg", "Paracetamol 650 mg",
+]
+_SCHEDULES = ["once daily after breakfast", "twice daily after meals", "at bedtime",
+              "once weekly for 8 weeks", "every 8 hours for 5 days"]
+_FILLER = [
+    "Sample collected at the main laboratory and processed within two hours of collection.",
+    "Results should be interpreted in the context of the clinical history of the patient.",
+    "Reference ranges are specific to the method and instrument used by this laboratory.",
+    "This report is electronically verified and does not require a physical signature.",
+    "Patient was advised to maintain hydration and follow up if symptoms persist.",
+    "No significant abnormality was detected in the remaining parameters of the panel.",
+]
+_CONDITIONS = ["type 2 diabetes", "hypertension", "hypothyroidism", "vitamin D deficiency",
+               "dyslipidemia", "seasonal allergic rhinitis", "acid reflux", "iron deficiency anemia"]
+
+
+def _report(rng: random.Random, idx: int, facts: List[Dict[str, str]]) -> str:
+    patient = f"Patient {idx:05d}"
+    lines = [
+        "CITY DIAGNOSTICS LABORATORY",
+        f"Patient Name: {patient}    Age: {rng.randint(18, 85)}    Sex: {rng.choice('MF')}",
+        f"Report ID: R-{idx:06d}    Date: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "",
+    ]
+    for _ in range(rng.randint(2, 4)):
+        lines.append(rng.choice(_FILLER))
+    lines.append("")
+    lines.append("Test  Result  Unit  Reference Range")
+    for name, unit, low, high in rng.sample(_TESTS, rng.randint(6, 12)):
+        value = round(rng.uniform(low * 0.8, high * 1.2), 1)
+        lines.append(f"{name}  {value}  {unit}  {low}-{high}")
+    lines.append("")
+    for _ in range(rng.randint(3, 8)):
+        lines.append(rng.choice(_FILLER))
+
+    condition = rng.choice(_CONDITIONS)
+    drug = rng.choice(_DRUGS)
+    schedule = rng.choice(_SCHEDULES)
+    # Facts go at the end of the report, where character chunks are most
+    # likely to run past the encoder's truncation point.
+    diagnosis = f"Impression: {patient} was diagnosed with {condition} on follow-up review."
+    prescription = f"Rx: {drug} {schedule} for {condition}."
+    lines += ["", diagnosis, prescription]
+    facts.append({"question": f"What condition was {patient} diagnosed with?", "answer": diagnosis})
+    facts.append({"question": f"How should {patient} take {drug}?", "answer": prescription})
+    return "\n".join(lines)
+
+
+def build_corpus(n_reports: int = 200, seed: int = 7) -> Dict[str, list]:
+    """Return {"reports": [str], "facts": [{"question", "answer"}]}."""
+    rng = random.Random(seed)
+    facts: List[Dict[str, str]] = []
+    reports = [_report(rng, idx, facts) for idx in range(n_reports)]
+    return {"reports": reports, "facts": facts}
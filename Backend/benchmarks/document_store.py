@@ -0,0 +1,267 @@
+# benchmarks/document_store.py
+"""
+Microbenchmarks for app/services/document_store.py.
+
+    python -m benchmarks.document_store [--sizes 50,500,2000] [--repeat 5]
+        [--backend chroma|pgvector] [--output results.json] [--baseline benchmarks/baselines/document_store.json]
+        [--write-baseline] [--tolerance 0.15]
+
+Runs offline against a small local model (EMBEDDING_MODEL_NAME by default,
+e.g. all-MiniLM-L6-v2 from the Hugging Face cache; HF_HUB_OFFLINE=1 keeps it
+from reaching the hub) and a throwaway CHROMA_PERSIST_DIRECTORY. Measures:
+
+- ``chunking``: ``build_documents`` throughput, i.e. the chunking part of
+  ``store_document``, and ``store_document`` end to end
+- ``embed``: ``embed_documents`` throughput per batch size
+- ``search``: ``similarity_search_with_score`` latency per corpus size, with
+  a warm handle
+- ``cold_open``: opening a user's collection with no cached handle or
+  chromadb client, and the first query on it
+- ``delete``: ``delete_document``, deleting one report's chunks by metadata
+  lookup, and ``delete_user_collection``
+
+For reproducible numbers the corpus is generated from a fixed seed, the thread
+count is pinned (--threads), every measurement discards --warmup runs and the
+median of --repeat runs is reported. Each metric records whether lower or
+higher is better. Comparing against a baseline fails on regressions beyond
+--tolerance. Only compare baselines taken on the same machine and settings,
+which are recorded in the file.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "document_store.json")
+
+
+def _timed(fn: Callable[[], object], repeat: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _percentile_ms(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)] * 1000, 3)
+
+
+class Results:
+    def __init__(self):
+        self.metrics: Dict[str, Dict] = {}
+
+    def add(self, name: str, value: float, unit: str, better: str):
+        self.metrics[name] = {"value": round(value, 3), "unit": unit, "better": better}
+        print(f"  {name:<48} {value:>12.3f} {unit}", file=sys.stderr)
+
+
+def _clear_chroma_clients():
+    """Drop chromadb's per-path client cache so the next open is really cold."""
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return
+    SharedSystemClient.clear_system_cache()
+
+
+def bench_chunking(store, reports: List[str], results: Results, repeat: int, warmup: int):
+    def chunk_all():
+        return sum(len(store.build_documents(report, {"filename": "bench"})) for report in reports)
+
+    chunks = chunk_all()
+    seconds = statistics.median(_timed(chunk_all, repeat, warmup))
+    results.add("chunking.build_documents.reports_per_s", len(reports) / seconds, "reports/s", "higher")
+    results.add("chunking.build_documents.chunks_per_s", chunks / seconds, "chunks/s", "higher")
+
+
+def bench_embed(store, texts: List[str], batch_sizes: List[int], results: Results, repeat: int, warmup: int):
+    for batch_size in batch_sizes:
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        def embed_all():
+            for batch in batches:
+                store.embedding_model.embed_documents(batch)
+
+        seconds = statistics.median(_timed(embed_all, repeat, warmup))
+        results.add(f"embed.batch_{batch_size}.texts_per_s", len(texts) / seconds, "texts/s", "higher")
+
+
+def bench_corpus_size(store, size: int, reports: List[str], queries: List[str], results: Results,
+                      repeat: int, warmup: int):
+    user_id = f"bench_{size}"
+    if store.get_vectorstore(user_id) is not None:
+        store.delete_user_collection(user_id)
+
+    # Build the index the way uploads do, one store_document call per report
+    chunks = sum(len(store.build_documents(report, {})) for report in reports[:size])
+    started = time.perf_counter()
+    for idx, report in enumerate(reports[:size]):
+        store.store_document(user_id, f"report_{idx}.pdf", report, {"filename": f"report_{idx}.pdf"})
+    build_seconds = time.perf_counter() - started
+    results.add(f"chunking.store_document.{size}.chunks_per_s", chunks / build_seconds, "chunks/s", "higher")
+
+    # Warm search: handle cached, chromadb segment loaded
+    query_iter = itertools.cycle(queries)
+    samples = _timed(lambda: store.get_relevant_documents(user_id, next(query_iter), top_k=5),
+                     repeat * 10, warmup * 5)
+    results.add(f"search.{size}.p50_ms", _percentile_ms(samples, 50), "ms", "lower")
+    results.add(f"search.{size}.p95_ms", _percentile_ms(samples, 95), "ms", "lower")
+
+    # Cold open: no cached handle and no chromadb client for the path
+    open_samples, first_query_samples = [], []
+    for _ in range(warmup + repeat):
+        store.vector_stores.clear()
+        _clear_chroma_clients()
+        started = time.perf_counter()
+        store.get_vectorstore(user_id)
+        opened = time.perf_counter()
+        store.get_relevant_documents(user_id, queries[0], top_k=5)
+        open_samples.append(opened - started)
+        first_query_samples.append(time.perf_counter() - opened)
+    results.add(f"cold_open.{size}.open_ms", statistics.median(open_samples[warmup:]) * 1000, "ms", "lower")
+    results.add(f"cold_open.{size}.first_query_ms",
+                statistics.median(first_query_samples[warmup:]) * 1000, "ms", "lower")
+
+    # Deletes. delete_document removes vectors by report id; chunks stored
+    # without that id make it a lookup that deletes nothing, so the cost of
+    # removing one report's chunks by metadata is measured alongside it
+    samples = _timed(lambda: store.delete_document(report_id=0, user_id=user_id), repeat, warmup)
+    results.add(f"delete.{size}.delete_document_ms", statistics.median(samples) * 1000, "ms", "lower")
+
+    vector_store = store.get_vectorstore(user_id)
+    filenames = iter(f"report_{idx}.pdf" for idx in range(min(size, warmup + repeat)))
+
+    def delete_report_chunks():
+        ids = vector_store.get(where={"filename": next(filenames)}, include=[])["ids"]
+        if ids:
+            vector_store.delete(ids=ids)
+
+    samples = _timed(delete_report_chunks, min(size, warmup + repeat) - warmup, warmup)
+    results.add(f"delete.{size}.delete_by_metadata_ms", statistics.median(samples) * 1000, "ms", "lower")
+
+    started = time.perf_counter()
+    store.delete_user_collection(user_id)
+    results.add(f"delete.{size}.delete_user_collection_ms", (time.perf_counter() - started) * 1000, "ms", "lower")
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Print changes against a baseline; return True if nothing regressed beyond tolerance."""
+    if baseline.get("environment") != results["environment"]:
+        print("WARNING: baseline was recorded with a different environment:", file=sys.stderr)
+        print(f"  baseline: {baseline.get('environment')}\n  current:  {results['environment']}", file=sys.stderr)
+    ok = True
+    for name, current in results["metrics"].items():
+        before = baseline.get("metrics", {}).get(name)
+        if not before or not before["value"]:
+            continue
+        change = (current["value"] - before["value"]) / before["value"]
+        regressed = change > tolerance if current["better"] == "lower" else change < -tolerance
+        ok = ok and not regressed
+        print(f"{name:<48} {before['value']:>12.3f} -> {current['value']:<12.3f} {change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document store microbenchmarks.")
+    parser.add_argument("--model", default=None, help="Embedding model (default: EMBEDDING_MODEL_NAME)")
+    parser.add_argument("--sizes", default="50,500,2000", help="Corpus sizes, in reports")
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--embed-texts", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--backend", choices=["chroma", "pgvector"], default=None,
+                        help="Vector backend (default: VECTOR_BACKEND)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None, help=f"Compare with a baseline (e.g. {DEFAULT_BASELINE})")
+    parser.add_argument("--write-baseline", action="store_true", help=f"Write results to {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    workdir = tempfile.mkdtemp(prefix="sparkstorm-bench-")
+    settings.CHROMA_PERSIST_DIRECTORY = workdir
+    if args.model:
+        settings.EMBEDDING_MODEL_NAME = args.model
+    settings.EMBEDDING_THREADS = args.threads or settings.embedding_threads()
+    if args.backend:
+        settings.VECTOR_BACKEND = args.backend
+
+    random.seed(args.seed)
+    from app.services.document_store import build_document_store
+    from benchmarks.corpus import build_corpus
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    corpus = build_corpus(max(sizes), seed=args.seed)
+    reports = corpus["reports"]
+    queries = [fact["question"] for fact in corpus["facts"]]
+
+    store = build_document_store()
+    embed_texts = [doc.page_content for report in reports for doc in store.build_documents(report, {})]
+    embed_texts = embed_texts[:args.embed_texts]
+
+    import chromadb
+
+    results = Results()
+    try:
+        bench_chunking(store, reports[:200], results, args.repeat, args.warmup)
+        bench_embed(store, embed_texts, [int(b) for b in args.batch_sizes.split(",")], results,
+                    args.repeat, args.warmup)
+        for size in sizes:
+            bench_corpus_size(store, size, reports, queries, results, args.repeat, args.warmup)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = {
+        "environment": {
+            "model": settings.EMBEDDING_MODEL_NAME,
+            "backend": settings.EMBEDDING_BACKEND,
+            "vector_backend": settings.VECTOR_BACKEND,
+            "index_version": store.index_version,
+            "threads": settings.EMBEDDING_THREADS,
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "chromadb": chromadb.__version__,
+            "sizes": sizes,
+            "seed": args.seed,
+        },
+        "metrics": results.metrics,
+    }
+    rendered = json.dumps(output, indent=2)
+    print(rendered)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(rendered)
+    if args.write_baseline:
+        os.makedirs(os.path.dirname(DEFAULT_BASELINE), exist_ok=True)
+        with open(DEFAULT_BASELINE, "w") as f:
+            f.write(rendered + "\n")
+        print(f"Wrote baseline {DEFAULT_BASELINE}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(output, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/embedding_backends.py
+"""
+Check that the ONNX backends agree with PyTorch and compare their speed.
+
+    python -m benchmarks.embedding_backends [--texts 512] [--threads 2]
+
+Equivalence: cosine between each text's PyTorch and ONNX vector, and the
+largest difference in query/chunk cosine scores (what retrieval ranks on).
+The run exits non-zero when a backend falls below --min-cosine.
+Speed: batch throughput (texts/sec) and single-query latency p50/p95.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.document_store import SentenceTransformerEmbeddings
+from benchmarks.corpus import build_corpus
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _speed(embeddings, texts, queries):
+    embeddings.embed_documents(texts[:32])  # warm-up
+    started = time.perf_counter()
+    embeddings.embed_documents(texts)
+    throughput = len(texts) / (time.perf_counter() - started)
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "texts_per_sec": round(throughput, 1),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=settings.embedding_threads())
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    corpus = build_corpus(200)
+    texts = [line for report in corpus["reports"] for line in report.split("\n\n")][:args.texts]
+    queries = [fact["question"] for fact in corpus["facts"]][:200]
+
+    reference = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME, backend="torch", threads=args.threads)
+    ref_docs = _normalize(reference.embed_documents(texts))
+    ref_queries = _normalize(reference.embed_documents(queries))
+    ref_scores = ref_queries @ ref_docs.T
+
+    results = {"torch": _speed(reference, texts, queries)}
+    failed = False
+    for name, quantize in (("onnx", False), ("onnx_int8", True)):
+        settings.EMBEDDING_ONNX_QUANTIZE = quantize
+        candidate = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME, backend="onnx", threads=args.threads)
+        docs = _normalize(candidate.embed_documents(texts))
+        scores = _normalize(candidate.embed_documents(queries)) @ docs.T
+
+        min_cosine = float((docs * ref_docs).sum(axis=1).min())
+        results[name] = {
+            "min_cosine_vs_torch": round(min_cosine, 5),
+            "max_score_diff_vs_torch": round(float(np.abs(scores - ref_scores).max()), 5),
+            "top1_agreement": round(float((scores.argmax(axis=1) == ref_scores.argmax(axis=1)).mean()), 3),
+            **_speed(candidate, texts, queries),
+        }
+        failed = failed or min_cosine < args.min_cosine
+
+    print(json.dumps({"threads": args.threads, "texts": len(texts), "results": results}, indent=2))
+    if failed:
+        print(f"FAIL: an ONNX backend fell below cosine {args.min_cosine}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/embedding_sidecar.py
+"""
+Memory and throughput of per-worker models vs. the shared embedding sidecar.
+
+    python -m benchmarks.embedding_sidecar [--workers 4 8] [--requests 100]
+
+For each worker count, N processes mimic uvicorn workers: each builds
+SentenceTransformerEmbeddings and sends --requests encode calls of
+--texts-per-request chunks. "in_process" loads the model in every worker,
+"sidecar" starts app.cli.embedding_server once and uses EMBEDDING_BACKEND=sidecar.
+Reported RSS is the sum over workers (plus the sidecar) measured after the run.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import build_corpus
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _worker(backend, threads, texts, requests, per_request, start, done, results):
+    from app.config import settings
+    from app.services.document_store import SentenceTransformerEmbeddings
+
+    embeddings = SentenceTransformerEmbeddings(settings.EMBEDDING_MODEL_NAME, backend=backend, threads=threads)
+    embeddings.embed_query("warm-up")
+    start.wait()
+    for i in range(requests):
+        offset = (i * per_request) % max(1, len(texts) - per_request)
+        embeddings.embed_documents(texts[offset:offset + per_request])
+    results.put(os.getpid())
+    done.wait()  # stay alive so RSS can be read
+
+
+def _run(backend, workers, texts, requests, per_request):
+    ctx = multiprocessing.get_context("spawn")
+    start, done, results = ctx.Barrier(workers + 1), ctx.Event(), ctx.Queue()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    procs = [
+        ctx.Process(target=_worker, args=(backend, threads, texts, requests, per_request, start, done, results))
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    start.wait()
+    started = time.perf_counter()
+    pids = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - started
+    rss = sum(_rss_mb(pid) for pid in pids)
+    done.set()
+    for proc in procs:
+        proc.join()
+    return {
+        "texts_per_sec": round(workers * requests * per_request / elapsed, 1),
+        "workers_rss_mb": round(rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--texts-per-request", type=int, default=8)
+    args = parser.parse_args()
+
+    corpus = build_corpus(100)
+    texts = [block for report in corpus["reports"] for block in report.split("\n\n")]
+    results = {}
+
+    for workers in args.workers:
+        results[f"{workers}_workers"] = {
+            "in_process": _run(None, workers, texts, args.requests, args.texts_per_request)
+        }
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+    os.environ["EMBEDDING_SIDECAR_SOCKET"] = socket_path
+    sidecar = subprocess.Popen([sys.executable, "-m", "app.cli.embedding_server", "--socket", socket_path])
+    try:
+        while not os.path.exists(socket_path):
+            if sidecar.poll() is not None:
+                raise SystemExit("embedding sidecar failed to start")
+            time.sleep(0.2)
+        for workers in args.workers:
+            run = _run("sidecar", workers, texts, args.requests, args.texts_per_request)
+            run["sidecar_rss_mb"] = round(_rss_mb(sidecar.pid), 1)
+            run["total_rss_mb"] = round(run["workers_rss_mb"] + run["sidecar_rss_mb"], 1)
+            results[f"{workers}_workers"]["sidecar"] = run
+    finally:
+        sidecar.terminate()
+        sidecar.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
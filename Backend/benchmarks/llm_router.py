@@ -0,0 +1,115 @@
+# benchmarks/llm_router.py
+"""
+Hedged LLM routing against two local fake providers.
+
+    python -m benchmarks.llm_router [--requests 400] [--concurrency 16]
+
+Both fakes have log-normal latency with a heavy tail (--tail-rate of calls
+take --tail-seconds). The scenarios are:
+
+- ``single``: primary only, no hedging
+- ``hedged``: primary plus a hedge to the alternate after the primary's p95
+- ``primary_outage``: the primary fails every call, so its breaker opens and
+  traffic fails over to the alternate
+
+Each prints latency percentiles, the error count and which provider answered.
+Latencies are scaled down (tens of ms) so a run takes seconds.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import random
+import time
+
+from app.core.metrics import LLM_HEDGES
+from app.services.llm_router import LLMRouter, LLMUnavailable
+
+
+class FakeProvider:
+    def __init__(self, name: str, median_seconds: float, tail_rate: float, tail_seconds: float,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.median_seconds = median_seconds
+        self.tail_rate = tail_rate
+        self.tail_seconds = tail_seconds
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    async def complete(self, prompt: str) -> str:
+        if self.rng.random() < self.tail_rate:
+            latency = self.tail_seconds
+        else:
+            latency = self.rng.lognormvariate(math.log(self.median_seconds), 0.25)
+        await asyncio.sleep(latency)
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} failed")
+        return self.name
+
+
+async def _drive(router: LLMRouter, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, winners, errors = [], collections.Counter(), 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                winners[await router.complete("prompt")] += 1
+            except LLMUnavailable:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    latencies.sort()
+
+    def pct(q):
+        return round(latencies[max(0, math.ceil(len(latencies) * q / 100) - 1)] * 1000, 1)
+
+    return {"p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99), "errors": errors, "answered_by": dict(winners)}
+
+
+def _hedge_counts():
+    return {result: int(LLM_HEDGES.labels(result)._value.get()) for result in ("won", "lost", "skipped")}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--median-ms", type=float, default=40)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    def providers(primary_error_rate: float = 0.0):
+        median = args.median_ms / 1000
+        return [
+            FakeProvider("primary", median, args.tail_rate, args.tail_seconds, primary_error_rate, seed=1),
+            FakeProvider("alternate", median * 1.5, args.tail_rate, args.tail_seconds, seed=2),
+        ]
+
+    common = dict(max_concurrency=args.concurrency * 2, timeout=args.tail_seconds * 5, queue_timeout=5,
+                  min_hedge_delay=0.005, max_hedge_delay=args.tail_seconds, default_hedge_delay=0.1,
+                  breaker_failures=5, breaker_cooldown=60)
+    scenarios = {
+        "single": (LLMRouter(providers()[:1], hedge=False, **common)),
+        "hedged": (LLMRouter(providers(), hedge=True, **common)),
+        "primary_outage": (LLMRouter(providers(primary_error_rate=1.0), hedge=True, **common)),
+    }
+
+    results = {}
+    for name, router in scenarios.items():
+        before = _hedge_counts()
+        results[name] = asyncio.run(_drive(router, args.requests, args.concurrency))
+        after = _hedge_counts()
+        results[name]["hedges"] = {key: after[key] - before[key] for key in after}
+        results[name]["breakers"] = {p: b.state for p, b in router.breakers.items()}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
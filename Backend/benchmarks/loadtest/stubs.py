@@ -0,0 +1,198 @@
+# benchmarks/loadtest/stubs.py
+"""
+Local stand-ins for the app's external dependencies.
+
+- ``LocalIssuer``: an RSA key pair that signs Clerk-style RS256 session tokens
+  and publishes the matching JWKS.
+- ``StubServer``: one threaded HTTP server that serves the JWKS, a fake
+  OpenAI-compatible ``/v1/chat/completions`` endpoint (configurable latency,
+  optional SSE token streaming) and a fake Textract ``AnalyzeDocument``.
+  moto doesn't implement AnalyzeDocument, so Textract is served here: the
+  uploaded "PDF" bytes are treated as the document text and returned as LINE
+  blocks.
+- ``start_moto``: moto's server for S3.
+"""
+import base64
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalIssuer:
+    """Signs tokens the app's ``verify_clerk_token`` accepts."""
+
+    def __init__(self, issuer: str, audience: str):
+        self.issuer = issuer
+        self.audience = audience
+        self.kid = f"loadtest-{uuid.uuid4().hex[:8]}"
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._private_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        public_pem = key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+        public_jwk.update({"kid": self.kid, "use": "sig", "alg": "RS256"})
+        self.jwks = {"keys": [public_jwk]}
+
+    def token(self, subject: str, ttl_seconds: int = 3600) -> str:
+        now = int(time.time())
+        claims = {"sub": subject, "iss": self.issuer, "aud": self.audience,
+                  "iat": now, "nbf": now - 5, "exp": now + ttl_seconds}
+        return jwt.encode(claims, self._private_pem, algorithm="RS256", headers={"kid": self.kid})
+
+
+class FakeLLM:
+    """
+    Latency model for the fake chat completions endpoint: ``first_token_ms``
+    before the first token, then ``per_token_ms`` per token. The answer is
+    built from the prompt's context so citation scoring has real overlap.
+    """
+
+    def __init__(self, first_token_ms: float = 300, per_token_ms: float = 15, tokens: int = 80):
+        self.first_token_ms = first_token_ms
+        self.per_token_ms = per_token_ms
+        self.tokens = tokens
+
+    def answer_tokens(self, prompt: str):
+        context = prompt.split("Context from uploaded documents:", 1)[-1].split("Question:", 1)[0]
+        words = context.split() or ["I", "don't", "have", "any", "reports", "about", "that."]
+        return [words[i % len(words)] + " " for i in range(self.tokens)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, content_type: str = "application/json"):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/.well-known/jwks.json":
+            self._send_json(200, self.server.issuer.jwks)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        target = self.headers.get("X-Amz-Target", "")
+        if target == "Textract.AnalyzeDocument":
+            self._textract(self._read_json())
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat(self._read_json())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _textract(self, request: dict):
+        time.sleep(self.server.ocr_ms / 1000)
+        text = base64.b64decode(request["Document"]["Bytes"]).decode("utf-8", errors="replace")
+        blocks = [{"BlockType": "PAGE", "Id": "page-1"}]
+        blocks += [{"BlockType": "LINE", "Id": f"line-{i}", "Text": line, "Confidence": 99.0}
+                   for i, line in enumerate(text.splitlines()) if line.strip()]
+        self._send_json(200, {"DocumentMetadata": {"Pages": 1}, "Blocks": blocks},
+                        content_type="application/x-amz-json-1.1")
+
+    def _chat(self, request: dict):
+        llm = self.server.llm
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        tokens = llm.answer_tokens(prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "fake")
+        created = int(time.time())
+        usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(tokens),
+                 "total_tokens": len(prompt.split()) + len(tokens)}
+
+        if not request.get("stream"):
+            time.sleep((llm.first_token_ms + llm.per_token_ms * len(tokens)) / 1000)
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+                "usage": usage,
+            })
+            return
+
+        # Server-sent events, one token per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        time.sleep(llm.first_token_ms / 1000)
+        for index, token in enumerate(tokens):
+            if index:
+                time.sleep(llm.per_token_ms / 1000)
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        done = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, issuer: LocalIssuer, llm: FakeLLM, ocr_ms: float = 0, port: Optional[int] = None):
+        super().__init__(("127.0.0.1", port or free_port()), _Handler)
+        self.issuer = issuer
+        self.llm = llm
+        self.ocr_ms = ocr_ms
+        self._thread = threading.Thread(target=self.serve_forever, name="loadtest-stubs", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def start_moto(bucket: str, region: str, port: Optional[int] = None):
+    """Start moto's server and create the bucket. Returns (server, url)."""
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    port = port or free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    url = f"http://127.0.0.1:{port}"
+    s3 = boto3.client("s3", endpoint_url=url, region_name=region,
+                      aws_access_key_id="testing", aws_secret_access_key="testing")
+    if region == "us-east-1":
+        s3.create_bucket(Bucket=bucket)
+    else:
+        s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": region})
+    return server, url
@@ -0,0 +1,143 @@
+# benchmarks/logging_overhead.py
+"""
+Request latency with a slow stdout: blocking prints vs. queued logging.
+
+    python -m benchmarks.logging_overhead [--requests 200] [--concurrency 20]
+                                          [--stdout-bytes-per-second 65536]
+
+stdout is replaced by a stream whose writes sleep in proportion to their size,
+like a pipe to a log shipper that has fallen behind. A minimal FastAPI app is
+driven in-process with httpx, and per-request latency percentiles are printed
+for three modes:
+
+- ``print``: the chat path's former output, ~20 ``print`` lines per request
+- ``sync_logging``: the current chat-path log volume through a plain
+  StreamHandler, which still writes on the event loop
+- ``queue_logging``: the same records through ``configure_logging``
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import logging_config
+from app.core.metrics import LOG_RECORDS_DROPPED
+
+logger = logging.getLogger("benchmarks.chat")
+
+
+class ThrottledStream:
+    """File-like object whose writes block like a backed-up pipe."""
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self.bytes_written = 0
+
+    def write(self, data: str) -> int:
+        time.sleep(len(data) / self.bytes_per_second)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _build_app(mode: str, stream: ThrottledStream) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat")
+    async def chat():
+        query = "What dose of metformin was I prescribed in March?"
+        answer = "Your March prescription lists metformin 500 mg twice daily with meals. " * 4
+        if mode == "print":
+            print(f"\nQuery: {query}", file=stream)
+            print(f"AI Response preview: {answer[:300]}...", file=stream)
+            print("Is refusal/no-info response: False", file=stream)
+            print(f"Response keywords: {answer.split()[:15]}...", file=stream)
+            print("\nAnalyzing 5 source documents:", file=stream)
+            for idx in range(5):
+                print(f"  Doc {idx}: users/u_123/reports/prescription_{idx}.pdf", file=stream)
+                print("    Keyword matches: 6/14 (42.9%)", file=stream)
+                print(f"    Sample matches: {answer.split()[:8]}", file=stream)
+                print("    ✓ CITED (relevant to response)", file=stream)
+            print("\nFinal citations: ['prescription_0', 'prescription_1']", file=stream)
+        else:
+            for idx in range(5):
+                logger.debug("Doc %d: %d/%d keyword matches (%.1f%%), relevant=%s", idx, 6, 14, 42.9, True)
+            logger.info("Chat answered", extra={"query": query, "answer": answer, "sources": 5, "citations": 2})
+        return {"message": answer}
+
+    return app
+
+
+def _configure(mode: str, stream: ThrottledStream):
+    logging_config.shutdown_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    if mode == "sync_logging":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging_config.JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    elif mode == "queue_logging":
+        logging_config.configure_logging(stream=stream)
+        root.setLevel(logging.INFO)
+
+
+async def _drive(app: FastAPI, requests: int, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/chat")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def _percentile(values: list, q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--stdout-bytes-per-second", type=float, default=64 * 1024)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("print", "sync_logging", "queue_logging"):
+        stream = ThrottledStream(args.stdout_bytes_per_second)
+        _configure(mode, stream)
+        dropped_before = LOG_RECORDS_DROPPED._value.get()
+        started = time.perf_counter()
+        latencies = asyncio.run(_drive(_build_app(mode, stream), args.requests, args.concurrency))
+        elapsed = time.perf_counter() - started
+        results[mode] = {
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "requests_per_s": round(args.requests / elapsed, 1),
+            "dropped_records": int(LOG_RECORDS_DROPPED._value.get() - dropped_before),
+        }
+        # Drain the writer thread outside the measured window
+        logging_config.shutdown_logging()
+        results[mode]["stdout_bytes"] = stream.bytes_written
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
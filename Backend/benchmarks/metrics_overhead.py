@@ -0,0 +1,51 @@
+# benchmarks/metrics_overhead.py
+"""
+Per-observation cost of the hot-path metrics helpers.
+
+    python -m benchmarks.metrics_overhead [--iterations 200000]
+
+Prints nanoseconds per call for a stage timer, a cache counter increment and
+a raw histogram observe, next to an empty loop as the baseline.
+"""
+import argparse
+import json
+import time
+
+from app.core.metrics import STAGE_LATENCY, record_cache, stage
+
+
+def _ns_per_call(fn, iterations: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter_ns()
+        for _ in range(iterations):
+            fn()
+        best = min(best, (time.perf_counter_ns() - started) / iterations)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    def empty():
+        pass
+
+    def stage_timer():
+        with stage("embedding"):
+            pass
+
+    observe = STAGE_LATENCY.labels("embedding").observe
+    baseline = _ns_per_call(empty, args.iterations)
+    results = {
+        "baseline_ns": round(baseline, 1),
+        "stage_timer_ns": round(_ns_per_call(stage_timer, args.iterations) - baseline, 1),
+        "cache_counter_ns": round(_ns_per_call(lambda: record_cache("jwks", True), args.iterations) - baseline, 1),
+        "histogram_observe_ns": round(_ns_per_call(lambda: observe(0.01), args.iterations) - baseline, 1),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/serialization.py
+"""
+Serialization time and wire size of the large JSON responses.
+
+    python -m benchmarks.serialization [--reports 200] [--text-kb 200] [--repeat 20]
+
+Two payloads built from the synthetic corpus:
+
+- ``list_files``: --reports ReportResponse rows, each with a summary and
+  thumbnail URL.
+- ``upload_file``: the upload response, whose ``extracted_text`` is about
+  --text-kb KB of OCR text.
+
+For each payload this prints the best-of-N time of every serializer:
+
+- ``pydantic_dump_json``: FastAPI's fast path for a response model with the
+  default response class.
+- ``jsonable_encoder_json``: the classic path, jsonable_encoder plus
+  json.dumps.
+- ``fast_json``: app.core.responses.dumps (orjson when installed).
+
+It also prints the body size raw, with ``fields=`` projection, and
+compressed with gzip at several levels and brotli (if installed), each with
+its compression time.
+"""
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core import responses
+from app.core.compression import brotli
+from app.schemas.reports import ReportResponse
+from benchmarks.corpus import build_corpus
+
+LIST_FIELDS = {"id", "original_filename", "uploaded_at", "thumbnail_url"}
+UPLOAD_FIELDS = {"success", "report_id", "s3_uri", "thumbnail_url"}
+
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def _reports(count: int, texts: List[str]):
+    uploaded = datetime(2025, 1, 1)
+    return [
+        SimpleNamespace(
+            id=i, file_path=f"s3://bucket/users/user_0001/{i:08d}.pdf", original_filename=f"report_{i:05d}.pdf",
+            uploaded_at=uploaded + timedelta(hours=i), description="Blood work", summary=texts[i % len(texts)][:600],
+            thumbnail_url=f"/api/reports/thumbnails/{i:064x}.jpg", preview_urls=[],
+        )
+        for i in range(count)
+    ]
+
+
+def _sizes(body: bytes, repeat: int) -> dict:
+    sizes = {"raw_bytes": len(body)}
+    for level in (1, 6, 9):
+        compressed = gzip.compress(body, compresslevel=level, mtime=0)
+        sizes[f"gzip{level}_bytes"] = len(compressed)
+        sizes[f"gzip{level}_ms"] = _best_ms(lambda: gzip.compress(body, compresslevel=level, mtime=0), repeat)
+    if brotli is not None:
+        for quality in (4, 11):
+            sizes[f"br{quality}_bytes"] = len(brotli.compress(body, quality=quality))
+            sizes[f"br{quality}_ms"] = _best_ms(lambda: brotli.compress(body, quality=quality), repeat)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--text-kb", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    texts = build_corpus(seed=7)["reports"]
+    rows = _reports(args.reports, texts)
+    list_adapter = TypeAdapter(List[ReportResponse])
+    models = list_adapter.validate_python(rows, from_attributes=True)
+
+    text = ""
+    while len(text) < args.text_kb * 1024:
+        text += "\n".join(texts)
+    upload = {
+        "success": True, "message": "File uploaded and processed successfully", "extracted_text": text,
+        "report_id": 1, "s3_uri": "s3://bucket/users/user_0001/report.pdf",
+        "thumbnail_url": f"/api/reports/thumbnails/{1:064x}.jpg",
+    }
+    dict_adapter = TypeAdapter(dict)
+
+    results = {
+        "orjson": responses.orjson is not None,
+        "brotli": brotli is not None,
+        "list_files": {
+            "pydantic_dump_json_ms": _best_ms(lambda: list_adapter.dump_json(models), args.repeat),
+            "jsonable_encoder_json_ms": _best_ms(
+                lambda: json.dumps(jsonable_encoder(models)).encode(), args.repeat),
+            "fast_json_ms": _best_ms(
+                lambda: responses.dumps(list_adapter.dump_python(models, mode="json")), args.repeat),
+            **_sizes(list_adapter.dump_json(models), args.repeat),
+            "projected_bytes": len(responses.dumps(
+                [model.model_dump(mode="json", include=LIST_FIELDS) for model in models])),
+        },
+        "upload_file": {
+            "pydantic_dump_json_ms": _best_ms(lambda: dict_adapter.dump_json(upload), args.repeat),
+            "jsonable_encoder_json_ms": _best_ms(
+                lambda: json.dumps(jsonable_encoder(upload)).encode(), args.repeat),
+            "fast_json_ms": _best_ms(lambda: responses.dumps(upload), args.repeat),
+            **_sizes(responses.dumps(upload), args.repeat),
+            "projected_bytes": len(responses.dumps(responses.project(upload, UPLOAD_FIELDS))),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
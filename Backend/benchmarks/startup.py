@@ -0,0 +1,63 @@
+# benchmarks/startup.py
+"""
+Startup-time regression check.
+
+    python -m benchmarks.startup [--runs 5] [--budget SECONDS]
+
+Measures, in fresh interpreters, the time to import ``main`` and run the app's
+startup (lifespan) with warm-up disabled, i.e. how long until a new worker can
+accept requests. Exits non-zero when the median exceeds the budget
+(STARTUP_BUDGET_SECONDS by default), so it can gate CI.
+
+Nothing external is needed: with lazy initialisation, importing the app must
+not reach the database, Secrets Manager, Clerk or the model hub.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def _startup():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(_startup())
+print(json.dumps({"import": imported - started, "total": time.perf_counter() - started}))
+"""
+
+
+def main():
+    from app.config import settings
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=settings.STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    env = dict(os.environ, STARTUP_WARMUP="off", PYTHONDONTWRITEBYTECODE="1")
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    result = {
+        "import_median_s": round(statistics.median(s["import"] for s in samples), 3),
+        "startup_median_s": round(statistics.median(s["total"] for s in samples), 3),
+        "budget_s": args.budget,
+    }
+    print(json.dumps(result, indent=2))
+    if result["startup_median_s"] > args.budget:
+        print(f"FAIL: startup {result['startup_median_s']}s exceeds budget {args.budget}s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# benchmarks/user_listing.py
+"""
+User listing: queries and time per page, old /list versus the paginated
+/admin/list.
+
+    python -m benchmarks.user_listing [--users 20000] [--limit 50] [--pages 20]
+        [--repeat 5] [--database-url postgresql+psycopg2://...]
+
+Seeds --users users with roles and profile image variants, from a fixed
+seed. It then measures:
+
+- ``list_all``: the old ``/list`` body, ``db.query(User).all()`` followed by
+  ``user.role.name`` for each user. Roles are lazy-loaded, one query per
+  distinct role, and the whole table is loaded on every call.
+- ``page``: ``list_users_page`` walking --pages pages of --limit with each
+  sort.
+- ``search``: a first page for a name fragment, a role and active-only.
+
+Every SQL statement is counted through a ``before_cursor_execute`` listener.
+The run fails (exit status 1) if a page takes more than ``PAGE_QUERY_BUDGET``
+statements, or if the count changes with the page size. That is the
+query-count check: an N+1 shows up as statements growing with --limit.
+
+Without --database-url the run uses a throwaway SQLite file. With a Postgres
+URL the users tables are emptied first, so use a scratch database. There the
+total is an estimate, and ``search`` uses the pg_trgm indexes.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# users + roles (joined), image variants (selectin), total
+PAGE_QUERY_BUDGET = 3
+
+_FIRST = ["Ada", "Grace", "Alan", "Edsger", "Barbara", "Donald", "Frances", "John", "Margaret", "Ken"]
+_LAST = ["Lovelace", "Hopper", "Turing", "Dijkstra", "Liskov", "Knuth", "Allen", "Backus", "Hamilton", "Thompson"]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@contextmanager
+def counted(counter: QueryCounter):
+    start = counter.count
+    result = {}
+    yield result
+    result["queries"] = counter.count - start
+
+
+def seed(db, users: int):
+    from app.models.users import ProfileImageVariant, User, UserRole
+
+    rng = random.Random(7)
+    roles = [UserRole(name=name) for name in ("patient", "doctor", "admin")]
+    db.add_all(roles)
+    db.flush()
+    rows = []
+    for i in range(users):
+        first, last = rng.choice(_FIRST), rng.choice(_LAST)
+        rows.append({
+            "clerk_id": f"user_{i:07d}", "email": f"{first}.{last}.{i}@example.com".lower(),
+            "username": f"{first}{last}{i}".lower(), "first_name": first, "last_name": f"{last}{i % 97}",
+            "is_active": rng.random() > 0.1, "role_id": rng.choice(roles).id,
+        })
+    db.execute(User.__table__.insert(), rows)
+    ids = [row[0] for row in db.query(User.id).all()]
+    db.execute(ProfileImageVariant.__table__.insert(), [
+        {"user_id": user_id, "width": width, "height": width, "digest": f"{user_id:060d}{width:04d}",
+         "content_type": "image/webp", "location": f"static/uploads/avatars/{user_id}-{width}.webp"}
+        for user_id in ids if user_id % 3 == 0 for width in (64, 256)
+    ])
+    db.commit()
+
+
+def _reset(database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    from app import databse
+    from app.models import reports, reindex, chat  # noqa: F401  (resolve User's relationships)
+    from app.models.users import ProfileImageVariant, User, UserRole
+
+    engine = databse.get_engine()
+    tables = [UserRole.__table__, User.__table__, ProfileImageVariant.__table__]
+    databse.Base.metadata.create_all(engine, tables=tables)
+    with engine.begin() as conn:
+        for table in reversed(tables):
+            conn.execute(table.delete())
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("ANALYZE users")
+    return engine, databse.SessionLocal()
+
+
+def _timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default="")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine, db = _reset(args.database_url or f"sqlite:///{os.path.join(scratch, 'users.db')}")
+        from sqlalchemy import event
+        from app.models.users import User
+        from app.services.user_directory import ensure_indexes, list_users_page
+
+        seed(db, args.users)
+        ensure_indexes(engine)
+        if engine.dialect.name == "postgresql":
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("ANALYZE users")
+        counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        failures = []
+
+        def list_all():
+            db.expunge_all()  # cold identity map, as in a fresh request
+            return [user.role.name if user.role else None for user in db.query(User).all()]
+
+        with counted(counter) as old:
+            list_all()
+        results = {"users": args.users, "backend": engine.dialect.name,
+                   "list_all": {"queries": old["queries"], "ms": _timed(list_all, args.repeat)}}
+
+        for sort in ("newest", "email"):
+            def walk(limit=args.limit):
+                db.expunge_all()
+                cursor, per_page = None, []
+                for _ in range(args.pages):
+                    with counted(counter) as page_queries:
+                        page = list_users_page(db, limit=limit, cursor=cursor, sort=sort)
+                    per_page.append(page_queries["queries"])
+                    cursor = page["next_cursor"]
+                    if cursor is None:
+                        break
+                return per_page
+
+            per_page = walk()
+            small = walk(limit=max(1, args.limit // 10))
+            if max(per_page) > PAGE_QUERY_BUDGET:
+                failures.append(f"sort={sort}: {max(per_page)} queries per page, budget {PAGE_QUERY_BUDGET}")
+            if set(per_page) != set(small):
+                failures.append(f"sort={sort}: queries per page change with page size ({per_page[0]} vs {small[0]})")
+            results[f"page_{sort}"] = {
+                "queries_per_page": max(per_page),
+                "ms_per_page": round(_timed(walk, args.repeat) / len(per_page), 3),
+            }
+
+        def search():
+            db.expunge_all()
+            return list_users_page(db, limit=args.limit, q="grace hop", role="doctor", is_active=True)
+
+        with counted(counter) as searched:
+            page = search()
+        if searched["queries"] > PAGE_QUERY_BUDGET:
+            failures.append(f"search: {searched['queries']} queries, budget {PAGE_QUERY_BUDGET}")
+        results["search"] = {
+            "queries": searched["queries"], "ms": _timed(search, args.repeat),
+            "total": page["total"], "total_is_estimate": page["total_is_estimate"],
+        }
+        db.close()
+
+    results["failures"] = failures
+    print(json.dumps(results, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
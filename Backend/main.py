@@ -1,21 +1,68 @@
 # fastapi_project/app/main.py
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from app.core.startup import profiler, warm_up
+
+import asyncio
+from contextlib import asynccontextmanager
+import logging
 import os
 
+with profiler.phase("import:fastapi"):
+    from fastapi import FastAPI
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.staticfiles import StaticFiles
+
 # Use absolute imports
-from app.config import settings
-from app.databse import Base, engine
+with profiler.phase("import:config"):
+    from app.config import settings
+    from app.core.compression import CompressionMiddleware
+    from app.core.metrics import InstrumentedRoute
+    from app.core.responses import FastJSONResponse
+    from app.core.tracing import TracingMiddleware
+    from app.core.logging_config import configure_logging
+
+# Before anything logs: all records go through a queue to a writer thread
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tables are needed in every mode (the webhook processor polls its inbox
+    # right away), so they are created here rather than in warm-up.
+    from app.databse import init_db
+    with profiler.phase("init_db"):
+        await run_in_threadpool(init_db)
+    # JWKS, embedding model, LLM clients and search indexes are created
+    # lazily; warm them up here so the first requests don't pay for it.
+    if settings.STARTUP_WARMUP == "blocking":
+        await run_in_threadpool(warm_up)
+    elif settings.STARTUP_WARMUP == "background":
+        app.state.warmup = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    else:
+        profiler.report()
+    # Applies queued Clerk webhook events to users in batches
+    from app.services.clerk_webhooks import webhook_processor
+    webhook_processor.start()
+    try:
+        yield
+    finally:
+        await webhook_processor.stop()
 
 # Initialize the FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description=settings.DESCRIPTION,
+    lifespan=lifespan,
+    # orjson rendering (app/core/responses.py); see benchmarks/serialization.py
+    default_response_class=FastJSONResponse,
     # Add other FastAPI parameters as needed (e.g., docs_url, redoc_url)
 )
 
+# Record per-route latency for routes declared on the app itself
+app.router.route_class = InstrumentedRoute
+
 # Configure CORS (Cross-Origin Resource Sharing)
 # Adjust origins based on your frontend setup
 app.add_middleware(
@@ -26,6 +73,13 @@ app.add_middleware(
     allow_headers=["*"], # Or specify allowed headers
 )
 
+# gzip/brotli for large JSON bodies (COMPRESSION_MIN_BYTES and up)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Outermost, so the root span covers the whole request
+app.add_middleware(TracingMiddleware)
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Create upload directories
@@ -38,11 +92,15 @@ async def read_root():
     return {"message": f"Welcome to {settings.PROJECT_NAME}"}
 
 # Import routers
-from app.routers.auth import router as auth_router
-from app.routers.users import router as users_router 
-from app.routers.reports import router as reports_router
-from app.routers.chatbot import router as chatbot_router
-from app.routers.clerk_webhook import router as clerk_webhook_router
+with profiler.phase("import:routers"):
+    from app.routers.auth import router as auth_router
+    from app.routers.users import router as users_router 
+    from app.routers.reports import router as reports_router
+    from app.routers.chatbot import router as chatbot_router
+    from app.routers.clerk_webhook import router as clerk_webhook_router
+    from app.routers.health import router as health_router
+    from app.routers.metrics import router as metrics_router
+    from app.routers.internal import router as internal_router
 
 # Include routers
 # app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
@@ -50,11 +108,10 @@ app.include_router(users_router, prefix="/api/users", tags=["Users"])
 app.include_router(reports_router, prefix="/api/reports", tags=["Reports"])
 app.include_router(chatbot_router, prefix="/api/chatbot", tags=["Chatbot"])
 app.include_router(clerk_webhook_router, prefix="/api/clerk-webhook", tags=["Clerk Webhooks"])
+app.include_router(health_router, prefix="/health", tags=["Health"])
+app.include_router(metrics_router, tags=["Metrics"])
+# Node-to-node vector operations (CLUSTER_NODES); guarded by CLUSTER_SECRET
+app.include_router(internal_router, prefix="/internal", tags=["Internal"], include_in_schema=False)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-print(f"FastAPI app initialized with settings: {settings.PROJECT_NAME}")
-# You might add database initialization logic here if needed (e.g., creating tables)
-# from .database import Base, engine
-# Base.metadata.create_all(bind=engine) # Be cautious using this in production
+# Database tables are created in lifespan (app.databse.init_db)
+logger.info("FastAPI app initialized with settings: %s", settings.PROJECT_NAME)
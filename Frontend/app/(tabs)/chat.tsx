@@ -335,6 +335,8 @@ export default function ChatScreen() {
   const [showSampleQuestions, setShowSampleQuestions] = useState(true)
   const flatListRef = useRef<FlatList>(null)
   const inputRef = useRef<TextInput>(null)
+  // Server-side chat session, so follow-up questions keep their context
+  const sessionIdRef = useRef<string | null>(null)
   const sendButtonScale = useRef(new Animated.Value(1)).current
   const [inputFocused, setInputFocused] = useState(false)
   const { getToken } = useAuth()
@@ -713,7 +715,7 @@ export default function ChatScreen() {
           "Content-Type": "application/json",
           Authorization: `Bearer ${token}`,
         },
-        body: JSON.stringify({ query: text.trim() }),
+        body: JSON.stringify({ query: text.trim(), session_id: sessionIdRef.current }),
       })
 
       if (!response.ok) {
@@ -722,6 +724,7 @@ export default function ChatScreen() {
 
       const result = await response.json()
       console.log(result)
+      sessionIdRef.current = result.session_id ?? null
 
       const botResponse: Message = {
         id: (Date.now() + 1).toString(),
@@ -17,6 +17,8 @@ import { SafeAreaView } from "react-native-safe-area-context";
 import { requestMediaLibraryPermissions, showPermissionRationale } from "@/utils/permissions";
 
 const BASE_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
+// Only what the list renders; summaries and file paths stay on the server
+const DOCUMENT_FIELDS = "id,original_filename,uploaded_at,description,thumbnail_url";
 
 export default function DocumentsScreen() {
   const [documents, setDocuments] = useState<any[]>([])
@@ -31,6 +33,9 @@ export default function DocumentsScreen() {
   const isDark = colorScheme === "dark"
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<Error | null>(null);
+  const [authToken, setAuthToken] = useState<string | null>(null);
+  // ETag of the list we are showing; the server answers 304 while it still matches
+  const documentsEtag = useRef<string | null>(null);
 
   const { getToken: getClerkToken } = useAuth();
 
@@ -57,19 +62,25 @@ export default function DocumentsScreen() {
 
     try {
       const token = await getToken();
-      const response = await fetch(`${BASE_URL}/api/reports/files`, {
+      const response = await fetch(`${BASE_URL}/api/reports/files?fields=${DOCUMENT_FIELDS}`, {
         method: "GET",
         headers: {
           "Content-Type": "application/json",
           Authorization: `Bearer ${token}`,
+          ...(documentsEtag.current ? { "If-None-Match": documentsEtag.current } : {}),
         },
       });
 
+      if (response.status === 304) {
+        setAuthToken(token);
+        return;
+      }
+
       if (!response.ok) {
         if (response.status === 401) {
           const newToken = await getToken();
 
-          const retryResponse = await fetch(`${BASE_URL}/api/reports/files`, {
+          const retryResponse = await fetch(`${BASE_URL}/api/reports/files?fields=${DOCUMENT_FIELDS}`, {
             method: "GET",
             headers: {
               "Content-Type": "application/json",
@@ -79,6 +90,8 @@ export default function DocumentsScreen() {
           if (!retryResponse.ok) throw new Error("Retry failed");
 
           const retryData = await retryResponse.json();
+          documentsEtag.current = retryResponse.headers.get("ETag");
+          setAuthToken(newToken);
           setDocuments(retryData);
           return;
         }
@@ -88,6 +101,8 @@ export default function DocumentsScreen() {
       const data = await response.json();
       console.log("Fetched documents:", data);
 
+      documentsEtag.current = response.headers.get("ETag");
+      setAuthToken(token);
       setDocuments(data);
     } catch (err) {
       console.log("Error fetching documents:", err);
@@ -163,7 +178,7 @@ export default function DocumentsScreen() {
       const result = await DocumentPicker.getDocumentAsync({
         type: ["application/pdf", "image/*"],
         copyToCacheDirectory: true,
-        multiple: false,
+        multiple: true,
       });
 
       if (result.canceled) {
@@ -175,17 +190,20 @@ export default function DocumentsScreen() {
         throw new Error("No files were selected");
       }
 
-      const file = result.assets[0];
-
-      // Step 6: Validate file size (max 10MB)
+      // Step 6: Validate file sizes (max 10MB each)
       const MAX_FILE_SIZE = 10 * 1024 * 1024; // 10MB
-      if (file.size && file.size > MAX_FILE_SIZE) {
+      const files = result.assets.filter(asset => !asset.size || asset.size <= MAX_FILE_SIZE);
+      if (files.length < result.assets.length) {
         Alert.alert(
           "File Too Large",
-          "Please select a file smaller than 10MB. Large files may take longer to upload and process.",
+          files.length === 0
+            ? "Please select files smaller than 10MB. Large files may take longer to upload and process."
+            : `${result.assets.length - files.length} file(s) larger than 10MB will be skipped.`,
           [{ text: "OK" }]
         );
-        return;
+        if (files.length === 0) {
+          return;
+        }
       }
 
       // Step 7: Upload
@@ -197,11 +215,15 @@ export default function DocumentsScreen() {
 
       const formData = new FormData();
 
-      formData.append("file", {
-        uri: file.uri,
-        name: file.name || `document_${Date.now()}`,
-        type: file.mimeType || 'application/octet-stream',
-      } as any);
+      // All selected files go in one request; the server extracts them in
+      // parallel and embeds them together
+      files.forEach((file, index) => {
+        formData.append("files", {
+          uri: file.uri,
+          name: file.name || `document_${Date.now()}_${index}`,
+          type: file.mimeType || 'application/octet-stream',
+        } as any);
+      });
 
       const progressInterval = setInterval(() => {
         setUploadProgress(prev => {
@@ -211,7 +233,7 @@ export default function DocumentsScreen() {
       }, 100);
 
       try {
-        const response = await fetch(`${BASE_URL}/api/reports/upload`, {
+        const response = await fetch(`${BASE_URL}/api/reports/upload/batch`, {
           method: "POST",
           body: formData,
           headers: {
@@ -223,26 +245,54 @@ export default function DocumentsScreen() {
         clearInterval(progressInterval);
         setUploadProgress(1);
 
+        // Rate limited (429) or server at capacity (503): don't retry immediately
+        if (response.status === 429 || response.status === 503) {
+          const retryAfter = response.headers.get("Retry-After");
+          throw new Error(
+            `The server is busy. Please try again ${retryAfter ? `in ${retryAfter} seconds` : "shortly"}.`
+          );
+        }
+
         if (!response.ok) {
           const errorData = await response.json();
-          throw new Error(errorData.message || "Upload failed");
+          throw new Error(errorData.detail || errorData.message || "Upload failed");
         }
 
         const data = await response.json();
 
-        const newDocument = {
-          id: data.report_id,
-          description: data.description || "",
-          file_path: data.file_path || file.uri,
-          uploaded_at: new Date().toISOString(),
-          original_filename: file.name || "document",
-          summary: data.summary || "",
-          type: file.mimeType?.includes("pdf") ? "pdf" : "image"
-        };
-
-        setDocuments(prev => [newDocument, ...prev]);
-
-        showNotification('success', `${file.name} uploaded successfully!`);
+        // One result per file, in the order they were sent
+        const newDocuments = data.results
+          .map((fileResult: any, index: number) => ({ fileResult, file: files[index] }))
+          .filter(({ fileResult }: any) => fileResult.success)
+          .map(({ fileResult, file }: any) => ({
+            id: fileResult.report_id,
+            description: "",
+            file_path: fileResult.s3_uri || file.uri,
+            uploaded_at: new Date().toISOString(),
+            original_filename: file.name || "document",
+            summary: "",
+            thumbnail_url: fileResult.thumbnail_url,
+            type: file.mimeType?.includes("pdf") ? "pdf" : "image"
+          }));
+
+        setAuthToken(token);
+        setDocuments(prev => [...newDocuments, ...prev]);
+
+        const failures = data.results.filter((fileResult: any) => !fileResult.success);
+        if (failures.length === 0) {
+          showNotification('success', files.length === 1
+            ? `${files[0].name} uploaded successfully!`
+            : `${files.length} documents uploaded successfully!`);
+        } else if (newDocuments.length > 0) {
+          showNotification('success', `${newDocuments.length} of ${files.length} documents uploaded.`);
+          Alert.alert(
+            "Some Uploads Failed",
+            failures.map((fileResult: any) => `${fileResult.filename}: ${fileResult.error}`).join("\n"),
+            [{ text: "OK" }]
+          );
+        } else {
+          throw new Error(failures[0].error || "Upload failed");
+        }
 
       } catch (uploadError) {
         clearInterval(progressInterval);
@@ -537,6 +587,7 @@ export default function DocumentsScreen() {
                   onDelete={() => handleDeleteDocument(item.id)}
                   onDownload={() => handleDownloadDocument(item.id, item.original_filename)}
                   isDeleting={isDeleting === item.id}
+                  thumbnailHeaders={authToken ? { Authorization: `Bearer ${authToken}` } : undefined}
                 />
               )}
               contentContainerStyle={styles.listContent}
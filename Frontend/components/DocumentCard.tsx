@@ -30,6 +30,7 @@ type Document = {
   uri?: string;
   original_filename: string;
   uploaded_at: string;
+  thumbnail_url?: string | null;
 };
 
 type DocumentCardProps = {
@@ -37,8 +38,12 @@ type DocumentCardProps = {
   onDelete: () => void;
   onDownload: () => void;
   isDeleting?: boolean;
+  // Auth headers for fetching the thumbnail from the backend
+  thumbnailHeaders?: Record<string, string>;
 };
 
+const BASE_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
+
 const allowedImageExtensions = ["jpg", "png", "jpeg"];
 
 export function DocumentCard({
@@ -46,6 +51,7 @@ export function DocumentCard({
   onDelete,
   onDownload,
   isDeleting = false,
+  thumbnailHeaders,
 }: DocumentCardProps) {
   const [imageLoading, setImageLoading] = useState(true);
   const fileExtension = document.original_filename
@@ -81,7 +87,22 @@ export function DocumentCard({
       darkColor={Colors.dark.cardBackground}
     >
       <View style={styles.contentContainer}>
-        {isImage ? (
+        {document.thumbnail_url ? (
+          <View style={[styles.iconContainer, isDeleting && styles.deletingIcon]}>
+            {/* Thumbnail URLs are content-addressed, so the disk cache never goes stale */}
+            <Image
+              source={{ uri: `${BASE_URL}${document.thumbnail_url}`, headers: thumbnailHeaders }}
+              cacheKey={document.thumbnail_url}
+              cachePolicy="disk"
+              contentFit="cover"
+              style={styles.thumbnail}
+              onLoadEnd={() => setImageLoading(false)}
+            />
+            {imageLoading && (
+              <ActivityIndicator size="small" color={document.iconColor} style={styles.thumbnailSpinner} />
+            )}
+          </View>
+        ) : isImage ? (
           <View
             style={[
               styles.iconContainer,
@@ -221,6 +242,14 @@ const styles = StyleSheet.create({
     alignItems: "center",
     marginRight: 16,
   },
+  thumbnail: {
+    width: 48,
+    height: 48,
+    borderRadius: 12,
+  },
+  thumbnailSpinner: {
+    position: "absolute",
+  },
   deletingIcon: {
     backgroundColor: "#F0F0F0",
   },